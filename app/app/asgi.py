@@ -0,0 +1,23 @@
+"""
+ASGI config for app project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.1 has no ASGI support of its own, core.asgi provides the handler.
+Async GETs of the recipe, tag and ingredient viewsets only run the
+MiddlewareMixin hooks of MIDDLEWARE, any other middleware must be handled
+by core.asgi.ASGIHandler, which refuses to start otherwise.
+Serve it with `uvicorn app.asgi:application` or through gunicorn with
+GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+django.setup(set_prefix=False)
+
+from core.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -20,12 +20,18 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'mk4z!kmsy+v=f_2cf)58@^te$-s@2!_8u65y@96-%u+g4=#u!c'
+SECRET_KEY = os.environ.get(
+    'SECRET_KEY', 'mk4z!kmsy+v=f_2cf)58@^te$-s@2!_8u65y@96-%u+g4=#u!c'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Debug mode also keeps every executed query in memory
+DEBUG = os.environ.get('DEBUG', '0') == '1'
 
-ALLOWED_HOSTS = []
+# Comma separated host names the site is served under
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host
+]
 
 
 # Application definition
@@ -39,12 +45,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
+    'core.apps.CoreConfig',
     'user',
-    'recipe',
+    'recipe.apps.RecipeConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInspectionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,14 +88,79 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'), #For some reason DB_PASS does not work here
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Reused connections idle for DB_HEALTH_CHECK_IDLE_SECONDS or longer are
+# checked with a query before a request first uses them. DB_POOL_SIZE > 0
+# takes connections from a pool of at most that many per process instead
+# of keeping one per thread for CONN_MAX_AGE seconds, waiting up to
+# DB_POOL_TIMEOUT seconds for one to be free
+
+DB_HEALTH_CHECKS = os.environ.get('DB_HEALTH_CHECKS', '1') == '1'
+DB_HEALTH_CHECK_IDLE_SECONDS = float(
+    os.environ.get('DB_HEALTH_CHECK_IDLE_SECONDS', 10)
+)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
+
+# Caches
+# CACHE_LOCATION is the host:port of a memcached server, configured as the
+# 'shared' cache. The token cache, the response cache and the replica pins
+# keep their entries there when it is set, in process otherwise. Entries
+# kept in process are only invalidated in the process that wrote them, so
+# every process serving requests must share them
+
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if CACHE_LOCATION:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': CACHE_LOCATION,
+    }
+SHARED_CACHE_ALIAS = 'shared' if CACHE_LOCATION else None
+
+
+# Read replicas
+# Comma separated hosts of replicas of the default database, whose name
+# is DB_REPLICA_NAME if it differs. Safe requests read from a replica
+# unless their user wrote in the last DB_REPLICA_PIN_SECONDS. Replicas
+# need DB_REPLICA_PIN_CACHE_ALIAS to name the cache pins are kept in.
+# Tests read the replicas from the test database, replicas mirror it
+
+DB_REPLICA_HOSTS = [
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host
+]
+DB_REPLICA_NAME = os.environ.get('DB_REPLICA_NAME',
+                                 DATABASES['default']['NAME'])
+DATABASES.update({
+    f'replica{number}': {
+        **DATABASES['default'],
+        'HOST': host,
+        'NAME': DB_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    } for number, host in enumerate(DB_REPLICA_HOSTS, 1)
+})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.router.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+DB_REPLICA_PIN_CACHE_ALIAS = os.environ.get('DB_REPLICA_PIN_CACHE_ALIAS',
+                                            SHARED_CACHE_ALIAS)
+DB_REPLICA_PIN_CACHE_SIZE = int(
+    os.environ.get('DB_REPLICA_PIN_CACHE_SIZE', 10000)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -100,7 +173,8 @@ AUTH_PASSWORD_VALIDATORS = [
         'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        # Parses the common password list once per process
+        'NAME': 'core.validators.CommonPasswordValidator',
     },
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
@@ -108,6 +182,22 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# New passwords are hashed with PASSWORD_PBKDF2_ITERATIONS rounds of PBKDF2,
+# stored hashes with another count or hasher are rehashed on the next
+# successful login
+
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 120000)
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -131,4 +221,126 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+# Resized copies of uploaded recipe images, created in a worker pool
+IMAGE_VARIANT_SIZES = {
+    'thumb': (200, 200),
+    'medium': (800, 800),
+    'full': (2048, 2048),
+}
+IMAGE_VARIANT_FORMAT = os.environ.get('IMAGE_VARIANT_FORMAT', 'WEBP')
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+# Limits for recipe image uploads, checked while the upload streams in
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_UPLOAD_HEADER_BYTES = 256 * 1024 # Give up if no header was found
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 50000000))
+
+AUTH_USER_MODEL = 'core.User'
+
+REST_FRAMEWORK = {
+    # Encodes with orjson when installed, the stdlib json module otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Trusted proxies in front of the app, clients are told apart by the
+    # X-Forwarded-For entry the outermost one added. 0 uses the address
+    # of the connection, as anyone can send X-Forwarded-For
+    'NUM_PROXIES': int(os.environ.get('API_NUM_PROXIES', 0)),
+}
+
+
+# API list endpoints
+# Default and maximum number of rows returned per page, the most items
+# accepted by a bulk request, whether lists are rendered from .values()
+# rows (0 falls back to the DRF serializers) and the rows fetched at a
+# time by ?stream=1 lists
+
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+API_BULK_MAX_ITEMS = int(os.environ.get('API_BULK_MAX_ITEMS', 1000))
+API_FAST_SERIALIZERS = os.environ.get('API_FAST_SERIALIZERS', '1') == '1'
+API_STREAM_CHUNK_SIZE = int(os.environ.get('API_STREAM_CHUNK_SIZE', 2000))
+
+
+# Token authentication cache
+# Entries are kept in process unless TOKEN_CACHE_ALIAS names one of CACHES
+
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS', SHARED_CACHE_ALIAS)
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+
+
+# Recipe API response cache
+# Entries are kept in process unless RESPONSE_CACHE_ALIAS names one of CACHES
+
+RESPONSE_CACHE_ALIAS = os.environ.get('RESPONSE_CACHE_ALIAS',
+                                      SHARED_CACHE_ALIAS)
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+
+
+# Recipe snapshots
+# Recipe list and detail responses read tags and ingredients from the
+# snapshot column instead of joining them, 0 reads the relations instead
+
+RECIPE_SNAPSHOTS = os.environ.get('RECIPE_SNAPSHOTS', '1') == '1'
+
+
+# Request metrics
+# Per endpoint histograms served at /metrics and a Server-Timing header on
+# every response. Scraping requires METRICS_TOKEN as bearer token, without
+# one /metrics is only served with DEBUG. Each process has its own
+# metrics, with METRICS_DIR set they save them there every
+# METRICS_SAVE_SECONDS and /metrics adds up those of every process, the
+# gunicorn configuration sets it for its workers
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_SAVE_SECONDS = float(os.environ.get('METRICS_SAVE_SECONDS', 1))
+
+
+# Query inspection
+# Fraction of requests whose queries are checked for the N+1 signature, a
+# statement repeated QUERY_REPEAT_THRESHOLD times or more, and statements
+# slower than SLOW_QUERY_MS, both logged to core.queries with their origin
+
+QUERY_INSPECTION_SAMPLE_RATE = float(
+    os.environ.get('QUERY_INSPECTION_SAMPLE_RATE', 0.01)
+)
+QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+
+
+# ASGI
+# Requests served through app.asgi run their blocking work in one of
+# ASGI_THREADS lanes, keeping a connection for the whole request. Work
+# they overlap and requests served through the WSGI handler share another
+# ASGI_THREADS threads, so up to twice that many queries run at once per
+# process. Async actions only run the MiddlewareMixin hooks of
+# MIDDLEWARE, see core.asgi.ASGIHandler
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+
+# Token endpoint throttling
+# Every attempt at /api/user/token/ takes a token from a bucket for its
+# client IP and one for its email before any password is hashed, empty
+# buckets get a 429. Buckets refill at _RATE tokens per minute up to _BURST
+# tokens, a _RATE of 0 never refills them and a _BURST of 0 turns the limit
+# off. They are kept per process, at most THROTTLE_MAX_BUCKETS of them
+
+LOGIN_THROTTLE_IP_RATE = float(os.environ.get('LOGIN_THROTTLE_IP_RATE', 30))
+LOGIN_THROTTLE_IP_BURST = int(os.environ.get('LOGIN_THROTTLE_IP_BURST', 30))
+LOGIN_THROTTLE_EMAIL_RATE = float(
+    os.environ.get('LOGIN_THROTTLE_EMAIL_RATE', 5)
+)
+LOGIN_THROTTLE_EMAIL_BURST = int(
+    os.environ.get('LOGIN_THROTTLE_EMAIL_BURST', 10)
+)
+THROTTLE_MAX_BUCKETS = int(os.environ.get('THROTTLE_MAX_BUCKETS', 100000))
\ No newline at end of file
@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        """Check the replica settings, connect the signal receivers, time
+        DRF serializers and load the password validators"""
+        from django.contrib.auth import password_validation
+
+        from core import signals  # noqa: F401
+        from core.db import router
+        from core.metrics import instrument_serializers
+
+        router.check_settings()
+
+        if settings.METRICS_ENABLED:
+            instrument_serializers()
+        # Before gunicorn forks its workers, not on the first signup
+        password_validation.get_default_password_validators()
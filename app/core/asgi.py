@@ -0,0 +1,521 @@
+import asyncio
+import io
+import sys
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest, \
+    get_script_name
+from django.db import close_old_connections
+from django.db.models import prefetch_related_objects
+from django.urls import Resolver404, resolve, set_script_prefix
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from core.db import router
+from core.metrics import RequestMetrics
+from core.middleware import get_labels, sample_inspector
+
+METRICS_MIDDLEWARE = 'core.middleware.MetricsMiddleware'
+QUERY_INSPECTION_MIDDLEWARE = 'core.middleware.QueryInspectionMiddleware'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Context managers of the request whose coroutine is running, entered
+# around each of its run_sync() calls
+_collectors = ContextVar('asgi_request_collectors', default=())
+# Lane of the request whose coroutine is running, see request_lane()
+_lane = ContextVar('asgi_request_lane', default=None)
+# Event loop -> queue of its idle lanes
+_lanes = weakref.WeakKeyDictionary()
+
+
+def get_executor():
+    """Return the thread pool running the blocking work of ASGI requests"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASGI_THREADS,
+                thread_name_prefix='asgi',
+            )
+
+    return _executor
+
+
+@asynccontextmanager
+async def request_lane():
+    """Run the run_sync() calls of the current request in one thread
+
+    Waits for one of the ASGI_THREADS lanes of the event loop, each a
+    thread of its own, to be free. The lane keeps its database connections
+    from one call to the next and releases them when the request ends, as
+    the WSGI handler does.
+    """
+    loop = asyncio.get_event_loop()
+    with _executor_lock:
+        lanes = _lanes.get(loop)
+        if lanes is None:
+            lanes = _lanes[loop] = asyncio.Queue()
+            for _ in range(settings.ASGI_THREADS):
+                lanes.put_nowait(ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='asgi-lane'
+                ))
+
+    lane = await lanes.get()
+    token = _lane.set(lane)
+    try:
+        yield lane
+    finally:
+        _lane.reset(token)
+        try:
+            await loop.run_in_executor(lane, close_old_connections)
+        finally:
+            lanes.put_nowait(lane)
+
+
+def _call(func, args, kwargs, release):
+    try:
+        with ExitStack() as stack:
+            for collect in _collectors.get():
+                stack.enter_context(collect())
+            return func(*args, **kwargs)
+    finally:
+        if release:
+            # Connections are handled as at the end of a request, pooled
+            # ones go back and broken or expired ones are closed
+            close_old_connections()
+
+
+async def _run(executor, release, func, args, kwargs):
+    context = copy_context()
+    return await asyncio.get_event_loop().run_in_executor(
+        executor, partial(context.run, _call, func, args, kwargs, release)
+    )
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run func in the request's lane and return its result
+
+    func sees the context of the calling coroutine, so the database
+    router, request metrics and query inspection treat it as part of the
+    current request.
+    Outside a request_lane() it runs in the executor and its connections
+    are released when it returns.
+    """
+    lane = _lane.get()
+    if lane is None:
+        return await _run(get_executor(), True, func, args, kwargs)
+
+    return await _run(lane, False, func, args, kwargs)
+
+
+async def run_concurrently(func, *args, **kwargs):
+    """run_sync() for work overlapping the other calls of the request
+
+    A lane runs one call at a time, so func runs in the executor on a
+    connection of its own, released when it returns.
+    """
+    return await _run(get_executor(), True, func, args, kwargs)
+
+
+def send_sync(send, loop, message):
+    """Send an ASGI message from a thread outside the event loop"""
+    asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+
+def get_environ(scope, body):
+    """Return the WSGI environ of an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI carries paths as bytes decoded as latin-1
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+
+    return environ
+
+
+class RequestBody(io.RawIOBase):
+    """Blocking reader of an ASGI request body for executor threads
+
+    Body messages are received through the event loop as they are read,
+    so uploads are never buffered as a whole.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b''
+        self.more_body = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.buffer and self.more_body:
+            message = asyncio.run_coroutine_threadsafe(
+                self.receive(), self.loop
+            ).result()
+            if message['type'] == 'http.disconnect':
+                raise OSError('Client disconnected')
+            self.buffer = message.get('body', b'')
+            self.more_body = message.get('more_body', False)
+
+        size = min(len(buffer), len(self.buffer))
+        buffer[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+
+        return size
+
+
+class AsyncViewMixin:
+    """Viewset serving async_actions from the event loop under ASGIHandler
+
+    An action is async capable when the viewset defines an <action>_async
+    coroutine, which must run its blocking work through run_sync(). By
+    default list and retrieve run the sync action in the executor, with
+    the related lookups of a retrieve prefetched at the same time.
+    """
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def get_async_handler(cls, action):
+        if action not in cls.async_actions:
+            return None
+
+        return getattr(cls, f'{action}_async', None)
+
+    @classmethod
+    async def dispatch_async(cls, request, actions, initkwargs, args,
+                             kwargs):
+        """Async ViewSetMixin.as_view() and APIView.dispatch()"""
+        self = cls(**initkwargs)
+        self.action_map = actions
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            # Authentication may load the user from the database
+            await run_sync(self.initial, request, *args, **kwargs)
+            handler = getattr(self, f'{self.action}_async')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args,
+                                               **kwargs)
+        return self.response
+
+    async def list_async(self, request, *args, **kwargs):
+        return await run_sync(super().list, request, *args, **kwargs)
+
+    async def retrieve_async(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookups = queryset._prefetch_related_lookups
+        instance = await run_sync(self.get_object_from,
+                                  queryset.prefetch_related(None))
+        # Every lookup fills its own entry, create the cache up front
+        instance._prefetched_objects_cache = {}
+        await asyncio.gather(*(
+            run_concurrently(prefetch_related_objects, [instance], lookup)
+            for lookup in lookups
+        ))
+        serializer = self.get_serializer(instance)
+
+        return Response(serializer.data)
+
+    def get_object_from(self, queryset):
+        """get_object() from an already filtered queryset"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(self.request, obj)
+
+        return obj
+
+
+class ASGIHandler:
+    """ASGI application for Django 2.1, which has no ASGI support
+
+    GET requests for an async capable viewset action, see AsyncViewMixin,
+    are handled on the event loop. Only the process_request(),
+    process_view(), process_exception() and process_response() hooks of
+    MIDDLEWARE run around them, see load_middleware(), the metrics and
+    query inspection middleware are done by the handler itself. Their
+    blocking work runs in a lane, one of ASGI_THREADS threads, see
+    request_lane(). Work they overlap and every other request, which runs
+    through the WSGI handler and its middleware, share a pool of another
+    ASGI_THREADS threads. Together they bound the database work of the
+    process.
+    """
+
+    def __init__(self):
+        self.wsgi = WSGIHandler()
+        self.load_middleware()
+
+    def load_middleware(self):
+        """Load the MIDDLEWARE run around async actions
+
+        Middleware other than the handler's own must be MiddlewareMixin
+        hooks, wrapping a get_response() call would block the event loop.
+        """
+        self.middleware = []
+        self.metrics = self.inspect_queries = False
+        for path in settings.MIDDLEWARE:
+            if path == METRICS_MIDDLEWARE:
+                self.metrics = settings.METRICS_ENABLED
+                continue
+            if path == QUERY_INSPECTION_MIDDLEWARE:
+                self.inspect_queries = \
+                    bool(settings.QUERY_INSPECTION_SAMPLE_RATE)
+                continue
+            middleware = import_string(path)
+            if not issubclass(middleware, MiddlewareMixin):
+                raise ImproperlyConfigured(
+                    f'{path} cannot run around async actions, it must be '
+                    f'a MiddlewareMixin'
+                )
+            try:
+                self.middleware.append(middleware())
+            except MiddlewareNotUsed:
+                pass
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope {scope["type"]}')
+
+        loop = asyncio.get_event_loop()
+        match = self.get_async_match(scope)
+        if match is None:
+            body = io.BufferedReader(RequestBody(receive, loop))
+            return await loop.run_in_executor(
+                get_executor(), self.run_wsgi, get_environ(scope, body),
+                send, loop
+            )
+
+        environ = get_environ(scope, io.BytesIO())
+        set_script_prefix(get_script_name(environ))
+        request = WSGIRequest(environ)
+        request.resolver_match = match
+        router.start_request(request.method)
+        metrics = RequestMetrics() if self.metrics else None
+        inspector = sample_inspector() if self.inspect_queries else None
+        _collectors.set(tuple(
+            collector for collector in (
+                metrics and metrics.collect, inspector and inspector.inspect
+            ) if collector
+        ))
+
+        async with request_lane():
+            response = await self.get_response(request, match)
+            if metrics is not None:
+                # Streamed responses only time the first byte, as in
+                # MetricsMiddleware
+                response['Server-Timing'] = metrics.server_timing()
+            try:
+                size = await self.send_response(response, send, loop)
+            finally:
+                response.close()
+        if metrics is not None:
+            metrics.observe(get_labels(request, response), size)
+        if inspector is not None:
+            inspector.report(f'{request.method} {request.path}')
+
+    def get_async_match(self, scope):
+        """Return the URL match of an async capable request or None"""
+        if scope['method'] != 'GET':
+            return None
+        try:
+            match = resolve(scope['path'][len(scope.get('root_path', '')):])
+        except Resolver404:
+            return None
+
+        view_class = getattr(match.func, 'cls', None)
+        actions = getattr(match.func, 'actions', None)
+        if actions is None or not hasattr(view_class, 'get_async_handler') or \
+                view_class.get_async_handler(actions.get('get')) is None:
+            return None
+
+        return match
+
+    async def get_response(self, request, match):
+        """Return the response of the async action through the middleware"""
+        response, entered = await run_sync(self.process_request, request,
+                                           match)
+        if response is None:
+            response = await self.get_view_response(request, match)
+        response = await run_sync(self.process_response, request, response,
+                                  entered)
+
+        if not response.streaming and \
+                not response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+
+        return response
+
+    def process_request(self, request, match):
+        """Run the request and view hooks of the middleware
+
+        Returns the response of the first hook returning one or None, and
+        the number of middleware whose response hooks must run.
+        """
+        for entered, middleware in enumerate(self.middleware):
+            if not hasattr(middleware, 'process_request'):
+                continue
+            # As in Django, a failing middleware skips its response hook
+            try:
+                response = middleware.process_request(request)
+            except Exception as exc:
+                return response_for_exception(request, exc), entered
+            if response is not None:
+                return response, entered + 1
+
+        entered = len(self.middleware)
+        try:
+            for middleware in self.middleware:
+                if hasattr(middleware, 'process_view'):
+                    response = middleware.process_view(
+                        request, match.func, match.args, match.kwargs
+                    )
+                    if response is not None:
+                        return response, entered
+        except Exception as exc:
+            return response_for_exception(request, exc), entered
+
+        return None, entered
+
+    def process_response(self, request, response, entered):
+        """Run the response hooks of the first entered middleware"""
+        for middleware in reversed(self.middleware[:entered]):
+            if hasattr(middleware, 'process_response'):
+                try:
+                    response = middleware.process_response(request, response)
+                except Exception as exc:
+                    response = response_for_exception(request, exc)
+
+        return response
+
+    def process_exception(self, request, exc):
+        """Return the response of the first exception hook returning one"""
+        for middleware in reversed(self.middleware):
+            if hasattr(middleware, 'process_exception'):
+                response = middleware.process_exception(request, exc)
+                if response is not None:
+                    return response
+
+        return response_for_exception(request, exc)
+
+    async def get_view_response(self, request, match):
+        """Return the rendered response of the async action"""
+        func = match.func
+        try:
+            response = await func.cls.dispatch_async(
+                request, func.actions, func.initkwargs, match.args,
+                match.kwargs
+            )
+            if not hasattr(response, 'render'):
+                pass
+            elif response.accepted_renderer.format == 'json':
+                response.render()
+            else:
+                # The browsable API renders forms from the database
+                await run_sync(response.render)
+        except Exception as exc:
+            response = await run_sync(self.process_exception, request, exc)
+
+        return response
+
+    async def send_response(self, response, send, loop):
+        """Send response and return the size of its content"""
+        headers = [(name.encode('latin1'), value.encode('latin1'))
+                   for name, value in response.items()]
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie',
+                            cookie.output(header='').strip().encode()))
+        await send({'type': 'http.response.start',
+                    'status': response.status_code, 'headers': headers})
+        if response.streaming:
+            # Streamed content may read a server side cursor, every chunk
+            # must come from the thread whose connection opened it
+            return await run_sync(self.stream_content, response, send, loop)
+
+        await send({'type': 'http.response.body', 'body': response.content})
+
+        return len(response.content)
+
+    def stream_content(self, content, send, loop):
+        """Send the chunks of iterable content from this thread"""
+        size = 0
+        for chunk in content:
+            if chunk:
+                size += len(chunk)
+                send_sync(send, loop, {'type': 'http.response.body',
+                                       'body': chunk, 'more_body': True})
+        send_sync(send, loop, {'type': 'http.response.body'})
+
+        return size
+
+    def run_wsgi(self, environ, send, loop):
+        """Run the WSGI handler in this thread and send its response"""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.encode('latin1'),
+                                   value.encode('latin1'))
+                                  for name, value in headers]
+
+        response = self.wsgi(environ, start_response)
+        try:
+            send_sync(send, loop, {'type': 'http.response.start', **started})
+            self.stream_content(response, send, loop)
+        finally:
+            response.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,129 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.cache import LRUCache, get_cache
+from core.db.router import set_user
+
+
+def field_values(obj):
+    """Return the values of obj's concrete fields, in field order"""
+    return [getattr(obj, field.attname)
+            for field in obj._meta.concrete_fields]
+
+
+def from_values(model, values):
+    """Return a new model instance loaded from field_values()"""
+    names = [field.attname for field in model._meta.concrete_fields]
+
+    return model.from_db(DEFAULT_DB_ALIAS, names, values)
+
+
+class TokenCache:
+    """Cache of token key -> (user, token) with hit/miss counters
+
+    Entries live in an in-process LRU unless TOKEN_CACHE_ALIAS names a
+    Django cache, in which case every process shares that backend. A
+    deleted token or changed user is only invalidated in the process that
+    wrote it otherwise, gunicorn refuses to start several workers then.
+    """
+    prefix = 'auth-token:'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_cache(
+                settings.TOKEN_CACHE_ALIAS,
+                max_size=settings.TOKEN_CACHE_SIZE,
+                ttl=settings.TOKEN_CACHE_TTL,
+            )
+
+        return self._backend
+
+    def get(self, key):
+        """Return the cached (user, token) pair for key or None
+
+        Every call builds new instances from the cached field values, so
+        nothing one request sets on its user reaches another.
+        """
+        value = self.backend.get(self.prefix + key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            return None
+
+        user_values, token_values = value
+        user = from_values(get_user_model(), user_values)
+        token = from_values(Token, token_values)
+        token.user = user
+
+        return user, token
+
+    def set(self, key, value):
+        """Cache the (user, token) pair for key"""
+        user, token = value
+        self.backend.set(self.prefix + key,
+                         (field_values(user), field_values(token)),
+                         settings.TOKEN_CACHE_TTL)
+
+    def invalidate(self, key):
+        """Drop the entry for a single token key"""
+        self.backend.delete(self.prefix + key)
+
+    def invalidate_user(self, user_id):
+        """Drop the entries for every token belonging to a user"""
+        keys = Token.objects.filter(user_id=user_id) \
+            .values_list('key', flat=True)
+        for key in keys:
+            self.invalidate(key)
+
+    def stats(self):
+        """Return the hit and miss counters"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset(self):
+        """Forget the backend and counters, settings are read again"""
+        with self._lock:
+            if isinstance(self._backend, LRUCache):
+                self._backend.clear()
+            self._backend = None
+            self.hits = 0
+            self.misses = 0
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the Token + User select on a hit"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, (user, token))
+        return user, token
+
+    def authenticate(self, request):
+        credentials = super().authenticate(request)
+        if credentials is not None:
+            # Known user, the request may read from the replicas now
+            set_user(credentials[0].pk)
+
+        return credentials
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Backends whose entries only the process that stored them can read
+PROCESS_LOCAL_BACKENDS = frozenset((
+    'django.core.cache.backends.locmem.LocMemCache',
+))
+
+
+class LRUCache:
+    """Thread safe in-process LRU cache whose entries expire after a TTL
+
+    Mirrors the get/set/delete part of the Django cache API so it can be
+    swapped for a shared cache backend.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value stored under key or default if missing/expired"""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value under key, evicting the least recently used entry"""
+        ttl = self.ttl if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def incr(self, key, delta=1):
+        """Add delta to a stored number, ValueError if key is missing"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                raise ValueError(f'Key {key!r} not found')
+            value = entry[1] + delta
+            self._data[key] = (entry[0], value)
+            self._data.move_to_end(key)
+
+            return value
+
+    def delete(self, key):
+        """Remove key from the cache if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_cache(alias=None, max_size=1024, ttl=300):
+    """Return the Django cache named alias or a new in-process LRUCache"""
+    if alias:
+        return caches[alias]
+
+    return LRUCache(max_size=max_size, ttl=ttl)
+
+
+def is_shared(alias):
+    """Return whether every process reads the entries of the cache alias
+
+    No alias means an in-process LRUCache, see get_cache().
+    """
+    if not alias:
+        return False
+
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def unshared_caches():
+    """Return the alias settings of caches whose entries are per process
+
+    Writes invalidate these entries in the cache of the process handling
+    them only, so they are wrong in any other process serving requests.
+    """
+    names = ['TOKEN_CACHE_ALIAS', 'RESPONSE_CACHE_ALIAS']
+    if settings.DATABASE_REPLICAS:
+        names.append('DB_REPLICA_PIN_CACHE_ALIAS')
+
+    return [name for name in names if not is_shared(getattr(settings, name))]
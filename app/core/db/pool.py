@@ -0,0 +1,131 @@
+import threading
+from time import perf_counter
+
+import psycopg2
+
+from core.metrics import registry
+
+POOL_LABELS = ('alias',)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+                2.5, 5, 10)
+
+pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No pooled connection became free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded thread safe pool of psycopg2 connections
+
+    At most max_size connections are open, checked out or idle. Checkouts
+    wait up to timeout seconds for one to be checked in, then raise
+    PoolTimeout, which Django reports as an OperationalError. Idle
+    connections are reused most recently used first, so the rest can go
+    stale and be dropped by Postgres without being handed out again often.
+    """
+
+    def __init__(self, alias, max_size, timeout):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self.idle = []
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self):
+        return self.size - len(self.idle)
+
+    def checkout(self, connect):
+        """Return an idle connection, or one opened with connect()"""
+        started = perf_counter()
+        deadline = started + self.timeout
+        with self._condition:
+            while not self.idle and self.size >= self.max_size:
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    POOL_TIMEOUTS.inc((self.alias,))
+                    raise PoolTimeout(
+                        f'No connection to {self.alias} free within '
+                        f'{self.timeout} sec, all {self.max_size} in use'
+                    )
+                self._condition.wait(remaining)
+            connection = self.idle.pop() if self.idle else None
+            if connection is None:
+                self.size += 1
+        POOL_WAIT.observe((self.alias,), perf_counter() - started)
+
+        if connection is None:
+            try:
+                connection = connect()
+            except BaseException:
+                self.discard(None)
+                raise
+
+        return connection
+
+    def checkin(self, connection):
+        """Return a connection for reuse"""
+        with self._condition:
+            self.idle.append(connection)
+            self._condition.notify()
+
+    def discard(self, connection):
+        """Close a checked out connection, freeing its place in the pool"""
+        if connection is not None:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+        with self._condition:
+            self.size -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections"""
+        with self._condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            connection.close()
+
+
+def get_pool(alias, max_size, timeout):
+    """Return the process' pool of alias, creating it on first use"""
+    pool = pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = pools.setdefault(
+                alias, ConnectionPool(alias, max_size, timeout)
+            )
+
+    return pool
+
+
+def collect_connections():
+    for alias, pool in list(pools.items()):
+        yield (alias, 'in_use'), pool.in_use
+        yield (alias, 'idle'), len(pool.idle)
+
+
+POOL_WAIT = registry.histogram(
+    'db_pool_wait_seconds', 'Time waited to check a connection out',
+    WAIT_BUCKETS, labels=POOL_LABELS
+)
+POOL_TIMEOUTS = registry.counter(
+    'db_pool_timeouts_total', 'Checkouts that timed out, all in use',
+    POOL_LABELS
+)
+POOL_CONNECTIONS = registry.gauge(
+    'db_pool_connections', 'Open pooled connections by state',
+    ('alias', 'state'), collect_connections
+)
+POOL_MAX_SIZE = registry.gauge(
+    'db_pool_max_connections', 'Pool size limit, in_use / this saturation',
+    POOL_LABELS,
+    lambda: [((alias,), pool.max_size) for alias, pool in list(pools.items())]
+)
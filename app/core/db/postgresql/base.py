@@ -0,0 +1,131 @@
+from time import monotonic
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import get_pool
+
+
+class Connection(extensions.connection):
+    """psycopg2 connection remembering since when no request used it"""
+    idle_since = None
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend with health checks and an optional pool
+
+    With DB_HEALTH_CHECKS a persistent connection left idle for at least
+    DB_HEALTH_CHECK_IDLE_SECONDS is checked with a query the first time a
+    request uses it, and replaced if it is broken. Connections used more
+    recently than that are trusted, a query would only add a round trip.
+
+    With DB_POOL_SIZE > 0 connections come from a bounded per process
+    pool, see core.db.pool, and go back to it at the end of every request.
+    CONN_MAX_AGE does not apply, the pool keeps connections open instead.
+    """
+    health_check_done = False
+
+    @property
+    def pool(self):
+        if not settings.DB_POOL_SIZE:
+            return None
+
+        return get_pool(self.alias, settings.DB_POOL_SIZE,
+                        settings.DB_POOL_TIMEOUT)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params['connection_factory'] = Connection
+
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        # Checked in connections may have been closed by the server since
+        for _ in range(pool.max_size + 1):
+            connection = pool.checkout(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                )
+            )
+            if not self.needs_health_check(connection) or \
+                    self.connection_is_usable(connection):
+                break
+            pool.discard(connection)
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+
+        return connection
+
+    def connect(self):
+        # Set first, connecting runs queries through ensure_connection()
+        self.health_check_done = True
+        super().connect()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        connection = self.connection
+        try:
+            # Never hand out a connection with a transaction open
+            connection.rollback()
+            if connection.get_transaction_status() != \
+                    extensions.TRANSACTION_STATUS_IDLE:
+                # rollback() leaves transactions begun by hand alone
+                with connection.cursor() as cursor:
+                    cursor.execute('ROLLBACK')
+        except base.Database.Error:
+            pool.discard(connection)
+        else:
+            if connection.closed:
+                pool.discard(connection)
+            else:
+                pool.checkin(connection)
+
+    def needs_health_check(self, connection):
+        """Return whether connection was idle long enough to be checked"""
+        if not settings.DB_HEALTH_CHECKS or connection.idle_since is None:
+            return False
+
+        return monotonic() - connection.idle_since >= \
+            settings.DB_HEALTH_CHECK_IDLE_SECONDS
+
+    def connection_is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except base.Database.Error:
+            return False
+
+        return True
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done and \
+                not self.in_atomic_block:
+            self.health_check_done = True
+            if self.needs_health_check(self.connection) and \
+                    not self.connection_is_usable(self.connection):
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        """Run at the start and end of requests"""
+        super().close_if_unusable_or_obsolete()
+        # Idle from the end of the last request that used the connection,
+        # this also runs at the start of requests
+        if self.health_check_done and self.connection is not None:
+            self.connection.idle_since = monotonic()
+        self.health_check_done = False
+        # Pooled connections are shared between the threads of a process
+        if self.pool is not None and self.connection is not None and \
+                not self.in_atomic_block:
+            self.close()
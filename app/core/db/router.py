@@ -0,0 +1,125 @@
+import random
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.cache import get_cache
+
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+# A context variable rather than a thread local, so the state follows a
+# request's coroutine into the threads its queries run in, see core.asgi
+_state = ContextVar('db_routing_state', default=None)
+
+
+class PrimaryPins:
+    """Users whose reads stay on the primary for a while after a write
+
+    Pins live in the Django cache DB_REPLICA_PIN_CACHE_ALIAS names, which
+    every process shares. A pin kept in process would send the user's next
+    request to a replica whenever another process handles it.
+    """
+    prefix = 'db-primary-pin:'
+
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_cache(
+                settings.DB_REPLICA_PIN_CACHE_ALIAS,
+                max_size=settings.DB_REPLICA_PIN_CACHE_SIZE,
+                ttl=settings.DB_REPLICA_PIN_SECONDS,
+            )
+
+        return self._backend
+
+    def pin(self, user_id):
+        self.backend.set(f'{self.prefix}{user_id}', True,
+                         settings.DB_REPLICA_PIN_SECONDS)
+
+    def is_pinned(self, user_id):
+        return self.backend.get(f'{self.prefix}{user_id}') is not None
+
+    def reset(self):
+        self._backend = None
+
+
+primary_pins = PrimaryPins()
+
+
+def check_settings():
+    """Refuse replicas without a cache to share primary pins through"""
+    if settings.DATABASE_REPLICAS and \
+            not settings.DB_REPLICA_PIN_CACHE_ALIAS:
+        raise ImproperlyConfigured(
+            'DB_REPLICA_HOSTS needs DB_REPLICA_PIN_CACHE_ALIAS to name the '
+            'cache users are pinned to the primary in'
+        )
+
+
+def start_request(method):
+    """Begin routing a request, replicas are off until set_user()"""
+    _state.set(SimpleNamespace(safe=method in SAFE_METHODS, user_id=None,
+                               replicas=False))
+
+
+def set_user(user_id):
+    """Read from the replicas if the request is safe and user is not
+    pinned to the primary"""
+    state = _state.get()
+    if state is None:
+        return
+
+    state.user_id = user_id
+    state.replicas = state.safe and not primary_pins.is_pinned(user_id)
+
+
+def finish_request():
+    _state.set(None)
+
+
+class ReplicaRouter:
+    """Send reads of safe requests to DATABASE_REPLICAS, the rest to default
+
+    A request reads from a random replica once its user is known and only
+    if the user did not write in the last DB_REPLICA_PIN_SECONDS. A write
+    pins the user and moves the rest of the request to the primary, so
+    users always read their own writes. Reads outside requests and inside
+    transactions go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state.get(), 'replicas', False) or \
+                not settings.DATABASE_REPLICAS or \
+                connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return DEFAULT_DB_ALIAS
+
+        state.replicas = False
+        if state.user_id is not None and settings.DATABASE_REPLICAS:
+            primary_pins.pin(state.user_id)
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive the primary's schema through replication
+        return db not in settings.DATABASE_REPLICAS
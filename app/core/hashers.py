@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import make_password
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 running PASSWORD_PBKDF2_ITERATIONS iterations
+
+    Keeps Django's algorithm name, so hashes stored with any iteration
+    count still verify. check_password() rehashes them with the current
+    count on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+def setup_worker():
+    """Configure Django in pool processes that were not forked"""
+    django.setup()
+
+
+def hash_passwords(passwords, processes=None):
+    """Return make_password() of every password, hashed by a process pool
+
+    Processes use every core whether or not the hasher releases the GIL.
+    processes defaults to the number of cores, 1 hashes in this process.
+    """
+    passwords = list(passwords)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=setup_worker) as pool:
+        chunksize = max(1, len(passwords) // (processes * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
@@ -0,0 +1,345 @@
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from io import BytesIO
+from itertools import count
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Tag, Recipe
+from core.seed import seed_dataset
+from recipe.cache import response_cache
+
+PASSWORD = 'benchpass'
+UPLOAD_DIR = 'uploads/recipe'
+
+# Metric -> direction that counts as a regression
+TRACKED_METRICS = {
+    'p50_ms': 'higher',
+    'p95_ms': 'higher',
+    'p99_ms': 'higher',
+    'requests_per_sec': 'lower',
+    'queries': 'higher',
+}
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    rank = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[rank]
+
+
+def sample_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class QueryCounter:
+    """connection.execute_wrapper counting executed queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def compare(results, baseline, threshold):
+    """Return descriptions of tracked metrics regressed past threshold"""
+    regressions = []
+    for route, metrics in results.items():
+        previous = baseline.get(route)
+        if previous is None:
+            continue
+        for metric, direction in TRACKED_METRICS.items():
+            old, new = previous.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == 'queries':
+                # Query counts are deterministic, any increase counts
+                regressed = new > old
+            elif direction == 'higher':
+                regressed = new > old * (1 + threshold)
+            else:
+                regressed = new < old * (1 - threshold)
+            if regressed:
+                regressions.append(f'{route} {metric}: {old} -> {new}')
+
+    return regressions
+
+
+class Command(BaseCommand):
+    '''Django command to benchmark every API route on a seeded dataset'''
+    help = ('Seed users with recipes, tags and ingredients, then measure '
+            'throughput, latency percentiles and query counts per route')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=30)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Measured requests per route')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Unmeasured requests per route')
+        parser.add_argument('--routes', nargs='*',
+                            help='Only run these routes (e.g. recipe-list)')
+        parser.add_argument('--no-response-cache', action='store_true',
+                            help='Invalidate response caches before '
+                                 'every request')
+        parser.add_argument('--output', help='Write the JSON results here')
+        parser.add_argument('--baseline',
+                            help='Fail if results regress from this file')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Allowed relative regression, 0.1 = 10%%')
+
+    def handle(self, *args, **options):
+        # Everything written while benchmarking is rolled back at the end.
+        # Requests go to localhost when ALLOWED_HOSTS names no usable host,
+        # which only DEBUG allows otherwise. user-token measures logins,
+        # not the login throttle
+        with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'localhost'],
+                LOGIN_THROTTLE_IP_BURST=0, LOGIN_THROTTLE_EMAIL_BURST=0):
+            self.stderr.write('Seeding dataset')
+            users = seed_dataset(
+                users=options['users'],
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                password=PASSWORD,
+            )
+            self.contexts = self.get_contexts(users)
+            existing = self.list_uploads()
+            try:
+                results = self.run(options)
+            finally:
+                self.delete_uploads(existing)
+                transaction.set_rollback(True)
+
+        report = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'options': {key: options[key] for key in (
+                    'users', 'recipes', 'tags', 'ingredients', 'requests',
+                    'warmup', 'no_response_cache',
+                )},
+            },
+            'results': results,
+        }
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)['results']
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError(
+                    'Regressions found:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions'))
+
+    def list_uploads(self):
+        """Return the names of stored recipe images"""
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(UPLOAD_DIR):
+            return set()
+
+        return set(storage.listdir(UPLOAD_DIR)[1])
+
+    def delete_uploads(self, existing):
+        """Remove images uploaded while benchmarking from storage"""
+        storage = Recipe._meta.get_field('image').storage
+        for name in self.list_uploads() - existing:
+            storage.delete(os.path.join(UPLOAD_DIR, name))
+
+    def get_contexts(self, users):
+        """Return per-user request data, users get a token each"""
+        tokens = Token.objects.bulk_create(
+            Token(key=Token().generate_key(), user=user) for user in users
+        )
+        first_recipes = {}
+        for recipe_id, user_id in Recipe.objects.filter(
+                user__in=users).order_by('-id').values_list('id', 'user_id'):
+            first_recipes.setdefault(user_id, recipe_id)
+        tag_ids = {}
+        for tag_id, user_id in Tag.objects.filter(
+                user__in=users).values_list('id', 'user_id'):
+            tag_ids.setdefault(user_id, []).append(str(tag_id))
+
+        return [{
+            'user': user,
+            'auth': f'Token {token.key}',
+            'recipe_id': first_recipes.get(user.pk),
+            'tag_ids': ','.join(tag_ids.get(user.pk, [])[:3]),
+        } for user, token in zip(users, tokens)]
+
+    def get_routes(self):
+        """Return route name -> function building (method, path, kwargs)"""
+        serial = count()
+        image = sample_image()
+
+        def recipe_payload():
+            return {'title': 'Bench', 'time_minutes': 5, 'price': '1.00'}
+
+        return {
+            'recipe-list': lambda ctx: (
+                'get', reverse('recipe:recipe-list'), {}),
+            'recipe-list-filtered': lambda ctx: (
+                'get', reverse('recipe:recipe-list'),
+                {'data': {'tags': ctx['tag_ids'], 'match': 'any'}}),
+            'recipe-detail': lambda ctx: (
+                'get', reverse('recipe:recipe-detail',
+                               args=[ctx['recipe_id']]), {}),
+            'recipe-create': lambda ctx: (
+                'post', reverse('recipe:recipe-list'),
+                {'data': dict(recipe_payload(), tags=[], ingredients=[]),
+                 'content_type': 'application/json'}),
+            'recipe-update': lambda ctx: (
+                'patch', reverse('recipe:recipe-detail',
+                                 args=[ctx['recipe_id']]),
+                {'data': {'title': f'Bench {next(serial)}'},
+                 'content_type': 'application/json'}),
+            'recipe-upload-image': lambda ctx: (
+                'put', reverse('recipe:recipe-upload-image',
+                               args=[ctx['recipe_id']]),
+                {'data': image, 'content_type': 'image/jpeg'}),
+            'recipe-bulk': lambda ctx: (
+                'post', reverse('recipe:recipe-bulk'),
+                {'data': [recipe_payload() for _ in range(10)],
+                 'content_type': 'application/json'}),
+            'tag-list': lambda ctx: (
+                'get', reverse('recipe:tag-list'), {}),
+            'tag-list-assigned': lambda ctx: (
+                'get', reverse('recipe:tag-list'),
+                {'data': {'assigned_only': 1}}),
+            'tag-create': lambda ctx: (
+                'post', reverse('recipe:tag-list'),
+                {'data': {'name': f'Bench {next(serial)}'},
+                 'content_type': 'application/json'}),
+            'tag-bulk': lambda ctx: (
+                'post', reverse('recipe:tag-bulk'),
+                {'data': [{'name': f'Bench {next(serial)}'}
+                          for _ in range(10)],
+                 'content_type': 'application/json'}),
+            'ingredient-list': lambda ctx: (
+                'get', reverse('recipe:ingredient-list'), {}),
+            'ingredient-create': lambda ctx: (
+                'post', reverse('recipe:ingredient-list'),
+                {'data': {'name': f'Bench {next(serial)}'},
+                 'content_type': 'application/json'}),
+            'ingredient-bulk': lambda ctx: (
+                'post', reverse('recipe:ingredient-bulk'),
+                {'data': [{'name': f'Bench {next(serial)}'}
+                          for _ in range(10)],
+                 'content_type': 'application/json'}),
+            'user-create': lambda ctx: (
+                'post', reverse('user:create'),
+                {'data': {'email': f'bench{next(serial)}@example.com',
+                          'password': PASSWORD, 'name': 'Bench'},
+                 'content_type': 'application/json', 'auth': False}),
+            'user-token': lambda ctx: (
+                'post', reverse('user:token'),
+                {'data': {'email': ctx['user'].email, 'password': PASSWORD},
+                 'content_type': 'application/json', 'auth': False}),
+            'user-me': lambda ctx: (
+                'get', reverse('user:me'), {}),
+            'user-me-update': lambda ctx: (
+                'patch', reverse('user:me'),
+                {'data': {'name': f'Bench {next(serial)}'},
+                 'content_type': 'application/json'}),
+        }
+
+    def request(self, client, build, ctx, options):
+        """Send one request, return (seconds, queries, status code)"""
+        method, path, kwargs = build(ctx)
+        kwargs = dict(kwargs)
+        if kwargs.pop('auth', True):
+            kwargs['HTTP_AUTHORIZATION'] = ctx['auth']
+        if 'content_type' in kwargs and not isinstance(kwargs['data'],
+                                                       (bytes, str)):
+            kwargs['data'] = json.dumps(kwargs['data'])
+        if options['no_response_cache']:
+            response_cache.bump_generation(ctx['user'].pk)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            elapsed = time.perf_counter() - start
+
+        return elapsed, counter.count, response.status_code
+
+    def run(self, options):
+        """Benchmark every selected route and return the metrics"""
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host and '*' not in host), 'localhost')
+        client = Client(HTTP_HOST=host.lstrip('.'))
+        routes = self.get_routes()
+        selected = options['routes'] or list(routes)
+        unknown = set(selected) - set(routes)
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(unknown)}')
+
+        results = {}
+        for name in selected:
+            build = routes[name]
+            contexts = self.contexts
+            for i in range(options['warmup']):
+                self.request(client, build, contexts[i % len(contexts)],
+                             options)
+
+            timings, queries, statuses = [], [], set()
+            started = time.perf_counter()
+            for i in range(options['requests']):
+                elapsed, executed, status_code = self.request(
+                    client, build, contexts[i % len(contexts)], options
+                )
+                timings.append(elapsed)
+                queries.append(executed)
+                statuses.add(status_code)
+            total = time.perf_counter() - started
+
+            results[name] = {
+                'requests': options['requests'],
+                'requests_per_sec': round(options['requests'] / total, 2),
+                'p50_ms': round(percentile(timings, 50) * 1000, 3),
+                'p95_ms': round(percentile(timings, 95) * 1000, 3),
+                'p99_ms': round(percentile(timings, 99) * 1000, 3),
+                'mean_ms': round(statistics.mean(timings) * 1000, 3),
+                'queries': max(queries),
+                'statuses': sorted(statuses),
+            }
+            self.stderr.write(
+                f'{name}: {results[name]["requests_per_sec"]} req/s, '
+                f'p95 {results[name]["p95_ms"]} ms, '
+                f'{results[name]["queries"]} queries'
+            )
+            failed = [code for code in statuses if code >= 400]
+            if failed:
+                self.stderr.write(self.style.WARNING(
+                    f'{name}: unexpected status {failed}'
+                ))
+
+        return results
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from itertools import count
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.management.commands.benchmark_api import percentile
+from core.models import Recipe
+from core.seed import seed_dataset
+
+SERVERS = {
+    'wsgi': ('gthread', 'app.wsgi'),
+    'asgi': ('uvicorn.workers.UvicornWorker', 'app.asgi:application'),
+}
+
+
+async def read_response(reader):
+    """Read an HTTP/1.1 response, return its status and keep-alive flag"""
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin1')
+    lines = head.split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+
+    return status, headers.get('connection') != 'close'
+
+
+class Command(BaseCommand):
+    '''Django command comparing the WSGI and ASGI servers under load'''
+    help = ('Serve the API with gunicorn through app.wsgi and app.asgi in '
+            'turn and report the requests per second many concurrent '
+            'keep-alive connections get from the recipe, tag and '
+            'ingredient read endpoints')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds of load per server')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes per server')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Threads of each WSGI worker')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--servers', nargs='*', choices=SERVERS,
+                            default=list(SERVERS))
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--no-response-cache', action='store_true',
+                            help='Make every request miss the response '
+                                 'cache')
+
+    def handle(self, *args, **options):
+        self.raise_file_limit(options['connections'])
+        # Servers run in other processes, the dataset must be committed
+        user = seed_dataset(users=1, recipes=options['recipes'])[0]
+        try:
+            token = Token.objects.create(user=user)
+            recipe = Recipe.objects.filter(user=user).latest('id')
+            paths = [
+                reverse('recipe:recipe-list'),
+                reverse('recipe:recipe-detail', args=[recipe.id]),
+                reverse('recipe:tag-list'),
+                reverse('recipe:ingredient-list'),
+            ]
+            results = {}
+            for name in options['servers']:
+                results[name] = self.run(name, paths, token.key, options)
+                self.stderr.write(
+                    f'{name}: {results[name]["requests_per_sec"]} req/s, '
+                    f'p95 {results[name]["p95_ms"]} ms, '
+                    f'{results[name]["errors"]} errors'
+                )
+        finally:
+            user.delete()
+
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def raise_file_limit(self, connections):
+        """Allow a socket per connection and then some"""
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        needed = connections + 100
+        if soft < needed:
+            if hard != resource.RLIM_INFINITY and hard < needed:
+                raise CommandError(
+                    f'{connections} connections need {needed} open files, '
+                    f'the limit is {hard}'
+                )
+            resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard))
+
+    def run(self, name, paths, token, options):
+        """Start the server, load it and return the measurements"""
+        worker_class, app = SERVERS[name]
+        env = dict(
+            os.environ,
+            GUNICORN_BIND=f'127.0.0.1:{options["port"]}',
+            GUNICORN_WORKER_CLASS=worker_class,
+            GUNICORN_WORKERS=str(options['workers']),
+            GUNICORN_THREADS=str(options['threads']),
+            GUNICORN_ACCESS_LOG='/dev/null',
+            # Recycling workers mid run would skew the results
+            GUNICORN_MAX_REQUESTS='0',
+            ALLOWED_HOSTS='localhost',
+        )
+        server = subprocess.Popen(
+            # gunicorn 19 cannot be run with -m
+            [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; '
+             'run()', '-c', 'gunicorn.conf.py', app],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        try:
+            self.wait_for_port(options['port'], server)
+            return asyncio.run(self.load(paths, token, options))
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for_port(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Server exited while starting')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+
+        raise CommandError(f'Server not listening after {timeout}s')
+
+    async def load(self, paths, token, options):
+        """Make requests over every connection until the time is up"""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + options['duration']
+        serial = count()
+        durations = []
+        errors = []
+
+        def request(path):
+            if options['no_response_cache']:
+                path = f'{path}?nonce={next(serial)}'
+            return (f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+                    f'Authorization: Token {token}\r\n\r\n').encode()
+
+        async def client(n):
+            writer = None
+            for i in count(n):
+                if loop.time() >= deadline:
+                    break
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(
+                            '127.0.0.1', options['port']
+                        )
+                    started = time.perf_counter()
+                    writer.write(request(paths[i % len(paths)]))
+                    status, keep_alive = await read_response(reader)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    errors.append(None)
+                    if writer is not None:
+                        writer.close()
+                    writer = None
+                    continue
+                if status == 200:
+                    durations.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors.append(status)
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            if writer is not None:
+                writer.close()
+
+        started = loop.time()
+        await asyncio.gather(*(
+            client(n) for n in range(options['connections'])
+        ))
+        elapsed = loop.time() - started
+        if not durations:
+            raise CommandError(f'No successful requests, {len(errors)} '
+                               f'errors')
+
+        return {
+            'errors': len(errors),
+            'p50_ms': round(statistics.median(durations), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'requests_per_sec': round(len(durations) / elapsed, 2),
+        }
@@ -0,0 +1,98 @@
+import json
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+
+from core.db.pool import POOL_TIMEOUTS, POOL_WAIT, pools
+from core.management.commands.benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    '''Django command comparing ways of getting database connections'''
+    help = ('Run simulated requests of one query from several threads with '
+            'a new connection per request, persistent connections and the '
+            'connection pool, and report their latency and throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per thread')
+        parser.add_argument('--pool-size', type=int, default=4)
+
+    def handle(self, *args, **options):
+        modes = {
+            'connect_per_request': {'CONN_MAX_AGE': 0, 'DB_POOL_SIZE': 0},
+            'persistent': {'CONN_MAX_AGE': 60, 'DB_POOL_SIZE': 0},
+            'pool': {'CONN_MAX_AGE': 0,
+                     'DB_POOL_SIZE': options['pool_size']},
+        }
+        results = {}
+        for mode, config in modes.items():
+            results[mode] = self.run(options, **config)
+            self.stderr.write(
+                f'{mode}: {results[mode]["requests_per_sec"]} req/s, '
+                f'p95 {results[mode]["p95_ms"]} ms'
+            )
+
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def run(self, options, CONN_MAX_AGE, DB_POOL_SIZE):
+        database = settings.DATABASES[DEFAULT_DB_ALIAS]
+        max_age = database.get('CONN_MAX_AGE', 0)
+        database['CONN_MAX_AGE'] = CONN_MAX_AGE
+        durations = []
+        try:
+            with override_settings(DB_POOL_SIZE=DB_POOL_SIZE):
+                threads = [
+                    threading.Thread(target=self.requests,
+                                     args=(options['requests'], durations))
+                    for _ in range(options['threads'])
+                ]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+        finally:
+            database['CONN_MAX_AGE'] = max_age
+        result = {
+            'p50_ms': round(statistics.median(durations), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'requests_per_sec': round(len(durations) / elapsed, 2),
+        }
+
+        pool = pools.pop(DEFAULT_DB_ALIAS, None)
+        if pool is not None:
+            labels = (DEFAULT_DB_ALIAS,)
+            checkouts, waited = POOL_WAIT.get(labels)
+            result['pool_wait_ms'] = round(
+                waited * 1000 / max(checkouts, 1), 3
+            )
+            result['pool_timeouts'] = POOL_TIMEOUTS.get(labels)
+            pool.close()
+
+        return result
+
+    def requests(self, count, durations):
+        '''Make count requests in this thread, like the request handler'''
+        connection = connections[DEFAULT_DB_ALIAS]
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__,
+                                     environ={'REQUEST_METHOD': 'GET'})
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                finally:
+                    request_finished.send(sender=self.__class__)
+                durations.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
@@ -0,0 +1,104 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.throttling import token_buckets
+
+PASSWORD = 'benchpass'
+
+
+class Command(BaseCommand):
+    '''Django command measuring the CPU cost of password hashing'''
+    help = ('Time hashing and verifying a password and logging in through '
+            '/api/user/token/ for PBKDF2 iteration counts, and the cost of '
+            'a login rejected by the throttle')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, nargs='*',
+                            default=[60000, 120000, 260000])
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        results = {}
+        # Users created while benchmarking are rolled back at the end
+        with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'localhost']):
+            for iterations in options['iterations']:
+                with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations):
+                    result = self.run(iterations, options['rounds'])
+                results[f'pbkdf2_{iterations}'] = result
+                self.stderr.write(
+                    f'{iterations} iterations: verify '
+                    f'{result["verify_ms"]} ms, '
+                    f'{result["logins_per_sec"]} logins/s'
+                )
+            results['throttled'] = self.run_throttled(options['rounds'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def time(self, func, rounds):
+        """Return the median milliseconds of func over rounds calls"""
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        return statistics.median(timings)
+
+    def run(self, iterations, rounds):
+        encoded = make_password(PASSWORD)
+        hash_ms = self.time(lambda: make_password(PASSWORD), rounds)
+        verify_ms = self.time(lambda: check_password(PASSWORD, encoded),
+                              rounds)
+
+        user = get_user_model().objects.create_user(
+            f'bench{iterations}@example.com', PASSWORD
+        )
+        client = self.get_client()
+        payload = {'email': user.email, 'password': PASSWORD}
+        with override_settings(LOGIN_THROTTLE_IP_BURST=0,
+                               LOGIN_THROTTLE_EMAIL_BURST=0):
+            login_ms = self.time(
+                lambda: client.post(reverse('user:token'), payload), rounds
+            )
+
+        return {
+            'hash_ms': round(hash_ms, 3),
+            'verify_ms': round(verify_ms, 3),
+            'login_ms': round(login_ms, 3),
+            # One core spends about verify_ms of CPU on every login
+            'logins_per_sec': round(1000 / verify_ms, 2),
+        }
+
+    def run_throttled(self, rounds):
+        """Time logins rejected by an empty per email bucket"""
+        client = self.get_client()
+        payload = {'email': 'throttled@example.com', 'password': PASSWORD}
+        token_buckets.reset()
+        with override_settings(LOGIN_THROTTLE_IP_BURST=0,
+                               LOGIN_THROTTLE_EMAIL_BURST=1,
+                               LOGIN_THROTTLE_EMAIL_RATE=1):
+            client.post(reverse('user:token'), payload)
+            rejected_ms = self.time(
+                lambda: client.post(reverse('user:token'), payload), rounds
+            )
+        token_buckets.reset()
+
+        return {'rejected_ms': round(rejected_ms, 3)}
+
+    def get_client(self):
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host and '*' not in host), 'localhost')
+
+        return Client(HTTP_HOST=host.lstrip('.'))
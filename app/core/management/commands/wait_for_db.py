@@ -1,18 +1,71 @@
 import time
+from django.conf import settings
 from django.db import connections
-from django.db.utils import OperationalError # Error to be shown if DB is not available
-from django.core.management.base import BaseCommand # Parent class
+# Error to be shown if DB is not available
+from django.db.utils import OperationalError
+# Parent class
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import warm_up
+
 
 class Command(BaseCommand):
     '''Django Command to pause execution until DB is available'''
-    
+    help = ('Wait until every database answers a query, retrying with '
+            'exponential backoff, and optionally warm up the API queries')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append',
+                            help='Only wait for this database alias')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Give up after this many seconds')
+        parser.add_argument('--delay', type=float, default=0.1,
+                            help='First retry delay, doubled every retry')
+        parser.add_argument('--max-delay', type=float, default=5)
+        parser.add_argument('--warmup', action='store_true',
+                            help='Run a request of every recipe viewset '
+                                 'and report their timing')
+
     def handle(self, *args, **options):
-        self.stdout.write('Waiting for database') # Prints to terminal
-        db_conn = None
-        while not db_conn:
-            try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 sec')
-                time.sleep(1) # Sleep for one sec
-        self.stdout.write(self.style.SUCCESS('Database available!')) # If connection succeeds
\ No newline at end of file
+        # Prints to terminal
+        self.stdout.write('Waiting for database')
+        deadline = time.monotonic() + options['timeout']
+        delay = options['delay']
+        for alias in options['database'] or settings.DATABASES:
+            while True:
+                try:
+                    self.check_connection(alias)
+                    break
+                except OperationalError as error:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise CommandError(
+                            f'Database {alias} unavailable after '
+                            f'{options["timeout"]} sec: {error}'
+                        )
+                    wait = min(delay, remaining)
+                    self.stdout.write(
+                        f'Database unavailable, waiting {wait:.1f} sec'
+                    )
+                    time.sleep(wait)
+                    delay = min(delay * 2, options['max_delay'])
+        # If connection succeeds
+        self.stdout.write(self.style.SUCCESS('Database available!'))
+
+        if options['warmup']:
+            self.warmup()
+
+    def check_connection(self, alias):
+        '''Run a query, as looking the connection up does not connect'''
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def warmup(self):
+        timings = warm_up()
+        if not timings:
+            self.stdout.write('No recipes to warm up with')
+            return
+        for description, durations in timings:
+            rounds = ', '.join(f'{duration:.1f}' for duration in durations)
+            self.stdout.write(f'{description}: {rounds} ms')
+        self.stdout.write(self.style.SUCCESS('Warmed up'))
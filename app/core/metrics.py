@@ -0,0 +1,437 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from time import perf_counter, sleep
+from uuid import uuid4
+
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+REQUEST_LABELS = ('view', 'method', 'status')
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Saved metrics of exited processes, and the key listing their files
+ARCHIVE = 'archive.json'
+ARCHIVED = 'archived'
+
+_local = threading.local()
+
+
+def escape_label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{escape_label(value)}"'
+                    for name, value in zip(names, values))
+
+
+class Histogram:
+    """Thread safe histogram per label values, in the Prometheus model
+
+    Counts are kept per bucket and only made cumulative when exposed, so
+    an observation is one bisect and one increment under the lock.
+    """
+
+    def __init__(self, name, documentation, buckets, labels=REQUEST_LABELS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        """Add value to the series of the labels tuple"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [
+                    [0] * (len(self.buckets) + 1), 0
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def get(self, labels):
+        """Return the (count, sum) of the labels tuple's series"""
+        with self._lock:
+            counts, total = self._series.get(labels, ((), 0))
+
+            return sum(counts), total
+
+    def values(self):
+        """Return labels tuple -> [bucket counts, sum] of every series"""
+        with self._lock:
+            return {labels: [list(counts), total]
+                    for labels, (counts, total) in self._series.items()}
+
+    @staticmethod
+    def combine(value, other):
+        return [[a + b for a, b in zip(value[0], other[0])],
+                value[1] + other[1]]
+
+    def expose(self, values=None):
+        """Return the histogram in the Prometheus text format
+
+        values defaults to this process's, see values().
+        """
+        if values is None:
+            values = self.values()
+        series = sorted((labels, counts, total)
+                        for labels, (counts, total) in values.items())
+
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labels, counts, total in series:
+            label_text = format_labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},'
+                             f'le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total!r}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    cumulative = True
+
+
+class Counter:
+    """Thread safe counter per label values"""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def combine(value, other):
+        return value + other
+
+    def expose(self, values=None):
+        if values is None:
+            values = self.values()
+
+        return '\n'.join(
+            [f'# HELP {self.name} {self.documentation}',
+             f'# TYPE {self.name} counter'] +
+            [f'{self.name}{{{format_labels(self.labels, labels)}}} {value}'
+             for labels, value in sorted(values.items())]
+        )
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    cumulative = True
+
+
+class Gauge:
+    """Gauge read when exposed, collect returns (labels, value) pairs"""
+
+    def __init__(self, name, documentation, labels, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.collect = collect
+
+    def values(self):
+        return dict(self.collect())
+
+    @staticmethod
+    def combine(value, other):
+        return value + other
+
+    def expose(self, values=None):
+        if values is None:
+            values = self.values()
+
+        return '\n'.join(
+            [f'# HELP {self.name} {self.documentation}',
+             f'# TYPE {self.name} gauge'] +
+            [f'{self.name}{{{format_labels(self.labels, labels)}}} {value}'
+             for labels, value in sorted(values.items())]
+        )
+
+    def reset(self):
+        pass
+
+    # The values of exited processes are dropped
+    cumulative = False
+
+
+class Registry:
+    """The metrics exposed at /metrics
+
+    Every process has its own metrics. When several serve the same
+    /metrics, they save theirs to a shared directory, see save_every(),
+    and expose() adds them all up. archive() keeps the histograms and
+    counters of exited processes.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        # (pid, file name) of the last save()
+        self.saved_by = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def expose(self, directory=None):
+        """Return the metrics in the Prometheus text format
+
+        With a directory, the metrics saved there by every process are
+        added up, this process's saved first.
+        """
+        if directory is None:
+            return ''.join(metric.expose() + '\n' for metric in self.metrics)
+
+        self.save(directory)
+        values = self.load(directory)
+
+        return ''.join(metric.expose(values[metric.name]) + '\n'
+                       for metric in self.metrics)
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    def save(self, directory):
+        """Save this process's metrics to directory/<pid>-<id>.json
+
+        The id tells apart processes given the pid of an exited one.
+        """
+        pid = os.getpid()
+        if self.saved_by is None:
+            os.makedirs(directory, exist_ok=True)
+        if self.saved_by is None or self.saved_by[0] != pid:
+            self.saved_by = (pid, f'{pid}-{uuid4().hex}.json')
+        self.write(os.path.join(directory, self.saved_by[1]), {
+            metric.name: metric.values() for metric in self.metrics
+        })
+
+    def save_every(self, directory, interval):
+        """save() every interval seconds from a daemon thread"""
+        def run():
+            while True:
+                sleep(interval)
+                self.save(directory)
+
+        threading.Thread(target=run, name='metrics-save', daemon=True).start()
+
+    def load(self, directory):
+        """Return metric name -> values added up from every saved file"""
+        while True:
+            try:
+                return self.load_once(directory)
+            except FileNotFoundError:
+                # Archived while loading, load the archive with it again
+                continue
+
+    def load_once(self, directory):
+        values = {metric.name: {} for metric in self.metrics}
+        archived = ()
+        archive_path = os.path.join(directory, ARCHIVE)
+        if os.path.exists(archive_path):
+            saved = self.read(archive_path)
+            archived = saved[ARCHIVED]
+            self.add(values, saved)
+        for name in os.listdir(directory):
+            if name.endswith('.json') and name != ARCHIVE and \
+                    name not in archived:
+                self.add(values, self.read(os.path.join(directory, name)))
+
+        return values
+
+    def archive(self, directory, pid):
+        """Add the histograms and counters saved by the exited process pid
+        to the archive of directory, dropping its gauges
+        """
+        if not os.path.isdir(directory):
+            return
+
+        names = [name for name in os.listdir(directory)
+                 if name.startswith(f'{pid}-') and name.endswith('.json')]
+        if not names:
+            return
+
+        archive_path = os.path.join(directory, ARCHIVE)
+        values = {metric.name: {} for metric in self.metrics
+                  if metric.cumulative}
+        for path in [archive_path] + [os.path.join(directory, name)
+                                      for name in names]:
+            if os.path.exists(path):
+                self.add(values, self.read(path))
+        # Readers skip the files until they are removed
+        self.write(archive_path, values, archived=names)
+        for name in names:
+            os.remove(os.path.join(directory, name))
+
+    def add(self, values, saved):
+        """Add the saved values of the metrics in values to them"""
+        for metric in self.metrics:
+            if metric.name not in values:
+                continue
+            metric_values = values[metric.name]
+            for labels, value in saved.get(metric.name, ()):
+                labels = tuple(labels)
+                if labels in metric_values:
+                    value = metric.combine(metric_values[labels], value)
+                metric_values[labels] = value
+
+    @staticmethod
+    def read(path):
+        with open(path) as file:
+            return json.load(file)
+
+    @staticmethod
+    def write(path, values, archived=()):
+        """Write values to path, replacing it at once for readers"""
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({ARCHIVED: list(archived), **{
+                name: list(metric_values.items())
+                for name, metric_values in values.items()
+            }}, file)
+        os.replace(temporary, path)
+
+
+registry = Registry()
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Wall time of requests',
+    DURATION_BUCKETS
+)
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'Database queries run per request',
+    QUERY_BUCKETS
+)
+REQUEST_DB_DURATION = registry.histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database queries per request', DURATION_BUCKETS
+)
+REQUEST_SERIALIZER_DURATION = registry.histogram(
+    'http_request_serializer_duration_seconds',
+    'Time spent serializing response data per request', DURATION_BUCKETS
+)
+RESPONSE_SIZE = registry.histogram(
+    'http_response_size_bytes', 'Size of response bodies', SIZE_BUCKETS
+)
+
+
+class RequestMetrics:
+    """Totals of one request, collected while it is the current one"""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper timing every query"""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    @contextmanager
+    def collect(self):
+        """Time the queries of every connection and serializers run inside"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            _local.current = self
+            try:
+                yield self
+            finally:
+                _local.current = None
+
+    def observe(self, labels, size):
+        """Add the totals of the finished request to the histograms"""
+        REQUEST_DURATION.observe(labels, perf_counter() - self.started)
+        REQUEST_QUERIES.observe(labels, self.queries)
+        REQUEST_DB_DURATION.observe(labels, self.db_time)
+        REQUEST_SERIALIZER_DURATION.observe(labels, self.serializer_time)
+        RESPONSE_SIZE.observe(labels, size)
+
+    def server_timing(self):
+        """Return the Server-Timing header value, durations are in ms"""
+        total = (perf_counter() - self.started) * 1000
+        return (f'db;dur={self.db_time * 1000:.2f};'
+                f'desc="{self.queries} queries", '
+                f'serializer;dur={self.serializer_time * 1000:.2f}, '
+                f'total;dur={total:.2f}')
+
+
+@contextmanager
+def serializer_timer():
+    """Add the time spent inside to the current request's serializer time
+
+    Nested timers only count once.
+    """
+    metrics = getattr(_local, 'current', None)
+    if metrics is None or metrics.serializing:
+        yield
+        return
+
+    metrics.serializing = True
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += perf_counter() - started
+        metrics.serializing = False
+
+
+def instrument_serializers():
+    """Time BaseSerializer.data, where every DRF serializer renders"""
+    data = BaseSerializer.data.fget
+    if getattr(data, 'timed', False):
+        return
+
+    def timed_data(self):
+        with serializer_timer():
+            return data(self)
+
+    timed_data.timed = True
+    BaseSerializer.data = property(timed_data)
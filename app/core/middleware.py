@@ -0,0 +1,95 @@
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.metrics import RequestMetrics
+from core.queries import QueryInspector
+
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                     'OPTIONS'))
+
+
+def get_labels(request, response):
+    """Return the metric labels of a finished request"""
+    match = request.resolver_match
+    method = request.method if request.method in METHODS else 'other'
+
+    return (match.view_name if match else 'unresolved', method,
+            str(response.status_code))
+
+
+def sample_inspector():
+    """Return a QueryInspector for a sampled request, None otherwise"""
+    if random.random() >= settings.QUERY_INSPECTION_SAMPLE_RATE:
+        return None
+
+    return QueryInspector()
+
+
+class MetricsMiddleware:
+    """Record request metrics by URL name and add a Server-Timing header
+
+    Wall time, database queries and time, serializer time and response
+    size go to the histograms served at /metrics. Streamed responses are
+    recorded once their content is consumed, their Server-Timing header
+    only covers the time to the first byte.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        with metrics.collect():
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, metrics,
+                get_labels(request, response)
+            )
+        else:
+            metrics.observe(get_labels(request, response),
+                            len(response.content))
+        response['Server-Timing'] = metrics.server_timing()
+
+        return response
+
+    def stream(self, content, metrics, labels):
+        """Yield content, counting its queries and bytes"""
+        size = 0
+        with metrics.collect():
+            try:
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                metrics.observe(labels, size)
+
+
+class QueryInspectionMiddleware:
+    """Log N+1 and slow queries of a sampled fraction of requests
+
+    QUERY_INSPECTION_SAMPLE_RATE is the fraction of requests inspected,
+    0 removes the middleware. Queries run while a streamed response is
+    consumed are not inspected.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inspector = sample_inspector()
+        if inspector is None:
+            return self.get_response(request)
+
+        with inspector.inspect():
+            response = self.get_response(request)
+        inspector.report(f'{request.method} {request.path}')
+
+        return response
@@ -0,0 +1,183 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:36
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The text search configuration and core_recipe_search_owned() must match
+# recipe.search. Lexemes are prefixed with the owner id, so the GIN posting
+# list of a word only holds one user's recipes. Unprefixed, a search for a
+# common word decodes the list of every user's recipes using it.
+SEARCH_FUNCTIONS_SQL = '''
+CREATE FUNCTION core_recipe_search_owned(text, integer) RETURNS text AS $$
+    -- Prefix the quoted lexemes of a tsvector or tsquery text
+    SELECT regexp_replace(
+        $1, $re$'((?:[^']|'')*)'$re$, $re$'$re$ || $2 || $re$:\\1'$re$, 'g'
+    );
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION core_recipe_search_vector(text, text, text, integer)
+RETURNS tsvector AS $$
+    SELECT core_recipe_search_owned((
+        setweight(to_tsvector('english', coalesce($1, '')), 'A')
+        || setweight(to_tsvector('english', coalesce($2, '')), 'B')
+        || setweight(to_tsvector('english', coalesce($3, '')), 'B')
+    )::text, $4)::tsvector;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION core_recipe_search_refresh(integer[]) RETURNS void AS $$
+    -- Joins rather than = ANY($1), which rescans the array for every row
+    WITH changed AS (SELECT DISTINCT unnest($1) AS id)
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(
+        r.title, tags.names, ingredients.names, r.user_id
+    )
+    FROM changed
+    LEFT JOIN (
+        SELECT rt.recipe_id, string_agg(t.name, ' ') AS names
+        FROM changed
+        JOIN core_recipe_tags rt ON rt.recipe_id = changed.id
+        JOIN core_tag t ON t.id = rt.tag_id
+        GROUP BY rt.recipe_id
+    ) tags ON tags.recipe_id = changed.id
+    LEFT JOIN (
+        SELECT ri.recipe_id, string_agg(i.name, ' ') AS names
+        FROM changed
+        JOIN core_recipe_ingredients ri ON ri.recipe_id = changed.id
+        JOIN core_ingredient i ON i.id = ri.ingredient_id
+        GROUP BY ri.recipe_id
+    ) ingredients ON ingredients.recipe_id = changed.id
+    WHERE r.id = changed.id;
+$$ LANGUAGE sql;
+'''
+
+# New recipes have no links yet, other changes look the links up
+RECIPE_TRIGGER_SQL = '''
+CREATE FUNCTION core_recipe_search_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.search_vector := core_recipe_search_vector(
+            NEW.title, NULL, NULL, NEW.user_id
+        );
+    ELSE
+        NEW.search_vector := core_recipe_search_vector(
+            NEW.title,
+            (SELECT string_agg(t.name, ' ')
+             FROM core_recipe_tags rt JOIN core_tag t ON t.id = rt.tag_id
+             WHERE rt.recipe_id = NEW.id),
+            (SELECT string_agg(i.name, ' ')
+             FROM core_recipe_ingredients ri
+             JOIN core_ingredient i ON i.id = ri.ingredient_id
+             WHERE ri.recipe_id = NEW.id),
+            NEW.user_id
+        );
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_search_update
+BEFORE INSERT OR UPDATE OF title, user_id ON core_recipe
+FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_update();
+'''
+
+# Links added or removed, once per statement so bulk inserts of links
+# rebuild every affected recipe with a single set based UPDATE
+LINK_TRIGGERS_SQL = '''
+CREATE FUNCTION core_recipe_search_links() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_recipe_search_refresh(
+        ARRAY(SELECT DISTINCT recipe_id FROM changed_links)
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+''' + ''.join(
+    f'''
+CREATE TRIGGER {table}_search_{event}
+AFTER {event} ON {table}
+REFERENCING {transition} TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_links();
+'''
+    for table in ('core_recipe_tags', 'core_recipe_ingredients')
+    for event, transition in (('insert', 'NEW'), ('delete', 'OLD'))
+)
+
+# Renamed tags and ingredients, recipes linked to them are rebuilt
+RENAME_TRIGGERS_SQL = '''
+CREATE FUNCTION core_recipe_search_rename() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'core_tag' THEN
+        PERFORM core_recipe_search_refresh(ARRAY(
+            SELECT DISTINCT rt.recipe_id FROM core_recipe_tags rt
+            JOIN new_rows n ON n.id = rt.tag_id
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        ));
+    ELSE
+        PERFORM core_recipe_search_refresh(ARRAY(
+            SELECT DISTINCT ri.recipe_id FROM core_recipe_ingredients ri
+            JOIN new_rows n ON n.id = ri.ingredient_id
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+''' + ''.join(
+    f'''
+CREATE TRIGGER {table}_search_rename
+AFTER UPDATE ON {table}
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_rename();
+'''
+    for table in ('core_tag', 'core_ingredient')
+)
+
+DROP_SQL = '''
+DROP TRIGGER core_tag_search_rename ON core_tag;
+DROP TRIGGER core_ingredient_search_rename ON core_ingredient;
+DROP FUNCTION core_recipe_search_rename();
+DROP TRIGGER core_recipe_tags_search_insert ON core_recipe_tags;
+DROP TRIGGER core_recipe_tags_search_delete ON core_recipe_tags;
+DROP TRIGGER core_recipe_ingredients_search_insert
+    ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_ingredients_search_delete
+    ON core_recipe_ingredients;
+DROP FUNCTION core_recipe_search_links();
+DROP TRIGGER core_recipe_search_update ON core_recipe;
+DROP FUNCTION core_recipe_search_update();
+DROP FUNCTION core_recipe_search_refresh(integer[]);
+DROP FUNCTION core_recipe_search_vector(text, text, text, integer);
+DROP FUNCTION core_recipe_search_owned(text, integer);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            SEARCH_FUNCTIONS_SQL + RECIPE_TRIGGER_SQL + LINK_TRIGGERS_SQL
+            + RENAME_TRIGGERS_SQL,
+            DROP_SQL,
+        ),
+        # Fill in existing recipes before indexing them
+        migrations.RunSQL(
+            'SELECT core_recipe_search_refresh(ARRAY(SELECT id FROM core_recipe));',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search__c01407_gin'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:12
+
+import core.models
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_search_vector'),
+    ]
+
+    # Existing recipes are left null, they render from their relations
+    # until the recipe_snapshots command builds their snapshots. Adding
+    # the field with its default would give them all empty snapshots.
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='snapshot',
+            field=django.contrib.postgres.fields.jsonb.JSONField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='snapshot',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=core.models.empty_recipe_snapshot, editable=False, null=True),
+        ),
+    ]
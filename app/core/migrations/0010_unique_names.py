@@ -0,0 +1,79 @@
+# Generated by Django 2.1.15 on 2026-10-18 07:26
+
+from django.db import migrations
+
+# Links to duplicates of a (user, name) pair move to the oldest object of
+# that pair, then the duplicates are deleted. Recipes whose links change
+# get a null snapshot, they render from their relations until the
+# recipe_snapshots command rebuilds them.
+MERGE_SQL = '''
+CREATE TEMPORARY TABLE {table}_merged ON COMMIT DROP AS
+SELECT id, keep_id FROM (
+    SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id
+    FROM {table}
+) objects WHERE id <> keep_id;
+
+UPDATE core_recipe SET snapshot = NULL WHERE id IN (
+    SELECT l.recipe_id FROM {links} l
+    JOIN {table}_merged m ON m.id = l.{column}
+);
+INSERT INTO {links} (recipe_id, {column})
+SELECT l.recipe_id, m.keep_id FROM {links} l
+JOIN {table}_merged m ON m.id = l.{column}
+ON CONFLICT DO NOTHING;
+DELETE FROM {links} WHERE {column} IN (SELECT id FROM {table}_merged);
+DELETE FROM {table} WHERE id IN (SELECT id FROM {table}_merged);
+'''
+
+# Named like Postgres names unique constraints, so IntegrityErrors can be
+# told apart, see recipe.names
+UNIQUE_SQL = '''
+ALTER TABLE {table} ADD CONSTRAINT {table}_user_id_name_key
+UNIQUE (user_id, name);
+'''
+
+
+def unique_names(model_name, table, links, column):
+    return [
+        migrations.RunSQL(
+            MERGE_SQL.format(table=table, links=links, column=column),
+            migrations.RunSQL.noop,
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(
+                UNIQUE_SQL.format(table=table),
+                f'ALTER TABLE {table} '
+                f'DROP CONSTRAINT {table}_user_id_name_key;',
+            )],
+            state_operations=[migrations.AlterUniqueTogether(
+                name=model_name,
+                unique_together={('user', 'name')},
+            )],
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_snapshot'),
+    ]
+
+    operations = [
+        # Deleted links must not leave deferred foreign key checks pending
+        # when the tables are altered
+        migrations.RunSQL('SET CONSTRAINTS ALL IMMEDIATE;',
+                          migrations.RunSQL.noop),
+        *unique_names('tag', 'core_tag', 'core_recipe_tags', 'tag_id'),
+        *unique_names('ingredient', 'core_ingredient',
+                      'core_recipe_ingredients', 'ingredient_id'),
+        # The unique indexes cover the same columns
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingred_user_id_b96ee8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='core_tag_user_id_74e398_idx',
+        ),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 2.1.15 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+# (related table, link table, link table column) per relation
+RELATIONS = (
+    ('core_tag', 'core_recipe_tags', 'tag_id'),
+    ('core_ingredient', 'core_recipe_ingredients', 'ingredient_id'),
+)
+
+# Links added or removed, once per statement so bulk inserts of links and
+# cascading recipe deletes adjust every affected count with one UPDATE.
+# Rows are locked in id order first, concurrent link writes sharing tags
+# would deadlock locking them in whatever order the UPDATE joins them.
+COUNT_FUNCTION_SQL = '''
+CREATE FUNCTION core_recipe_count_links() RETURNS trigger AS $$
+DECLARE
+    delta integer := CASE TG_OP WHEN 'INSERT' THEN 1 ELSE -1 END;
+BEGIN
+    IF TG_TABLE_NAME = 'core_recipe_tags' THEN
+        PERFORM 1 FROM core_tag
+        WHERE id IN (SELECT tag_id FROM changed_links)
+        ORDER BY id FOR UPDATE;
+        UPDATE core_tag t SET recipe_count = t.recipe_count + delta * c.n
+        FROM (
+            SELECT tag_id AS id, count(*) AS n FROM changed_links
+            GROUP BY tag_id
+        ) c
+        WHERE t.id = c.id;
+    ELSE
+        PERFORM 1 FROM core_ingredient
+        WHERE id IN (SELECT ingredient_id FROM changed_links)
+        ORDER BY id FOR UPDATE;
+        UPDATE core_ingredient i
+        SET recipe_count = i.recipe_count + delta * c.n
+        FROM (
+            SELECT ingredient_id AS id, count(*) AS n FROM changed_links
+            GROUP BY ingredient_id
+        ) c
+        WHERE i.id = c.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+COUNT_TRIGGERS_SQL = COUNT_FUNCTION_SQL + ''.join(
+    f'''
+CREATE TRIGGER {links}_count_{event}
+AFTER {event} ON {links}
+REFERENCING {transition} TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_count_links();
+'''
+    for _, links, _ in RELATIONS
+    for event, transition in (('insert', 'NEW'), ('delete', 'OLD'))
+)
+
+DROP_COUNT_TRIGGERS_SQL = ''.join(
+    f'DROP TRIGGER {links}_count_{event} ON {links};\n'
+    for _, links, _ in RELATIONS for event in ('insert', 'delete')
+) + 'DROP FUNCTION core_recipe_count_links();\n'
+
+# Counts of the links that existed before the triggers
+FILL_SQL = ''.join(
+    f'''
+UPDATE {table} o SET recipe_count = c.n
+FROM (SELECT {column} AS id, count(*) AS n FROM {links} GROUP BY 1) c
+WHERE o.id = c.id;
+'''
+    for table, links, column in RELATIONS
+)
+
+# Every count update is an UPDATE of core_tag or core_ingredient, which
+# fires the search rename trigger of 0008. It joins the links of every
+# updated row before checking for a renamed one, return early instead.
+RENAME_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION core_recipe_search_rename() RETURNS trigger AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_TABLE_NAME = 'core_tag' THEN
+        PERFORM core_recipe_search_refresh(ARRAY(
+            SELECT DISTINCT rt.recipe_id FROM core_recipe_tags rt
+            JOIN new_rows n ON n.id = rt.tag_id
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        ));
+    ELSE
+        PERFORM core_recipe_search_refresh(ARRAY(
+            SELECT DISTINCT ri.recipe_id FROM core_recipe_ingredients ri
+            JOIN new_rows n ON n.id = ri.ingredient_id
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+RESTORE_RENAME_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION core_recipe_search_rename() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'core_tag' THEN
+        PERFORM core_recipe_search_refresh(ARRAY(
+            SELECT DISTINCT rt.recipe_id FROM core_recipe_tags rt
+            JOIN new_rows n ON n.id = rt.tag_id
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        ));
+    ELSE
+        PERFORM core_recipe_search_refresh(ARRAY(
+            SELECT DISTINCT ri.recipe_id FROM core_recipe_ingredients ri
+            JOIN new_rows n ON n.id = ri.ingredient_id
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_unique_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(RENAME_FUNCTION_SQL, RESTORE_RENAME_FUNCTION_SQL),
+        # Links written while migrating wait on the locks taken by the
+        # added fields, so no link is counted twice or missed
+        migrations.RunSQL(COUNT_TRIGGERS_SQL, DROP_COUNT_TRIGGERS_SQL),
+        migrations.RunSQL(FILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='core_ingred_user_id_095066_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='core_tag_user_id_a50c7e_idx'),
+        ),
+    ]
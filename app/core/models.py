@@ -2,10 +2,15 @@ import uuid
 import os
 
 from django.db import models
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, \
     BaseUserManager, PermissionsMixin
 from django.conf import settings
 
+from core.hashers import hash_passwords
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for a new recipe image"""
@@ -16,6 +21,11 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipe/', filename)
 
 
+def empty_recipe_snapshot():
+    """Snapshot of a recipe without tags and ingredients"""
+    return {'tags': [], 'ingredients': []}
+
+
 class UserManager(BaseUserManager):
     
     def create_user(self, email ,password=None, **kwargs):
@@ -27,6 +37,26 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
     
+    def bulk_create_users(self, users, processes=None, batch_size=None):
+        '''Create users from dicts of create_user() arguments at once
+        
+        Passwords are hashed in parallel by a pool of processes, see
+        hash_passwords(). Like bulk_create() this sends no save signals.
+        '''
+        users = [dict(fields) for fields in users]
+        passwords = hash_passwords(
+            [fields.pop('password', None) for fields in users], processes
+        )
+        objs = []
+        for fields, password in zip(users, passwords):
+            email = fields.pop('email', None)
+            if not email:
+                raise ValueError('You must specify an email adress!')
+            objs.append(self.model(email=self.normalize_email(email),
+                                   password=password, **fields))
+            
+        return self.bulk_create(objs, batch_size=batch_size)
+    
     def create_superuser(self, email, password):
         '''Create and save a new superuser'''
         user = self.create_user(email, password)
@@ -51,7 +81,18 @@ class Tag(models.Model):
     """Tag to be associated with a recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,)
+    # Recipes linked to the tag, kept up to date by database triggers
+    recipe_count = models.IntegerField(default=0, editable=False)
     
+    class Meta:
+        # Names are unique per user, recipes can link them by name. The
+        # unique index also serves listings filtering on user and
+        # ordering by name.
+        unique_together = ('user', 'name')
+        indexes = [
+            # Listing the most used first, id breaks ties
+            models.Index(fields=['user', '-recipe_count', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -64,6 +105,18 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Recipes using the ingredient, kept up to date by database triggers
+    recipe_count = models.IntegerField(default=0, editable=False)
+    
+    class Meta:
+        # Names are unique per user, recipes can link them by name. The
+        # unique index also serves listings filtering on user and
+        # ordering by name.
+        unique_together = ('user', 'name')
+        indexes = [
+            # Listing the most used first, id breaks ties
+            models.Index(fields=['user', '-recipe_count', 'id']),
+        ]
     
     def __str__(self):
         return self.name
@@ -82,6 +135,22 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Variant name -> resized image path
+    image_variants = JSONField(default=dict, blank=True)
+    # Title, tag and ingredient names, kept up to date by database triggers
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Tag and ingredient id/name pairs kept up to date by recipe.signals,
+    # null until built for recipes created before snapshots existed
+    snapshot = JSONField(null=True, editable=False,
+                         default=empty_recipe_snapshot)
+    
+    class Meta:
+        indexes = [
+            # Listing filters on user and pages by id
+            models.Index(fields=['user', 'id']),
+            # Full-text search matches the stored vector
+            GinIndex(fields=['search_vector']),
+        ]
     
     def __str__(self):
         return self.title
\ No newline at end of file
@@ -0,0 +1,120 @@
+import logging
+import re
+import sys
+import traceback
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+
+logger = logging.getLogger(__name__)
+
+RepeatedQuery = namedtuple('RepeatedQuery', 'template count origin stack')
+SlowQuery = namedtuple('SlowQuery', 'sql duration origin stack')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+PLACEHOLDER_LISTS = re.compile(r'\(\?(?:, \?)*\)')
+WHITESPACE = re.compile(r'\s+')
+# Frames worth showing, the project's own code
+APP_ROOT = settings.BASE_DIR + '/'
+STACK_LIMIT = 10
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Return sql with literals, parameters and IN lists replaced
+
+    Queries differing only in their values, or in the number of values in
+    an IN list, share a template.
+    """
+    template = LITERALS.sub('?', sql)
+    template = PLACEHOLDER_LISTS.sub('(...)', template)
+
+    return WHITESPACE.sub(' ', template).strip()
+
+
+def find_origin(frame):
+    """Return (serializer field, app stack) of the code running a query
+
+    The field is the innermost named serializer field on the stack, as
+    'RecipeSerializer.tags', or None outside of serializers.
+    """
+    stack = [entry for entry in traceback.extract_stack(frame)
+             if entry.filename.startswith(APP_ROOT) and
+             entry.filename != __file__]
+    origin = None
+    while frame is not None and origin is None:
+        field = frame.f_locals.get('self')
+        if isinstance(field, Field) and field.field_name and \
+                field.parent is not None:
+            origin = f'{type(field.parent).__name__}.{field.field_name}'
+        frame = frame.f_back
+
+    return origin, traceback.format_list(stack[-STACK_LIMIT:])
+
+
+class QueryInspector:
+    """Database execute wrapper grouping queries by normalized template
+
+    A template run threshold times or more is reported as a repeated
+    query, the N+1 signature, with the origin of its threshold-th run.
+    Queries slower than slow_ms are reported with their origin as well.
+    """
+
+    def __init__(self, threshold=None, slow_ms=None):
+        self.threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        self.slow_ms = settings.SLOW_QUERY_MS if slow_ms is None else slow_ms
+        self.counts = {}
+        self.origins = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (perf_counter() - started) * 1000
+            template = normalize_sql(sql)
+            count = self.counts.get(template, 0) + 1
+            self.counts[template] = count
+            if count == self.threshold:
+                self.origins[template] = find_origin(sys._getframe(1))
+            if self.slow_ms and duration >= self.slow_ms:
+                self.slow.append(SlowQuery(
+                    sql, duration, *find_origin(sys._getframe(1))
+                ))
+
+    @contextmanager
+    def inspect(self):
+        """Inspect the queries of every connection run inside"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def repeated(self):
+        return [RepeatedQuery(template, count, *self.origins[template])
+                for template, count in self.counts.items()
+                if count >= self.threshold]
+
+    def report(self, description):
+        """Log the repeated and slow queries, return whether there were any"""
+        for query in self.repeated:
+            logger.warning(
+                'N+1 queries in %s: %d x %s from %s\n%s', description,
+                query.count, query.template, query.origin or 'unknown',
+                ''.join(query.stack)
+            )
+        for query in self.slow:
+            logger.warning(
+                'Slow query in %s: %.1f ms %s from %s\n%s', description,
+                query.duration, query.sql, query.origin or 'unknown',
+                ''.join(query.stack)
+            )
+
+        return bool(self.repeated or self.slow)
@@ -0,0 +1,46 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Valid JSON but not valid JavaScript, DRF escapes them as well
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson when it is installed
+
+    Falls back to the stdlib encoder of JSONRenderer without orjson, for
+    indented output (e.g. the browsable API) and with non default JSON
+    settings. Types orjson renders differently than DRF, like datetimes,
+    are passed to the DRF encoder.
+    """
+    # Encodes what orjson cannot, shared as it holds no state
+    encoder = JSONEncoder()
+
+    def use_orjson(self, accepted_media_type, renderer_context):
+        return (orjson is not None and self.compact and
+                not self.ensure_ascii and
+                self.get_indent(accepted_media_type,
+                                renderer_context or {}) is None)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.use_orjson(accepted_media_type,
+                                               renderer_context):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        content = orjson.dumps(
+            data, default=self.encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+        for separator, escaped in LINE_SEPARATORS:
+            content = content.replace(separator, escaped)
+
+        return content
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.snapshots import refresh_snapshots
+
+
+def seed_dataset(users=10, recipes=50, tags=20, ingredients=30,
+                 links=3, password=None):
+    """Bulk create users that each own recipes, tags and ingredients
+
+    Every recipe is linked to `links` of its owner's tags and ingredients.
+    Users get an unusable password unless `password` is given, which
+    keeps seeding large datasets free of password hashing.
+    Returns the list of created users.
+    """
+    user_model = get_user_model()
+    start = user_model.objects.count()
+    new_users = []
+    for i in range(start, start + users):
+        user = user_model(email=f'seed{i}@example.com', name=f'Seed {i}')
+        user.set_unusable_password()
+        new_users.append(user)
+
+    if password is not None:
+        # Hash once, every seeded user shares the same credentials
+        new_users[0].set_password(password)
+        for user in new_users[1:]:
+            user.password = new_users[0].password
+
+    user_model.objects.bulk_create(new_users)
+    # bulk_create only returns primary keys on PostgreSQL, refetch to be
+    # backend agnostic
+    new_users = list(user_model.objects.filter(
+        email__in=[user.email for user in new_users]
+    ).order_by('id'))
+
+    Tag.objects.bulk_create(
+        Tag(user=user, name=f'Tag {i}')
+        for user in new_users for i in range(tags)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f'Ingredient {i}')
+        for user in new_users for i in range(ingredients)
+    )
+    Recipe.objects.bulk_create(
+        Recipe(user=user, title=f'Recipe {i}', time_minutes=10, price=5)
+        for user in new_users for i in range(recipes)
+    )
+
+    tag_links = []
+    ingredient_links = []
+    for user in new_users:
+        tag_ids = list(Tag.objects.filter(user=user)
+                       .values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.filter(user=user)
+                              .values_list('id', flat=True))
+        recipe_ids = Recipe.objects.filter(user=user) \
+            .values_list('id', flat=True)
+        for n, recipe_id in enumerate(recipe_ids):
+            for k in range(min(links, len(tag_ids))):
+                tag_links.append(Recipe.tags.through(
+                    recipe_id=recipe_id,
+                    tag_id=tag_ids[(n + k) % len(tag_ids)]
+                ))
+            for k in range(min(links, len(ingredient_ids))):
+                ingredient_links.append(Recipe.ingredients.through(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_ids[(n + k) % len(ingredient_ids)]
+                ))
+
+    Recipe.tags.through.objects.bulk_create(tag_links)
+    Recipe.ingredients.through.objects.bulk_create(ingredient_links)
+    # Bulk created links skip the signals maintaining snapshots
+    refresh_snapshots(Recipe.objects.filter(user__in=new_users)
+                      .values_list('id', flat=True))
+
+    return new_users
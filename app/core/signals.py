@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.db import router
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a token once it is deleted"""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Make the next request load the updated user from the database"""
+    if not created:
+        token_cache.invalidate_user(instance.pk)
+
+
+@receiver(request_started)
+def start_routing(sender, environ=None, **kwargs):
+    """Let the database router know a request of this method started"""
+    router.start_request((environ or {}).get('REQUEST_METHOD'))
+
+
+@receiver(request_finished)
+def finish_routing(sender, **kwargs):
+    router.finish_request()
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.queries import QueryInspector
+
+
+class QueryCountMixin:
+    """TestCase mixin with helpers for asserting on executed queries"""
+
+    def count_queries(self, func):
+        """Run func and return (result, number of queries executed)"""
+        with CaptureQueriesContext(connection) as context:
+            result = func()
+
+        return result, len(context.captured_queries)
+
+    def assertConstantQueries(self, request, grow, times=2):
+        """Check that request runs the same number of queries as rows grow
+
+        `request` is called once, then `grow` adds more rows and `request`
+        is called again, `times` times in total. Every call must execute
+        exactly as many queries as the first one.
+        """
+        _, expected = self.count_queries(request)
+        for _ in range(times):
+            grow()
+            _, executed = self.count_queries(request)
+            self.assertEqual(
+                executed, expected,
+                f'Query count grew with the data: {expected} -> {executed}'
+            )
+
+        return expected
+
+    @contextmanager
+    def assertNoNPlusOne(self, threshold=None):
+        """Check no query template runs threshold times inside the block
+
+        threshold defaults to QUERY_REPEAT_THRESHOLD. Failures name the
+        serializer field the repeated queries come from.
+        """
+        inspector = QueryInspector(threshold, slow_ms=0)
+        with inspector.inspect():
+            yield inspector
+
+        if inspector.repeated:
+            self.fail('Repeated queries (N+1):\n' + '\n'.join(
+                f'{query.count} x {query.template}\n'
+                f'from {query.origin or "unknown"}\n{"".join(query.stack)}'
+                for query in inspector.repeated
+            ))
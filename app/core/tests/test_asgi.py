@@ -0,0 +1,275 @@
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.deprecation import MiddlewareMixin
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.asgi import ASGIHandler, get_environ
+from core.authentication import token_cache
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import response_cache
+from recipe.fast import FastRecipeSerializer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class EnvironTests(SimpleTestCase):
+
+    def test_get_environ(self):
+        """Test ASGI scopes become WSGI environs"""
+        environ = get_environ({
+            'type': 'http', 'method': 'GET', 'path': '/api/café',
+            'query_string': b'q=soup', 'server': ('testserver', 8000),
+            'client': ('10.0.0.1', 5000), 'headers': [
+                (b'content-type', b'application/json'),
+                (b'x-forwarded-for', b'10.0.0.2'),
+                (b'x-forwarded-for', b'10.0.0.3'),
+            ],
+        }, None)
+
+        self.assertEqual(environ['PATH_INFO'].encode('latin1'),
+                         '/api/café'.encode())
+        self.assertEqual(environ['QUERY_STRING'], 'q=soup')
+        self.assertEqual(environ['SERVER_PORT'], '8000')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'application/json')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'],
+                         '10.0.0.2,10.0.0.3')
+
+
+class ViewMiddleware(MiddlewareMixin):
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return HttpResponse('From the middleware')
+
+
+class CallMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+
+class ASGIHandlerTests(TransactionTestCase):
+    """Test the API served through the ASGI handler
+
+    Its queries run in executor threads with connections of their own, so
+    the data must be committed.
+    """
+
+    def setUp(self):
+        token_cache.reset()
+        response_cache.reset()
+        # Executor threads must not keep connections to the test database
+        self.max_ages = {}
+        for alias, database in settings.DATABASES.items():
+            self.max_ages[alias] = database['CONN_MAX_AGE']
+            database['CONN_MAX_AGE'] = 0
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.token = Token.objects.create(user=self.user).key
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.handler = ASGIHandler()
+
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for n in range(3):
+            recipe = Recipe.objects.create(user=self.user, title=f'Soup {n}',
+                                           time_minutes=n, price=n)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        self.recipe = recipe
+
+    def tearDown(self):
+        for alias, max_age in self.max_ages.items():
+            settings.DATABASES[alias]['CONN_MAX_AGE'] = max_age
+        token_cache.reset()
+        response_cache.reset()
+
+    def request(self, method, path, query=b'', body=b'', token=True,
+                headers=()):
+        """Return the status, headers and body sent for a request"""
+        headers = [(b'host', b'testserver'), *headers]
+        if token:
+            headers.append((b'authorization', f'Token {self.token}'.encode()))
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query, 'headers': headers,
+                 'server': ('testserver', 80)}
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.handler(scope, receive, send))
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+
+        return (sent[0]['status'], dict(sent[0]['headers']),
+                b''.join(message.get('body', b'') for message in sent[1:]))
+
+    def test_async_list_matches_sync(self):
+        """Test async lists return what the sync views do"""
+        for url in (RECIPES_URL, TAGS_URL):
+            for snapshots in (True, False):
+                with self.subTest(url=url, snapshots=snapshots), \
+                        self.settings(RECIPE_SNAPSHOTS=snapshots):
+                    response_cache.reset()
+                    code, headers, body = self.request('GET', url)
+
+                    self.assertEqual(code, status.HTTP_200_OK)
+                    self.assertIn(b'Server-Timing', headers)
+                    self.assertEqual(json.loads(body)['results'],
+                                     self.client.get(url).json()['results'])
+
+    @override_settings(RECIPE_SNAPSHOTS=False)
+    def test_async_retrieve(self):
+        """Test async retrieves prefetch the relations"""
+        code, headers, body = self.request('GET', detail_url(self.recipe.id))
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(int(headers[b'Content-Length']), len(body))
+        self.assertEqual(json.loads(body),
+                         self.client.get(detail_url(self.recipe.id)).json())
+        self.assertEqual(json.loads(body)['tags'][0]['name'], 'Vegan')
+
+    def test_async_errors(self):
+        """Test async actions return API errors and 404s"""
+        code, _, _ = self.request('GET', RECIPES_URL, token=False)
+        self.assertEqual(code, status.HTTP_401_UNAUTHORIZED)
+
+        code, _, _ = self.request('GET', detail_url(0))
+        self.assertEqual(code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_middleware(self):
+        """Test the middleware hooks run around async actions"""
+        code, headers, _ = self.request('GET', RECIPES_URL)
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(headers[b'X-Frame-Options'], b'SAMEORIGIN')
+
+        code, _, _ = self.request('GET', RECIPES_URL,
+                                  headers=[(b'host', b'evil.example')])
+        self.assertEqual(code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(MIDDLEWARE=[
+        'django.middleware.security.SecurityMiddleware',
+        'core.tests.test_asgi.ViewMiddleware',
+    ], SECURE_CONTENT_TYPE_NOSNIFF=True)
+    def test_async_middleware_responses(self):
+        """Test responses of view hooks skip the view but not the others"""
+        self.handler = ASGIHandler()
+        with patch('recipe.views.RecipeViewSet.list_async') as list_async:
+            code, headers, body = self.request('GET', RECIPES_URL)
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(body, b'From the middleware')
+        self.assertEqual(headers[b'x-content-type-options'], b'nosniff')
+        list_async.assert_not_called()
+
+    @override_settings(MIDDLEWARE=['core.tests.test_asgi.CallMiddleware'])
+    def test_blocking_middleware_refused(self):
+        """Test middleware wrapping get_response() cannot be loaded"""
+        with self.assertRaises(ImproperlyConfigured):
+            ASGIHandler()
+
+    @override_settings(QUERY_INSPECTION_SAMPLE_RATE=1, SLOW_QUERY_MS=1e-9)
+    def test_async_query_inspection(self):
+        """Test sampled async requests log their slow queries"""
+        self.handler = ASGIHandler()
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.request('GET', TAGS_URL)
+
+        self.assertIn(f'Slow query in GET {TAGS_URL}', logs.output[0])
+
+    def test_async_not_modified(self):
+        """Test async actions answer If-None-Match from the cache"""
+        _, headers, _ = self.request('GET', RECIPES_URL)
+        code, _, body = self.request(
+            'GET', RECIPES_URL, headers=[(b'if-none-match', headers[b'ETag'])]
+        )
+
+        self.assertEqual(code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(body, b'')
+
+    def test_async_stream(self):
+        """Test ?stream=1 lists are streamed by the async list"""
+        code, _, body = self.request('GET', RECIPES_URL, query=b'stream=1')
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(body)), 3)
+
+    def test_sync_fallback(self):
+        """Test other requests run through the WSGI handler"""
+        payload = json.dumps({'title': 'Stew', 'time_minutes': 5,
+                              'price': '5.00', 'tags': [],
+                              'ingredients': []}).encode()
+        with patch('recipe.views.RecipeViewSet.list_async') as list_async:
+            code, _, body = self.request(
+                'POST', RECIPES_URL, body=payload, headers=[
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(payload)).encode()),
+                ]
+            )
+
+        self.assertEqual(code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(body)['title'], 'Stew')
+        list_async.assert_not_called()
+
+    @override_settings(RECIPE_SNAPSHOTS=False)
+    def test_request_keeps_connection(self):
+        """Test the sync hops of a request share one connection"""
+        connected = []
+
+        def record(sender, connection, **kwargs):
+            connected.append((threading.current_thread().name,
+                              connection.alias))
+
+        connection_created.connect(record)
+        try:
+            for url in (RECIPES_URL, detail_url(self.recipe.id)):
+                with self.subTest(url=url):
+                    connected.clear()
+                    code, _, _ = self.request('GET', url)
+
+                    self.assertEqual(code, status.HTTP_200_OK)
+                    lane = [alias for name, alias in connected
+                            if name.startswith('asgi-lane')]
+                    self.assertTrue(lane)
+                    self.assertEqual(len(lane), len(set(lane)))
+        finally:
+            connection_created.disconnect(record)
+
+    @override_settings(RECIPE_SNAPSHOTS=False)
+    def test_fast_related_ids_async(self):
+        """Test relations queried concurrently match the sync ones"""
+        serializer = FastRecipeSerializer()
+        rows = list(serializer.get_rows(Recipe.objects.all()))
+
+        self.assertEqual(
+            asyncio.run(serializer.get_related_ids_async(rows)),
+            serializer.get_related_ids(rows)
+        )
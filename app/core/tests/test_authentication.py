@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication, token_cache
+from core.testing import QueryCountMixin
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(QueryCountMixin, TestCase):
+
+    def setUp(self):
+        token_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass', name='Test'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.reset()
+
+    def test_cached_token_skips_query(self):
+        """Test a repeated request does not look the token up again"""
+        response, first = self.count_queries(lambda: self.client.get(ME_URL))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response, second = self.count_queries(
+            lambda: self.client.get(ME_URL)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(second, first - 1)
+        self.assertEqual(token_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_cached_user_not_shared(self):
+        """Test every request gets a user instance of its own"""
+        authentication = CachedTokenAuthentication()
+        for _ in range(3):
+            user, token = authentication.authenticate_credentials(
+                self.token.key
+            )
+            self.assertEqual(user.name, 'Test')
+            self.assertEqual(user._state.db, 'default')
+            self.assertFalse(user._state.adding)
+            self.assertEqual(token.user, user)
+            # Changes a request makes to its user or the user's state
+            user.name = 'Changed'
+            user._state.db = 'other'
+
+        self.assertEqual(token_cache.stats(), {'hits': 2, 'misses': 1})
+
+    def test_deleted_token_invalidated(self):
+        """Test a deleted token stops authenticating straight away"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_invalidated(self):
+        """Test changes to the user are visible on the next request"""
+        self.client.patch(ME_URL, {'name': 'New name'})
+
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.data['name'], 'New name')
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user cannot authenticate with a cached token"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(
+        TOKEN_CACHE_ALIAS='default',
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+    )
+    def test_shared_cache_backend(self):
+        """Test tokens can be cached in a Django cache backend"""
+        token_cache.reset()
+        self.client.get(ME_URL)
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats(), {'hits': 1, 'misses': 1})
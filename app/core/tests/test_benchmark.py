@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.management.commands.benchmark_api import compare, percentile
+from core.models import Recipe
+from recipe.cache import response_cache
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        response_cache.reset()
+        self.output = tempfile.NamedTemporaryFile(suffix='.json',
+                                                  delete=False).name
+
+    def tearDown(self):
+        response_cache.reset()
+        os.remove(self.output)
+
+    def run_benchmark(self, *routes, **options):
+        call_command('benchmark_api', '--users', '2', '--recipes', '2',
+                     '--tags', '2', '--ingredients', '2',
+                     '--requests', '3', '--warmup', '0',
+                     '--output', self.output,
+                     '--routes', *routes, stdout=StringIO(),
+                     stderr=StringIO(), **options)
+        with open(self.output) as output:
+            return json.load(output)
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 95), 3)
+
+    def test_compare_flags_regressions(self):
+        """Test only changes past the threshold count as regressions"""
+        baseline = {'recipe-list': {
+            'p95_ms': 10, 'requests_per_sec': 100, 'queries': 3,
+        }}
+        results = {'recipe-list': {
+            'p95_ms': 10.5, 'requests_per_sec': 80, 'queries': 4,
+        }}
+
+        regressions = compare(results, baseline, 0.1)
+
+        self.assertEqual(regressions, [
+            'recipe-list requests_per_sec: 100 -> 80',
+            'recipe-list queries: 3 -> 4',
+        ])
+
+    def test_benchmark_routes(self):
+        """Test the benchmark reports metrics and rolls back its data"""
+        report = self.run_benchmark('recipe-list', 'recipe-create',
+                                    'recipe-upload-image', 'user-token')
+
+        self.assertEqual(set(report['results']), {
+            'recipe-list', 'recipe-create', 'recipe-upload-image',
+            'user-token',
+        })
+        for metrics in report['results'].values():
+            self.assertEqual(metrics['requests'], 3)
+            self.assertTrue(all(code < 400 for code in metrics['statuses']))
+            self.assertGreater(metrics['queries'], 0)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_baseline_regression(self):
+        """Test the command fails when results regress from a baseline"""
+        report = self.run_benchmark('tag-list')
+        report['results']['tag-list']['queries'] = 0
+        with open(self.output, 'w') as output:
+            json.dump(report, output)
+        baseline = self.output + '.baseline'
+        os.rename(self.output, baseline)
+        self.addCleanup(os.remove, baseline)
+
+        with self.assertRaises(CommandError):
+            self.run_benchmark('tag-list', baseline=baseline)
+
+    def test_unknown_route(self):
+        """Test unknown routes are rejected"""
+        with self.assertRaises(CommandError):
+            self.run_benchmark('recipe-missing')
@@ -0,0 +1,99 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import LRUCache, is_shared, unshared_caches
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_get_set(self):
+        """Test values can be stored and read back"""
+        cache = LRUCache()
+        cache.set('key', 'value')
+
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertIsNone(cache.get('missing'))
+
+    def test_least_recently_used_evicted(self):
+        """Test the least recently used entry is evicted when full"""
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    @patch('core.cache.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test entries are not returned after their TTL"""
+        monotonic.return_value = 100
+        cache = LRUCache(ttl=10)
+        cache.set('key', 'value')
+
+        monotonic.return_value = 111
+        self.assertIsNone(cache.get('key'))
+
+    def test_delete(self):
+        """Test deleting an entry"""
+        cache = LRUCache()
+        cache.set('key', 'value')
+        cache.delete('key')
+        cache.delete('missing')
+
+        self.assertIsNone(cache.get('key'))
+
+    def test_incr(self):
+        """Test incrementing a stored number"""
+        cache = LRUCache()
+        cache.set('counter', 1)
+
+        self.assertEqual(cache.incr('counter'), 2)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+
+MEMCACHED = 'django.core.cache.backends.memcached.MemcachedCache'
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM},
+    'shared': {'BACKEND': MEMCACHED, 'LOCATION': 'cache:11211'},
+}, DATABASE_REPLICAS=[])
+class SharedCacheTests(SimpleTestCase):
+
+    def test_is_shared(self):
+        """Test only caches outside the process count as shared"""
+        self.assertTrue(is_shared('shared'))
+        self.assertFalse(is_shared('default'))
+        self.assertFalse(is_shared(None))
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared',
+                       RESPONSE_CACHE_ALIAS='shared')
+    def test_shared_caches_configured(self):
+        """Test nothing is reported when the caches are shared"""
+        self.assertEqual(unshared_caches(), [])
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared',
+                       RESPONSE_CACHE_ALIAS=None)
+    def test_response_cache_unshared(self):
+        """Test per process response cache generations are reported"""
+        self.assertEqual(unshared_caches(), ['RESPONSE_CACHE_ALIAS'])
+
+    @override_settings(TOKEN_CACHE_ALIAS='default',
+                       RESPONSE_CACHE_ALIAS='shared')
+    def test_token_cache_unshared(self):
+        """Test per process token cache entries are reported"""
+        self.assertEqual(unshared_caches(), ['TOKEN_CACHE_ALIAS'])
+
+    @override_settings(TOKEN_CACHE_ALIAS='shared',
+                       RESPONSE_CACHE_ALIAS='shared',
+                       DATABASE_REPLICAS=['replica1'],
+                       DB_REPLICA_PIN_CACHE_ALIAS='default')
+    def test_replica_pins_unshared(self):
+        """Test per process replica pins are reported with replicas"""
+        self.assertEqual(unshared_caches(), ['DB_REPLICA_PIN_CACHE_ALIAS'])
@@ -1,23 +1,73 @@
+from io import StringIO
 from unittest.mock import patch
+from django.contrib.auth import get_user_model
 from django.core.management import call_command # ALLOWS to call commands in our source code
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError # Imort error that is shown when DB is unavailable
 from django.test import TestCase
 
+from core.models import Recipe
+from recipe.cache import response_cache
+
+ENSURE_CONNECTION = ('django.db.backends.base.base.BaseDatabaseWrapper.'
+                     'ensure_connection')
+
 class CommandTests(TestCase):
     
     def  test_wait_for_db_ready(self):
         '''Test waiting for DB when it is ready to accept connections'''
-        # Try retrieve DB connection - if OperationalError -- DB available
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        # Looking the connection up does not connect, a query has to run
+        with patch(ENSURE_CONNECTION) as ec:
+            call_command('wait_for_db', database=['default'],
+                         stdout=StringIO())
+            self.assertEqual(ec.call_count, 1)
          
     @patch('time.sleep', return_value=True)   
     def test_wait_for_db(self, ts):
         '''Test waiting for DB'''
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+        with patch(ENSURE_CONNECTION) as ec:
             # Raise OperationalError on first 5 attempts, but not on the 6th 
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
\ No newline at end of file
+            ec.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', database=['default'],
+                         stdout=StringIO())
+            self.assertEqual(ec.call_count, 6)
+        # Backing off exponentially
+        self.assertEqual([call[0][0] for call in ts.call_args_list],
+                         [0.1, 0.2, 0.4, 0.8, 1.6])
+        
+    def test_wait_for_db_timeout(self):
+        '''Test giving up once the timeout has passed'''
+        # Only sleeping moves the clock on
+        clock = [0]
+        
+        def sleep(seconds):
+            clock[0] += seconds
+            
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError), \
+                patch('time.monotonic', side_effect=lambda: clock[0]), \
+                patch('time.sleep', side_effect=sleep) as ts:
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=10, delay=4, max_delay=8,
+                             stdout=StringIO())
+        
+        # The last wait is cut short by the timeout
+        self.assertEqual([call[0][0] for call in ts.call_args_list], [4, 6])
+        
+    def test_wait_for_db_warmup(self):
+        '''Test warming up runs a request of every recipe viewset'''
+        user = get_user_model().objects.create_user('test@example.com',
+                                                    'testpass')
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5,
+                              price=5)
+        generation = response_cache.get_generation(user.pk)
+        out = StringIO()
+        call_command('wait_for_db', warmup=True, stdout=out)
+        
+        # The user's cached responses stay valid
+        self.assertEqual(response_cache.get_generation(user.pk), generation)
+        
+        for name in ('recipe:tag-list', 'recipe:ingredient-list',
+                     'recipe:recipe-list', 'recipe:recipe-list?q',
+                     'recipe:recipe-detail'):
+            self.assertIn(f'{name}: ', out.getvalue())
+        self.assertIn('Warmed up', out.getvalue())
@@ -0,0 +1,165 @@
+import json
+import threading
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.db import connections
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase, override_settings
+
+from core.db.pool import ConnectionPool, POOL_TIMEOUTS, PoolTimeout, pools
+from core.metrics import registry
+
+ALIAS = 'pool-test'
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        registry.reset()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_bounded(self):
+        """Test at most max_size connections are opened, then checkouts
+        time out"""
+        pool = ConnectionPool('test', max_size=2, timeout=0.01)
+        connect = Mock(side_effect=lambda: Mock())
+        first, second = pool.checkout(connect), pool.checkout(connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(connect)
+        self.assertEqual(connect.call_count, 2)
+        self.assertEqual(POOL_TIMEOUTS.get(('test',)), 1)
+
+        pool.checkin(second)
+        self.assertIs(pool.checkout(connect), second)
+        pool.discard(first)
+        first.close.assert_called_once_with()
+        self.assertIsNot(pool.checkout(connect), first)
+        self.assertEqual(connect.call_count, 3)
+        self.assertEqual(pool.in_use, 2)
+
+    def test_waiting_checkout(self):
+        """Test a waiting checkout gets the next connection checked in"""
+        pool = ConnectionPool('test', max_size=1, timeout=5)
+        connection = pool.checkout(Mock)
+        waited = []
+        thread = threading.Thread(
+            target=lambda: waited.append(pool.checkout(Mock))
+        )
+        thread.start()
+        pool.checkin(connection)
+        thread.join()
+
+        self.assertEqual(waited, [connection])
+        self.assertIn('db_pool_wait_seconds_count{alias="test"} 2',
+                      registry.expose())
+
+    def test_failed_connect_frees_place(self):
+        """Test a connection failing to open does not use up the pool"""
+        pool = ConnectionPool('test', max_size=1, timeout=0.01)
+        with self.assertRaises(ValueError):
+            pool.checkout(Mock(side_effect=ValueError))
+
+        self.assertEqual(pool.size, 0)
+
+
+class DatabaseWrapperTests(SimpleTestCase):
+
+    def setUp(self):
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        pool = pools.pop(ALIAS, None)
+        if pool is not None:
+            pool.close()
+
+    def get_wrapper(self, **settings):
+        default = connections['default']
+        wrapper = type(default)({**default.settings_dict, **settings},
+                                alias=ALIAS)
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def query(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    @override_settings(DB_HEALTH_CHECK_IDLE_SECONDS=0)
+    def test_health_check_replaces_broken_connection(self):
+        """Test a persistent connection broken between requests is
+        replaced"""
+        wrapper = self.get_wrapper(CONN_MAX_AGE=60)
+        pid = self.query(wrapper)
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertEqual(self.query(wrapper), pid)
+
+        wrapper.connection.close()
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertNotEqual(self.query(wrapper), pid)
+
+    @override_settings(DB_HEALTH_CHECK_IDLE_SECONDS=60)
+    def test_health_check_after_idle_only(self):
+        """Test only connections idle for a while are checked"""
+        wrapper = self.get_wrapper(CONN_MAX_AGE=60)
+        self.query(wrapper)
+        with patch.object(wrapper, 'connection_is_usable',
+                          return_value=True) as connection_is_usable:
+            # Request start and end with queries in between
+            wrapper.close_if_unusable_or_obsolete()
+            self.query(wrapper)
+            wrapper.close_if_unusable_or_obsolete()
+            wrapper.close_if_unusable_or_obsolete()
+            self.query(wrapper)
+            connection_is_usable.assert_not_called()
+
+            wrapper.close_if_unusable_or_obsolete()
+            wrapper.connection.idle_since -= 60
+            wrapper.close_if_unusable_or_obsolete()
+            self.query(wrapper)
+            connection_is_usable.assert_called_once_with(wrapper.connection)
+
+    @override_settings(DB_POOL_SIZE=1, DB_POOL_TIMEOUT=0.01,
+                       DB_HEALTH_CHECK_IDLE_SECONDS=0)
+    def test_pooled_connections_shared(self):
+        """Test requests return connections to the pool for reuse"""
+        first, second = self.get_wrapper(), self.get_wrapper()
+        pid = self.query(first)
+        with self.assertRaises(OperationalError):
+            self.query(second)
+
+        first.connection.cursor().execute('BEGIN')
+        first.close_if_unusable_or_obsolete()
+        self.assertIsNone(first.connection)
+        self.assertEqual(self.query(second), pid)
+        # Handed out without the transaction left open
+        self.assertTrue(second.get_autocommit())
+        self.assertFalse(second.connection.get_transaction_status())
+
+        second.close_if_unusable_or_obsolete()
+        pools[ALIAS].idle[0].close()
+        self.assertNotEqual(self.query(first), pid)
+        self.assertEqual(pools[ALIAS].size, 1)
+
+
+class BenchmarkConnectionsTests(SimpleTestCase):
+    allow_database_queries = True
+
+    def test_benchmark_connections(self):
+        """Test every way of connecting is measured"""
+        out = StringIO()
+        call_command('benchmark_connections', threads=3, requests=5,
+                     pool_size=2, stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())
+
+        self.assertEqual(set(results),
+                         {'connect_per_request', 'persistent', 'pool'})
+        self.assertEqual(results['pool']['pool_timeouts'], 0)
+        self.assertNotIn(ALIAS, pools)
+        self.assertNotIn('default', pools)
@@ -0,0 +1,38 @@
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.test import TestCase, override_settings
+
+
+def iterations(user):
+    return int(user.password.split('$')[1])
+
+
+class PBKDF2PasswordHasherTests(TestCase):
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_configured_iterations(self):
+        """Test passwords are hashed with the configured iterations"""
+        user = get_user_model().objects.create_user('test@example.com',
+                                                    'testpass')
+
+        self.assertEqual(identify_hasher(user.password).algorithm,
+                         'pbkdf2_sha256')
+        self.assertEqual(iterations(user), 1000)
+
+    def test_rehash_on_login(self):
+        """Test logging in rehashes passwords with other iterations"""
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = get_user_model().objects.create_user('test@example.com',
+                                                        'testpass')
+
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertIsNone(authenticate(username='test@example.com',
+                                           password='wrong'))
+            user.refresh_from_db()
+            self.assertEqual(iterations(user), 1000)
+
+            self.assertIsNotNone(authenticate(username='test@example.com',
+                                              password='testpass'))
+            user.refresh_from_db()
+            self.assertEqual(iterations(user), 2000)
+            self.assertTrue(user.check_password('testpass'))
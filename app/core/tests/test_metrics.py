@@ -0,0 +1,211 @@
+import os
+import re
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.metrics import ARCHIVE, Histogram, Registry, registry
+from core.models import Recipe, Tag
+from core.testing import QueryCountMixin
+from recipe.cache import response_cache
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample(content, name, **labels):
+    """Return the value of the metric sample with the given labels"""
+    for line in content.splitlines():
+        match = re.match(r'(\w+)\{(.*)\} (\S+)$', line)
+        if match and match.group(1) == name and \
+                dict(re.findall(r'(\w+)="([^"]*)"', match.group(2))) == labels:
+            return float(match.group(3))
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_expose(self):
+        """Test buckets are exposed cumulative with sum and count"""
+        histogram = Histogram('test_seconds', 'Test', (1, 5),
+                              labels=('view',))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(('a"b',), value)
+        content = histogram.expose()
+
+        self.assertIn('# TYPE test_seconds histogram', content)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="1.0"} 2',
+                      content)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="5.0"} 3',
+                      content)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+                      content)
+        self.assertIn('test_seconds_sum{view="a\\"b"} 14.5', content)
+        self.assertIn('test_seconds_count{view="a\\"b"} 4', content)
+
+
+class RegistryTests(SimpleTestCase):
+    """Test processes sharing their metrics through a directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_registry(self):
+        registry = Registry()
+        registry.histogram('test_seconds', 'Test', (1,), labels=('view',))
+        registry.counter('test_total', 'Test', ('view',))
+        registry.gauge('test_open', 'Test', ('view',),
+                       lambda: [(('a',), 2)])
+
+        return registry
+
+    def run_processes(self):
+        """Save the metrics of processes 1 and 2, return the second"""
+        first, second = self.make_registry(), self.make_registry()
+        with patch('core.metrics.os.getpid', return_value=1):
+            first.metrics[0].observe(('a',), 0.5)
+            first.metrics[1].inc(('a',))
+            first.save(self.directory)
+        second.metrics[0].observe(('a',), 3)
+
+        return second
+
+    def test_processes_added_up(self):
+        """Test the metrics saved by every process are added up"""
+        second = self.run_processes()
+        with patch('core.metrics.os.getpid', return_value=2):
+            content = second.expose(self.directory)
+
+        self.assertEqual(sample(content, 'test_seconds_count', view='a'), 2)
+        self.assertEqual(sample(content, 'test_seconds_sum', view='a'), 3.5)
+        self.assertEqual(
+            sample(content, 'test_seconds_bucket', view='a', le='1.0'), 1
+        )
+        self.assertEqual(sample(content, 'test_total', view='a'), 1)
+        self.assertEqual(sample(content, 'test_open', view='a'), 4)
+
+    def test_exited_processes_archived(self):
+        """Test exited processes keep their histograms and counters only"""
+        second = self.run_processes()
+        with patch('core.metrics.os.getpid', return_value=2):
+            second.save(self.directory)
+            second.archive(self.directory, 1)
+            content = second.expose(self.directory)
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [second.saved_by[1], ARCHIVE])
+        self.assertEqual(sample(content, 'test_seconds_count', view='a'), 2)
+        self.assertEqual(sample(content, 'test_total', view='a'), 1)
+        self.assertEqual(sample(content, 'test_open', view='a'), 2)
+
+
+@override_settings(DEBUG=True)
+class MetricsMiddlewareTests(QueryCountMixin, TestCase):
+
+    def setUp(self):
+        registry.reset()
+        response_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=5)
+        recipe.tags.add(tag)
+
+    def tearDown(self):
+        registry.reset()
+        response_cache.reset()
+
+    def test_server_timing_header(self):
+        """Test responses tell their database and serializer time"""
+        res, queries = self.count_queries(
+            lambda: self.client.get(RECIPES_URL)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            res['Server-Timing'],
+            rf'^db;dur=[\d.]+;desc="{queries} queries", '
+            r'serializer;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+
+    def test_metrics_by_url_name(self):
+        """Test requests are recorded by URL name, method and status"""
+        _, first = self.count_queries(lambda: self.client.get(TAGS_URL))
+        res, cached = self.count_queries(lambda: self.client.get(TAGS_URL))
+        self.client.get('/api/missing/')
+        self.client.get(METRICS_URL)
+
+        labels = {'view': 'recipe:tag-list', 'method': 'GET',
+                  'status': '200'}
+        content = self.client.get(METRICS_URL).content.decode()
+        self.assertEqual(
+            sample(content, 'http_request_duration_seconds_count', **labels),
+            2
+        )
+        self.assertEqual(
+            sample(content, 'http_request_db_queries_sum', **labels),
+            first + cached
+        )
+        self.assertGreater(sample(
+            content, 'http_request_serializer_duration_seconds_sum', **labels
+        ), 0)
+        self.assertEqual(
+            sample(content, 'http_response_size_bytes_sum', **labels),
+            2 * len(res.content)
+        )
+        self.assertEqual(sample(
+            content, 'http_request_duration_seconds_count',
+            view='unresolved', method='GET', status='404'
+        ), 1)
+        self.assertEqual(sample(
+            content, 'http_request_duration_seconds_count',
+            view='metrics', method='GET', status='200'
+        ), 1)
+
+    def test_streamed_response_recorded_when_consumed(self):
+        """Test streamed lists are recorded with all queries and bytes"""
+        labels = {'view': 'recipe:recipe-list', 'method': 'GET',
+                  'status': '200'}
+        res = self.client.get(RECIPES_URL, {'stream': 1})
+        self.assertNotIn('recipe:recipe-list', registry.expose())
+
+        body = b''.join(res.streaming_content)
+        content = self.client.get(METRICS_URL).content.decode()
+        self.assertEqual(
+            sample(content, 'http_response_size_bytes_sum', **labels),
+            len(body)
+        )
+        # The rows are only read while streaming
+        self.assertGreater(
+            sample(content, 'http_request_db_queries_sum', **labels), 0
+        )
+
+    @override_settings(DEBUG=False, METRICS_TOKEN=None)
+    def test_metrics_need_token(self):
+        """Test scraping without a token is for development only"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Test a configured token is required to scrape"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'],
+                         'text/plain; version=0.0.4; charset=utf-8')
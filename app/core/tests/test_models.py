@@ -34,6 +34,28 @@ class ModelTests(TestCase):
         with self.assertRaises(ValueError):
             get_user_model().objects.create_user(None, '1234')
             
+    def test_bulk_create_users(self):
+        '''Test creating users in bulk, hashing in other processes'''
+        users = get_user_model().objects.bulk_create_users([
+            {'email': 'one@EXAMPLE.com', 'password': 'pass1', 'name': 'One'},
+            {'email': 'two@example.com', 'password': 'pass2'},
+            {'email': 'three@example.com'},
+        ], processes=2)
+        
+        self.assertEqual(len(users), 3)
+        one = get_user_model().objects.get(email='one@example.com')
+        self.assertEqual(one.name, 'One')
+        self.assertTrue(one.check_password('pass1'))
+        self.assertTrue(users[1].check_password('pass2'))
+        self.assertFalse(users[2].has_usable_password())
+        
+    def test_bulk_create_users_no_email(self):
+        '''Test bulk creating users without an email raises error'''
+        with self.assertRaises(ValueError):
+            get_user_model().objects.bulk_create_users(
+                [{'password': 'pass'}], processes=1
+            )
+            
     def test_super_user_created(self):
         '''Test creating a new superuser'''
         user = get_user_model().objects.create_superuser(
@@ -0,0 +1,113 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.queries import QueryInspector, normalize_sql
+from core.testing import QueryCountMixin
+from recipe.serializers import RecipeSerializer
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class NormalizeSQLTests(SimpleTestCase):
+
+    def test_values_replaced(self):
+        """Test queries differing only in values share a template"""
+        self.assertEqual(
+            normalize_sql('SELECT "a" FROM "t1"  WHERE "b" = %s AND\n'
+                          '"c" IN (%s, %s, %s) AND "d" = \'it\'\'s\' '
+                          'LIMIT 21'),
+            'SELECT "a" FROM "t1" WHERE "b" = ? AND "c" IN (...) AND '
+            '"d" = ? LIMIT ?'
+        )
+        self.assertEqual(normalize_sql('WHERE id IN (1, 2)'),
+                         normalize_sql('WHERE id IN (3)'))
+
+
+class QueryInspectorTests(QueryCountMixin, TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        for n in range(3):
+            recipe = Recipe.objects.create(user=self.user, title=f'Soup {n}',
+                                           time_minutes=5, price=5)
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{n}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'I{n}')
+            )
+
+    def test_repeated_queries_found(self):
+        """Test per row queries are grouped and traced to their field"""
+        inspector = QueryInspector(threshold=3, slow_ms=0)
+        with inspector.inspect():
+            RecipeSerializer(Recipe.objects.all(), many=True).data
+
+        repeated = {query.origin: query for query in inspector.repeated}
+        self.assertEqual(set(repeated), {'RecipeSerializer.ingredients',
+                                         'RecipeSerializer.tags'})
+        self.assertEqual(repeated['RecipeSerializer.tags'].count, 3)
+        self.assertIn('core_recipe_tags',
+                      repeated['RecipeSerializer.tags'].template)
+        self.assertIn(__file__, ''.join(repeated['RecipeSerializer.tags']
+                                        .stack))
+
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.assertTrue(inspector.report('test'))
+        self.assertIn('N+1 queries in test: 3 x', logs.output[0])
+
+    def test_prefetched_queries_pass(self):
+        """Test prefetching passes assertNoNPlusOne, per row queries fail"""
+        recipes = Recipe.objects.prefetch_related('tags', 'ingredients')
+        with self.assertNoNPlusOne(threshold=2):
+            RecipeSerializer(recipes, many=True).data
+
+        with self.assertRaises(AssertionError) as context:
+            with self.assertNoNPlusOne(threshold=2):
+                RecipeSerializer(Recipe.objects.all(), many=True).data
+        self.assertIn('from RecipeSerializer.tags', str(context.exception))
+
+    def test_slow_queries_found(self):
+        """Test queries slower than slow_ms are reported"""
+        inspector = QueryInspector(slow_ms=1e-9)
+        with inspector.inspect():
+            Recipe.objects.count()
+
+        self.assertEqual(len(inspector.slow), 1)
+        self.assertIn('COUNT(*)', inspector.slow[0].sql)
+
+
+class QueryInspectionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+
+    @override_settings(QUERY_INSPECTION_SAMPLE_RATE=1, SLOW_QUERY_MS=1e-9)
+    def test_sampled_requests_inspected(self):
+        """Test sampled requests log their slow queries"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            client.get(TAGS_URL)
+
+        self.assertIn(f'Slow query in GET {TAGS_URL}', logs.output[0])
+
+    @override_settings(QUERY_INSPECTION_SAMPLE_RATE=0.5,
+                       SLOW_QUERY_MS=1e-9)
+    @patch('core.middleware.random.random', return_value=0.5)
+    def test_unsampled_requests_skipped(self, random):
+        """Test requests outside the sample are not inspected"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with patch('core.middleware.QueryInspector') as inspector:
+            client.get(TAGS_URL)
+
+        inspector.assert_not_called()
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONRenderer
+
+DATA = OrderedDict([
+    ('id', 1),
+    ('title', 'Crème brûlée   "quoted" </script>'),
+    ('price', Decimal('5.50')),
+    ('created', datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)),
+    ('uuid', UUID('12345678-1234-5678-1234-567812345678')),
+    ('tags', [OrderedDict([('id', 2), ('name', 'Vegan')])]),
+    ('image_variants', {}),
+    ('link', None),
+])
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    def test_same_output_as_json_renderer(self):
+        """Test the output is byte-identical to DRF's JSONRenderer"""
+        self.assertEqual(FastJSONRenderer().render(DATA),
+                         JSONRenderer().render(DATA))
+        self.assertEqual(FastJSONRenderer().render([DATA, DATA]),
+                         JSONRenderer().render([DATA, DATA]))
+
+    def test_indented_output(self):
+        """Test indented output as requested by the browsable API"""
+        context = {'indent': 4}
+        self.assertEqual(
+            FastJSONRenderer().render(DATA, renderer_context=context),
+            JSONRenderer().render(DATA, renderer_context=context)
+        )
+
+    def test_no_data(self):
+        """Test rendering None gives an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
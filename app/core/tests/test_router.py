@@ -0,0 +1,138 @@
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.db.router import ReplicaRouter, check_settings, finish_request, \
+    primary_pins, set_user, start_request
+from core.models import Recipe
+from recipe.cache import response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+REPLICAS = ['replica1', 'replica2']
+
+
+# Pins in an in-process LRU, whose clock the tests control
+@override_settings(DATABASE_REPLICAS=REPLICAS, DB_REPLICA_PIN_SECONDS=10,
+                   DB_REPLICA_PIN_CACHE_ALIAS=None)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        primary_pins.reset()
+        self.router = ReplicaRouter()
+
+    def tearDown(self):
+        finish_request()
+        primary_pins.reset()
+
+    def test_safe_requests_read_replicas(self):
+        """Test safe requests read from a replica once the user is known"""
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+        start_request('GET')
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+        set_user(1)
+        self.assertIn(self.router.db_for_read(Recipe), REPLICAS)
+
+        start_request('POST')
+        set_user(1)
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_writes_pin_user(self):
+        """Test users read from the primary for a while after writing"""
+        start_request('GET')
+        set_user(1)
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+        with patch('core.cache.time.monotonic', return_value=100):
+            start_request('GET')
+            set_user(2)
+            self.assertIn(self.router.db_for_read(Recipe), REPLICAS)
+            set_user(1)
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+        with patch('core.cache.time.monotonic', return_value=1e9):
+            start_request('GET')
+            set_user(1)
+            self.assertIn(self.router.db_for_read(Recipe), REPLICAS)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test everything goes to the primary without replicas"""
+        start_request('GET')
+        set_user(1)
+
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_migrate_primary_only(self):
+        """Test migrations only run on the primary"""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+
+    def test_replicas_need_pin_cache(self):
+        """Test replicas are refused without a cache for the pins"""
+        with self.assertRaises(ImproperlyConfigured):
+            check_settings()
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            check_settings()
+        with override_settings(DB_REPLICA_PIN_CACHE_ALIAS='default'):
+            check_settings()
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'No DB_REPLICA_HOSTS configured')
+class ReplicaReadTests(TransactionTestCase):
+    """Test the API with replicas, mirrors of the test database"""
+    multi_db = True
+
+    def setUp(self):
+        primary_pins.reset()
+        token_cache.reset()
+        response_cache.reset()
+        self.replica = connections[settings.DATABASE_REPLICAS[0]]
+
+    def tearDown(self):
+        primary_pins.reset()
+        token_cache.reset()
+        response_cache.reset()
+
+    def get_client(self, email):
+        user = get_user_model().objects.create_user(email, 'testpass')
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+        )
+
+        return client
+
+    @override_settings(DATABASE_REPLICAS=settings.DATABASE_REPLICAS[:1])
+    def test_read_your_writes(self):
+        """Test reads go to the replica unless the user just wrote"""
+        writer = self.get_client('writer@example.com')
+        reader = self.get_client('reader@example.com')
+        res = writer.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 5,
+                                        'price': '5.00'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            res = writer.get(RECIPES_URL)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(len(replica_queries), 0)
+
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            res = reader.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(replica_queries), 0)
@@ -0,0 +1,57 @@
+import math
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.throttling import TokenBuckets
+
+
+class TokenBucketsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.buckets = TokenBuckets()
+
+    def take(self, key, now, rate=1, capacity=2, max_size=10):
+        with patch('core.throttling.time.monotonic', return_value=now):
+            return self.buckets.take(key, rate, capacity, max_size)
+
+    def test_burst_then_wait(self):
+        """Test a bucket allows a burst, then tells how long to wait"""
+        self.assertEqual(self.take('a', 100), 0)
+        self.assertEqual(self.take('a', 100), 0)
+        self.assertEqual(self.take('a', 100), 1)
+        self.assertEqual(self.take('a', 100.5), 0.5)
+
+    def test_refill(self):
+        """Test buckets refill at the rate up to their capacity"""
+        self.take('a', 100)
+        self.take('a', 100)
+
+        self.assertEqual(self.take('a', 101), 0)
+        self.assertEqual(self.take('a', 101), 1)
+        self.assertEqual(self.take('a', 200), 0)
+        self.assertEqual(self.take('a', 200), 0)
+        self.assertGreater(self.take('a', 200), 0)
+
+    def test_no_refill(self):
+        """Test a rate of 0 never refills buckets"""
+        self.assertEqual(self.take('a', 100, rate=0), 0)
+        self.assertEqual(self.take('a', 100, rate=0), 0)
+        self.assertEqual(self.take('a', 100, rate=0), math.inf)
+        self.assertEqual(self.take('a', 10000, rate=0), math.inf)
+
+    def test_keys_independent(self):
+        """Test every key has a bucket of its own"""
+        self.take('a', 100, capacity=1)
+
+        self.assertGreater(self.take('a', 100, capacity=1), 0)
+        self.assertEqual(self.take('b', 100, capacity=1), 0)
+
+    def test_max_size(self):
+        """Test the least recently used buckets are forgotten"""
+        for key in 'abc':
+            self.take(key, 100, capacity=1, max_size=2)
+
+        self.assertEqual(len(self.buckets), 2)
+        self.assertEqual(self.take('a', 100, capacity=1, max_size=2), 0)
+        self.assertGreater(self.take('c', 100, capacity=1, max_size=2), 0)
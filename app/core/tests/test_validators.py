@@ -0,0 +1,32 @@
+from django.contrib.auth import password_validation
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from core.validators import CommonPasswordValidator
+
+
+class CommonPasswordValidatorTests(SimpleTestCase):
+
+    def test_list_shared(self):
+        """Test validators share one parsed password list"""
+        first = CommonPasswordValidator()
+        second = CommonPasswordValidator()
+
+        self.assertIsInstance(first.passwords, frozenset)
+        self.assertIs(first.passwords, second.passwords)
+
+    def test_common_password(self):
+        """Test common passwords are rejected, others accepted"""
+        validator = CommonPasswordValidator()
+
+        with self.assertRaises(ValidationError):
+            validator.validate(' Password ')
+        validator.validate('an uncommon recipe password')
+
+    def test_default_validators(self):
+        """Test the settings use the shared list"""
+        self.assertTrue(any(
+            isinstance(validator, CommonPasswordValidator)
+            for validator in
+            password_validation.get_default_password_validators()
+        ))
@@ -0,0 +1,106 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBuckets:
+    """Thread safe in-process token buckets, one per key
+
+    A bucket holds up to capacity tokens and refills at rate tokens per
+    second, a rate of 0 never refills them. Only the max_size most recently
+    used buckets are kept, a forgotten bucket starts full again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, capacity, max_size):
+        """Take a token from the bucket of key
+
+        Returns 0 if there was one, otherwise the seconds until there is,
+        infinite if the bucket never refills.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            elif rate:
+                wait = (1 - tokens) / rate
+            else:
+                wait = math.inf
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > max_size:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+token_buckets = TokenBuckets()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle every request taking a token from the bucket of its key
+
+    Subclasses name a scope and return the key of a request, None lets
+    the request through. The <SCOPE>_RATE setting is the tokens added per
+    minute and <SCOPE>_BURST the size of the buckets, 0 turns it off.
+    """
+    scope = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        setting = self.scope.upper()
+        burst = getattr(settings, f'{setting}_BURST')
+        key = self.get_key(request, view) if burst else None
+        if key is None:
+            return True
+
+        self.delay = token_buckets.take(
+            f'{self.scope}:{key}',
+            getattr(settings, f'{setting}_RATE') / 60,
+            burst,
+            settings.THROTTLE_MAX_BUCKETS,
+        )
+        return not self.delay
+
+    def wait(self):
+        # No Retry-After for buckets that never refill
+        return None if math.isinf(self.delay) else self.delay
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    """Limit login attempts per client IP"""
+    scope = 'login_throttle_ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    """Limit login attempts per email, whichever IPs they come from"""
+    scope = 'login_throttle_email'
+
+    def get_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+
+        return email.strip().lower()
@@ -0,0 +1,26 @@
+import functools
+
+from django.contrib.auth import password_validation
+
+DEFAULT_PASSWORD_LIST_PATH = \
+    password_validation.CommonPasswordValidator.DEFAULT_PASSWORD_LIST_PATH
+
+
+@functools.lru_cache(maxsize=None)
+def load_password_list(path):
+    """Return the passwords of a common password list as a frozenset"""
+    validator = password_validation.CommonPasswordValidator(path)
+
+    return frozenset(validator.passwords)
+
+
+class CommonPasswordValidator(password_validation.CommonPasswordValidator):
+    """CommonPasswordValidator sharing one parsed list per process
+
+    Django parses the gzipped list for every instance, again whenever the
+    validators are rebuilt. Here it is parsed once, CoreConfig.ready()
+    does it at startup.
+    """
+
+    def __init__(self, password_list_path=DEFAULT_PASSWORD_LIST_PATH):
+        self.passwords = load_password_list(str(password_list_path))
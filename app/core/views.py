@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from core.metrics import registry
+
+
+@require_GET
+def metrics(request):
+    """Serve the request metrics in the Prometheus text format
+
+    The metrics of every process when METRICS_DIR is set, of the process
+    answering otherwise.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                   f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.expose(settings.METRICS_DIR),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
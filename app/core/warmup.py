@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from rest_framework.test import force_authenticate
+
+from core.models import Recipe
+from recipe.cache import response_cache
+
+# URL name, query parameters, the recipe list also primes the search index
+WARMUP_REQUESTS = (
+    ('recipe:tag-list', {}),
+    ('recipe:ingredient-list', {}),
+    ('recipe:recipe-list', {}),
+    ('recipe:recipe-list', {'q': 'warm'}),
+    ('recipe:recipe-detail', {}),
+)
+
+
+def get_host():
+    """Return a host name accepted by ALLOWED_HOSTS"""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+
+    return 'localhost'
+
+
+def warm_up(rounds=2):
+    """Run a representative request of every recipe viewset
+
+    The requests go through the views as the owner of the newest recipe,
+    which opens this process' database connection and reads the tables
+    and indexes the API uses into the Postgres cache. They use a private
+    response cache, the user's shared entries stay valid. Returns a list of
+    (description, [ms per round]), empty without any recipe.
+    """
+    recipe = Recipe.objects.select_related('user').order_by('-pk').first()
+    if recipe is None:
+        return []
+
+    factory = RequestFactory(HTTP_HOST=get_host())
+    timings = []
+    with response_cache.private():
+        for name, params in WARMUP_REQUESTS:
+            args = [recipe.pk] if name.endswith('-detail') else []
+            path = reverse(name, args=args)
+            match = resolve(path)
+            durations = []
+            for _ in range(rounds):
+                # Time the database, not the response cache
+                response_cache.bump_generation(recipe.user.pk)
+                request = factory.get(path, params)
+                force_authenticate(request, recipe.user)
+                started = time.perf_counter()
+                match.func(request, *match.args, **match.kwargs).render()
+                durations.append((time.perf_counter() - started) * 1000)
+            description = f'{name}?{"&".join(params)}' if params else name
+            timings.append((description, durations))
+
+    return timings
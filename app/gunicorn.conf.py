@@ -0,0 +1,122 @@
+"""Gunicorn configuration for production
+
+Run with `gunicorn -c gunicorn.conf.py app.wsgi`. Every value can be
+overridden through GUNICORN_* environment variables. For the ASGI
+application run `app.asgi:application` with GUNICORN_WORKER_CLASS set to
+uvicorn.workers.UvicornWorker, whose event loop replaces the threads.
+
+The app is imported once in the master and shared copy-on-write by the
+forked workers. SIGHUP restarts the workers gracefully with that same
+code, deploying new code takes SIGUSR2 (start a new master) followed by
+SIGQUIT to the old one, or a container restart.
+
+Several workers only start when the caches invalidated by writes are
+shared between them, see core.cache.unshared_caches(). Workers save their
+metrics to METRICS_DIR, by default under the worker tmp dir, so /metrics
+adds up those of every worker, see core.metrics.Registry.
+"""
+import multiprocessing
+import os
+import shutil
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# Threads cover the time requests wait on Postgres, a few workers per
+# core use every core without much more memory thanks to preloading
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', cores * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so slow leaks cannot build up, the jitter
+# keeps them from restarting all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER',
+                                         500))
+# Heartbeat files on tmpfs, a slow disk must not get workers killed
+worker_tmp_dir = os.environ.get('GUNICORN_WORKER_TMP_DIR', '/dev/shm')
+# Set before the app is loaded, which reads it
+metrics_dir = os.environ.setdefault(
+    'METRICS_DIR', os.path.join(worker_tmp_dir, 'gunicorn-metrics')
+)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+forwarded_allow_ips = os.environ.get('GUNICORN_FORWARDED_ALLOW_IPS', '*')
+
+
+def on_starting(server):
+    """Drop the metrics of the last run and refuse to start workers that
+    would each cache on their own
+    """
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    if server.cfg.workers < 2:
+        return
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    from core.cache import unshared_caches
+
+    unshared = unshared_caches()
+    if unshared:
+        # gunicorn prints the error and exits
+        raise RuntimeError(
+            f'{", ".join(unshared)} must name a cache shared by the '
+            f'{server.cfg.workers} workers, set CACHE_LOCATION or run '
+            f'a single worker'
+        )
+
+
+def pre_fork(server, worker):
+    """Never let workers inherit the master's database sockets"""
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    """Save the worker's metrics now and then, open and prime its database
+    connection before serving
+    """
+    from django.conf import settings
+    from core.metrics import registry
+
+    if settings.METRICS_ENABLED:
+        registry.save_every(metrics_dir, settings.METRICS_SAVE_SECONDS)
+
+    if os.environ.get('GUNICORN_WARMUP', '1') != '1':
+        return
+
+    from django.db import connections
+    from core.warmup import warm_up
+
+    try:
+        timings = warm_up(rounds=1)
+    except Exception:
+        server.log.exception('Warming up worker %s failed', worker.pid)
+    else:
+        if timings:
+            server.log.info('Worker %s warmed up in %.1f ms', worker.pid,
+                            sum(durations[0] for _, durations in timings))
+    finally:
+        # Threads have connections of their own, hand this one to the pool
+        connections.close_all()
+
+
+def worker_exit(server, worker):
+    """Save the last metrics of the worker"""
+    from django.conf import settings
+    from core.metrics import registry
+
+    if settings.METRICS_ENABLED:
+        registry.save(metrics_dir)
+
+
+def child_exit(server, worker):
+    """Keep the histograms and counters of the exited worker"""
+    from core.metrics import registry
+
+    registry.archive(metrics_dir, worker.pid)
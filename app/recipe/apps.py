@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
+from PIL import Image
 
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        """Connect the signal receivers and set the decoded image limit"""
+        from recipe import signals  # noqa: F401
+
+        # Pillow warns past this size and refuses twice of it, guarding the
+        # variant pipeline against bombs. Uploads check the limit itself.
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
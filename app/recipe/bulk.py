@@ -0,0 +1,231 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Value, When
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from recipe.signals import invalidate_user_responses
+from recipe.snapshots import refresh_snapshots
+
+NOT_FOUND = 'Not found.'
+DUPLICATE = 'Duplicate id.'
+
+
+def is_id(value):
+    """Return whether a JSON value can be an object id, true is not 1"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def update_in_bulk(model, objs, fields):
+    """Save the given fields of objs with a single UPDATE statement"""
+    if not objs or not fields:
+        return
+
+    updates = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        updates[field.attname] = Case(
+            *(When(pk=obj.pk, then=Value(getattr(obj, field.attname),
+                                         output_field=field))
+              for obj in objs),
+            output_field=field
+        )
+    model.objects.filter(pk__in=[obj.pk for obj in objs]).update(**updates)
+
+
+class BulkMixin:
+    """Add a /bulk/ route creating, updating or deleting many objects
+
+    POST takes a list of objects, PATCH a list of objects with their id
+    and DELETE a list of ids. Everything runs in one transaction; if any
+    item is invalid nothing is written and the 400 response holds one
+    error dict per item, in input order.
+    """
+    bulk_serializer_class = None
+    # Many-to-many field -> related model, ids are checked per user
+    bulk_relations = {}
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False,
+            url_path='bulk')
+    def bulk(self, request):
+        """Create, update or delete objects in bulk"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'non_field_errors': ['Expected a list of items.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.API_BULK_MAX_ITEMS:
+            return Response(
+                {'non_field_errors': [
+                    f'At most {settings.API_BULK_MAX_ITEMS} items allowed.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        handler = {
+            'POST': self.bulk_create,
+            'PATCH': self.bulk_update,
+            'DELETE': self.bulk_destroy,
+        }[request.method]
+        with transaction.atomic():
+            response = handler(items)
+            if status.is_success(response.status_code):
+                # Bulk writes skip the model signals
+                invalidate_user_responses(request.user.pk)
+
+        return response
+
+    def bulk_error_response(self, errors):
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def validate_items(self, items, partial=False):
+        """Return (validated data, errors) with one entry per item"""
+        validated = []
+        errors = []
+        for item in items:
+            serializer = self.bulk_serializer_class(
+                data=item, partial=partial
+            )
+            if serializer.is_valid():
+                validated.append(serializer.validated_data)
+                errors.append({})
+            else:
+                validated.append(None)
+                errors.append(dict(serializer.errors))
+
+        self.validate_relations(validated, errors)
+        return validated, errors
+
+    def validate_relations(self, validated, errors):
+        """Check referenced ids with a single query per related model"""
+        message = serializers.PrimaryKeyRelatedField \
+            .default_error_messages['does_not_exist']
+        for field, model in self.bulk_relations.items():
+            ids = {pk for data in validated if data
+                   for pk in data.get(field, ())}
+            if not ids:
+                continue
+            existing = set(model.objects.filter(
+                user=self.request.user, pk__in=ids
+            ).values_list('pk', flat=True))
+            for data, item_errors in zip(validated, errors):
+                missing = [pk for pk in (data or {}).get(field, ())
+                           if pk not in existing]
+                if missing:
+                    item_errors[field] = [message.format(pk_value=pk)
+                                          for pk in missing]
+
+    def split_relations(self, data):
+        """Return (field values, relation values) of validated data"""
+        fields = dict(data)
+        relations = {field: fields.pop(field)
+                     for field in self.bulk_relations if field in fields}
+        return fields, relations
+
+    def set_relations(self, objs, relations_list, replace=False):
+        """Link objs to their related ids with bulk inserts"""
+        model = self.queryset.model
+        linked = set()
+        for field_name in self.bulk_relations:
+            field = model._meta.get_field(field_name)
+            through = field.remote_field.through
+            source, target = field.m2m_column_name(), field.m2m_reverse_name()
+            pairs = [(obj, relations[field_name])
+                     for obj, relations in zip(objs, relations_list)
+                     if field_name in relations]
+            if not pairs:
+                continue
+            if replace:
+                through.objects.filter(
+                    **{f'{source}__in': [obj.pk for obj, _ in pairs]}
+                ).delete()
+            through.objects.bulk_create(
+                through(**{source: obj.pk, target: pk})
+                for obj, ids in pairs for pk in dict.fromkeys(ids)
+            )
+            linked.update(obj.pk for obj, _ in pairs)
+
+        # Bulk inserted links skip m2m_changed, which keeps snapshots
+        refresh_snapshots(linked)
+
+    def bulk_representation(self, objs):
+        """Serialize objs in input order with their relations prefetched"""
+        model = self.queryset.model
+        fetched = model.objects.filter(pk__in=[obj.pk for obj in objs]) \
+            .prefetch_related(*self.bulk_relations)
+        by_pk = {obj.pk: obj for obj in fetched}
+        serializer = self.get_serializer(
+            [by_pk[obj.pk] for obj in objs], many=True
+        )
+        return serializer.data
+
+    def bulk_create(self, items):
+        validated, errors = self.validate_items(items)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        model = self.queryset.model
+        split = [self.split_relations(data) for data in validated]
+        objs = model.objects.bulk_create(
+            model(user=self.request.user, **fields) for fields, _ in split
+        )
+        self.set_relations(objs, [relations for _, relations in split])
+
+        return Response(self.bulk_representation(objs),
+                        status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, items):
+        validated, errors = self.validate_items(items, partial=True)
+        ids = [item.get('id') if isinstance(item, dict) else None
+               for item in items]
+        objs = self.queryset.model.objects.select_for_update().filter(
+            user=self.request.user,
+            pk__in=[pk for pk in ids if is_id(pk)]
+        ).in_bulk()
+
+        seen = set()
+        for pk, item_errors in zip(ids, errors):
+            if not is_id(pk) or pk not in objs:
+                item_errors['id'] = [NOT_FOUND]
+            elif pk in seen:
+                item_errors['id'] = [DUPLICATE]
+            else:
+                seen.add(pk)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        changed = [objs[pk] for pk in ids]
+        fields = set()
+        relations_list = []
+        for obj, data in zip(changed, validated):
+            values, relations = self.split_relations(data)
+            for name, value in values.items():
+                setattr(obj, name, value)
+            fields.update(values)
+            relations_list.append(relations)
+
+        update_in_bulk(self.queryset.model, changed, fields)
+        self.set_relations(changed, relations_list, replace=True)
+        self.bulk_updated(changed, fields)
+
+        return Response(self.bulk_representation(changed))
+
+    def bulk_updated(self, objs, fields):
+        """Hook called with objects changed by a bulk update"""
+
+    def bulk_destroy(self, items):
+        ids = items
+        existing = set(self.queryset.model.objects.filter(
+            user=self.request.user,
+            pk__in=[pk for pk in ids if is_id(pk)]
+        ).values_list('pk', flat=True))
+        errors = [{} if is_id(pk) and pk in existing
+                  else {'id': [NOT_FOUND]}
+                  for pk in ids]
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        self.queryset.model.objects.filter(pk__in=existing).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
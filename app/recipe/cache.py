@@ -0,0 +1,197 @@
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.asgi import run_sync
+from core.cache import LRUCache, get_cache
+
+
+class ResponseCache:
+    """Per-user cache of API response data invalidated by generation
+
+    Every key embeds the user's current generation number. Any write to
+    one of the user's recipes, tags or ingredients bumps the generation,
+    so stale entries are never read again and simply age out. Processes
+    only see each other's bumps through a shared RESPONSE_CACHE_ALIAS,
+    gunicorn refuses to start several workers without one.
+    """
+    prefix = 'api-response:'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_cache(
+                settings.RESPONSE_CACHE_ALIAS,
+                max_size=settings.RESPONSE_CACHE_SIZE,
+                ttl=settings.RESPONSE_CACHE_TTL,
+            )
+
+        return self._backend
+
+    def _generation_key(self, user_id):
+        return f'{self.prefix}generation:{user_id}'
+
+    def get_generation(self, user_id):
+        """Return the user's generation, starting one if there is none"""
+        key = self._generation_key(user_id)
+        generation = self.backend.get(key)
+        if generation is None:
+            # Never restart from a number an evicted generation may have
+            # used, older entries would become readable again
+            generation = time.time_ns()
+            self.backend.set(key, generation, settings.RESPONSE_CACHE_TTL)
+
+        return generation
+
+    def bump_generation(self, user_id):
+        """Invalidate every cached response of the user"""
+        key = self._generation_key(user_id)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.set(key, time.time_ns(),
+                             settings.RESPONSE_CACHE_TTL)
+
+    def get_key(self, request, view):
+        """Return the cache key for a request handled by view"""
+        params = urlencode(sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+        ))
+        lookup = urlencode(sorted(view.kwargs.items()))
+        # Responses hold absolute URLs, so they vary by scheme and host.
+        # Hash the client controlled part to keep keys short and safe for
+        # memcached
+        variant = hashlib.md5(
+            f'{lookup}|{request.scheme}|{request.get_host()}|{params}'
+            .encode()
+        ).hexdigest()
+        generation = self.get_generation(request.user.pk)
+
+        return (f'{self.prefix}{request.user.pk}:{generation}:'
+                f'{view.basename}:{view.action}:{variant}')
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        self.backend.set(key, value, settings.RESPONSE_CACHE_TTL)
+
+    @contextmanager
+    def private(self):
+        """Use an empty in-process cache inside
+
+        For requests of the process itself, which must neither read nor
+        invalidate the entries served to users.
+        """
+        with self._lock:
+            backend = self._backend
+            self._backend = LRUCache(max_size=settings.RESPONSE_CACHE_SIZE,
+                                     ttl=settings.RESPONSE_CACHE_TTL)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._backend = backend
+
+    def reset(self):
+        """Forget the backend, settings are read again"""
+        with self._lock:
+            if isinstance(self._backend, LRUCache):
+                self._backend.clear()
+            self._backend = None
+
+
+response_cache = ResponseCache()
+
+
+def compute_etag(data):
+    """Return a strong ETag for response data"""
+    content = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.md5(content.encode()).hexdigest()
+
+
+def etag_matches(etag, header):
+    """Check an If-None-Match header against an ETag"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = (tag.strip() for tag in header.split(','))
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag
+               for tag in candidates)
+
+
+class CachedResponseMixin:
+    """Serve list responses from the per-user response cache
+
+    Responses carry an ETag, a matching If-None-Match gets a 304.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    async def list_async(self, request, *args, **kwargs):
+        return await self.get_cached_response_async(
+            request, super().list_async, *args, **kwargs
+        )
+
+    def get_cached(self, request):
+        """Return the cache key of request and its cached (data, etag)"""
+        key = response_cache.get_key(request, self)
+
+        return key, response_cache.get(key)
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        """Return the cached response for request or build it with handler"""
+        key, cached = self.get_cached(request)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = response.data, compute_etag(response.data)
+            response_cache.set(key, cached)
+        else:
+            response = Response(cached[0])
+
+        return self.conditional_response(request, response, cached[1])
+
+    async def get_cached_response_async(self, request, handler, *args,
+                                        **kwargs):
+        """get_cached_response() with an async handler"""
+        key, cached = await run_sync(self.get_cached, request)
+        if cached is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = response.data, compute_etag(response.data)
+            await run_sync(response_cache.set, key, cached)
+        else:
+            response = Response(cached[0])
+
+        return self.conditional_response(request, response, cached[1])
+
+    def conditional_response(self, request, response, etag):
+        """Tag response with etag, a 304 if If-None-Match matches it"""
+        if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+        return response
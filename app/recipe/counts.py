@@ -0,0 +1,53 @@
+from django.db import connection
+
+from core.models import Tag, Ingredient, Recipe
+
+# Related model -> link table column, recipe_count counts its links. The
+# database triggers of migration 0011 keep the counts up to date.
+RECIPE_COUNTS = {
+    Tag: (Recipe.tags.through, 'tag_id'),
+    Ingredient: (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+def count_sql(model):
+    """Return SQL of the number of links to the row o of model's table"""
+    links, column = RECIPE_COUNTS[model]
+
+    return (f'(SELECT count(*) FROM {links._meta.db_table} l '
+            f'WHERE l.{column} = o.id)')
+
+
+def reconcile_recipe_counts(model, pks):
+    """Recount the links of the given objects, in a transaction
+
+    The rows are locked before they are recounted, so the count sees the
+    links of link writes that committed while it waited. Returns the
+    number of objects whose count was wrong.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM {model._meta.db_table} '
+            f'WHERE id IN (SELECT unnest(%s::int[])) ORDER BY id FOR UPDATE',
+            [list(pks)]
+        )
+        cursor.execute(
+            f'UPDATE {model._meta.db_table} o '
+            f'SET recipe_count = {count_sql(model)} '
+            f'WHERE o.id IN (SELECT unnest(%s::int[])) '
+            f'AND o.recipe_count <> {count_sql(model)}',
+            [list(pks)]
+        )
+        return cursor.rowcount
+
+
+def stale_recipe_counts(model, pks):
+    """Return the ids of objects whose count differs from their links"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT o.id FROM {model._meta.db_table} o '
+            f'WHERE o.id IN (SELECT unnest(%s::int[])) '
+            f'AND o.recipe_count <> {count_sql(model)} ORDER BY o.id',
+            [list(pks)]
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,191 @@
+import asyncio
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.asgi import run_concurrently, run_sync
+from core.metrics import serializer_timer
+from core.models import Recipe
+from recipe.serializers import image_variant_urls
+
+
+class FastSerializer:
+    """Read-only serializer building response dicts from .values() rows
+
+    Produces the same data as the matching ModelSerializer without
+    creating and running field objects for every row.
+    """
+    fields = ()
+
+    def __init__(self, context=None):
+        self.context = context or {}
+
+    def get_rows(self, queryset):
+        """Return queryset as dicts holding the fields and annotations
+
+        Annotations are kept as pagination may order by them.
+        """
+        return queryset.prefetch_related(None).values(
+            *self.fields, *queryset.query.annotations
+        )
+
+    def to_representation(self, rows):
+        raise NotImplementedError
+
+    async def to_representation_async(self, rows):
+        """to_representation() running its queries through run_sync()"""
+        return self.to_representation(rows)
+
+
+class FastNamedSerializer(FastSerializer):
+    """Fast TagSerializer and IngredientSerializer"""
+    fields = ('id', 'name', 'recipe_count')
+
+    def to_representation(self, rows):
+        return [{'id': row['id'], 'name': row['name'],
+                 'recipe_count': row['recipe_count']} for row in rows]
+
+
+class FastRecipeSerializer(FastSerializer):
+    """Fast RecipeSerializer, tags and ingredients come from snapshots
+
+    Recipes without a snapshot, or all of them with snapshots turned off,
+    get their related ids with one query per relation.
+    """
+    fields = ('id', 'title', 'time_minutes', 'price', 'link',
+              'image_variants', 'snapshot')
+    relations = ('ingredients', 'tags')
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        price = Recipe._meta.get_field('price')
+        # Decimal formatting is subtle, reuse the field rendering it
+        self.price_field = serializers.DecimalField(
+            max_digits=price.max_digits, decimal_places=price.decimal_places
+        )
+
+    def get_missing(self, rows):
+        """Return the ids of recipes whose relations must be queried"""
+        return [row['id'] for row in rows
+                if not settings.RECIPE_SNAPSHOTS or row['snapshot'] is None]
+
+    def get_links(self, name, recipe_ids):
+        """Return the (recipe id, related id) pairs of relation name"""
+        if not recipe_ids:
+            return []
+
+        field = Recipe._meta.get_field(name)
+        column = field.m2m_reverse_name()
+        return list(field.remote_field.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(column).values_list('recipe_id', column))
+
+    def group_related_ids(self, rows, missing, links):
+        """Return relation name -> recipe id -> related ids
+
+        links maps relation names to the pairs queried for missing.
+        """
+        related = {}
+        for name in self.relations:
+            ids = {pk: [] for pk in missing}
+            for row in rows:
+                if row['id'] not in ids:
+                    ids[row['id']] = [item['id']
+                                      for item in row['snapshot'][name]]
+            for recipe_id, pk in links[name]:
+                ids[recipe_id].append(pk)
+            related[name] = ids
+
+        return related
+
+    def get_related_ids(self, rows):
+        """Return relation name -> recipe id -> related ids"""
+        missing = self.get_missing(rows)
+        links = {name: self.get_links(name, missing)
+                 for name in self.relations}
+
+        return self.group_related_ids(rows, missing, links)
+
+    async def get_related_ids_async(self, rows):
+        """get_related_ids() querying the relations at the same time"""
+        missing = self.get_missing(rows)
+        links = await asyncio.gather(*(
+            run_concurrently(self.get_links, name, missing)
+            for name in self.relations
+        ))
+
+        return self.group_related_ids(rows, missing,
+                                      dict(zip(self.relations, links)))
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        return self.render(rows, self.get_related_ids(rows))
+
+    async def to_representation_async(self, rows):
+        rows = list(rows)
+        return self.render(rows, await self.get_related_ids_async(rows))
+
+    def render(self, rows, related):
+        """Return the representation of rows given their related ids"""
+        request = self.context.get('request')
+        price = self.price_field.to_representation
+
+        return [{
+            'id': row['id'],
+            'title': row['title'],
+            'ingredients': related['ingredients'][row['id']],
+            'tags': related['tags'][row['id']],
+            'time_minutes': row['time_minutes'],
+            'price': price(row['price']),
+            'link': row['link'],
+            'image_variants': image_variant_urls(row['image_variants'],
+                                                 request),
+        } for row in rows]
+
+
+class FastListMixin:
+    """Render list actions with fast_serializer_class when enabled
+
+    API_FAST_SERIALIZERS = False falls back to the regular serializers.
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.API_FAST_SERIALIZERS or \
+                self.fast_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.fast_serializer_class(
+            context=self.get_serializer_context()
+        )
+        rows = serializer.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        with serializer_timer():
+            data = serializer.to_representation(
+                rows if page is None else page
+            )
+        if page is not None:
+            return self.get_paginated_response(data)
+
+        return Response(data)
+
+    async def list_async(self, request, *args, **kwargs):
+        if not settings.API_FAST_SERIALIZERS or \
+                self.fast_serializer_class is None:
+            return await super().list_async(request, *args, **kwargs)
+
+        serializer = self.fast_serializer_class(
+            context=self.get_serializer_context()
+        )
+        rows = serializer.get_rows(self.filter_queryset(self.get_queryset()))
+        page = await run_sync(self.paginate_queryset, rows)
+        if page is None:
+            rows = await run_sync(list, rows)
+        data = await serializer.to_representation_async(
+            rows if page is None else page
+        )
+        if page is not None:
+            return self.get_paginated_response(data)
+
+        return Response(data)
@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+
+from core.models import Recipe
+from recipe.signals import invalidate_user_responses
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the worker pool shared by all image jobs"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+
+    return _executor
+
+
+def get_variant_format():
+    """Return the (Pillow format, extension) used for variants
+
+    Falls back to JPEG when Pillow was built without WebP support.
+    """
+    if settings.IMAGE_VARIANT_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+
+    return 'JPEG', 'jpg'
+
+
+def render_variant(original, size, image_format):
+    """Return the encoded bytes of original resized to fit in size"""
+    image = original.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_variants(recipe_id, stale=None):
+    """Create the resized variants of a recipe image and record them
+
+    `stale` holds variant paths of a previous image, deleted once the
+    new variants are in place.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+
+    storage = recipe.image.storage
+    name = recipe.image.name
+    image_format, extension = get_variant_format()
+    stem = os.path.splitext(name)[0]
+
+    with storage.open(name) as image_file:
+        original = Image.open(image_file)
+        original.load()
+
+    variants = {}
+    for variant, size in settings.IMAGE_VARIANT_SIZES.items():
+        content = render_variant(original, size, image_format)
+        variants[variant] = storage.save(
+            f'{stem}_{variant}.{extension}', ContentFile(content)
+        )
+
+    # The image may have been replaced while we were resizing
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants
+    )
+    if updated:
+        invalidate_user_responses(recipe.user_id)
+    else:
+        stale = list(variants.values())
+
+    for path in stale or ():
+        storage.delete(path)
+
+
+def _run(recipe_id, stale):
+    try:
+        generate_variants(recipe_id, stale)
+    except Exception:
+        logger.exception('Failed to create variants for recipe %s',
+                         recipe_id)
+    finally:
+        # Worker threads would otherwise keep their connection open
+        connection.close()
+
+
+def schedule_variants(recipe, stale=None):
+    """Generate the recipe's image variants in the pool after commit"""
+    recipe_id = recipe.pk
+    stale = list(stale or ())
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, recipe_id, stale)
+    )
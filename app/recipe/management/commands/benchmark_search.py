@@ -0,0 +1,214 @@
+import json
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.management.commands.benchmark_api import percentile
+from core.seed import seed_dataset
+from recipe.views import RecipeViewSet
+
+WORDS = (
+    'apple', 'bacon', 'basil', 'bean', 'beef', 'bread', 'butter', 'cake',
+    'carrot', 'cheese', 'chicken', 'chili', 'chocolate', 'coconut', 'cod',
+    'corn', 'cream', 'curry', 'egg', 'fennel', 'garlic', 'ginger', 'honey',
+    'lamb', 'lemon', 'lentil', 'lime', 'mango', 'mushroom', 'noodle',
+    'onion', 'orange', 'pasta', 'pea', 'pepper', 'pork', 'potato',
+    'pumpkin', 'rice', 'salmon', 'sesame', 'soup', 'spinach', 'steak',
+    'tofu', 'tomato', 'tuna', 'vanilla', 'walnut', 'yogurt',
+)
+# Matches the seeded user ids, a join on the unnested array is hashed
+# where = ANY() would compare every row against the whole array
+SEEDED = 'IN (SELECT unnest(%s::int[]))'
+
+
+class Command(BaseCommand):
+    '''Django command to benchmark recipe search on a large dataset'''
+    help = ('Seed recipes with SQL, then time the page query of ?q= '
+            'searches and fail if the p95 exceeds --max-ms. Seeded rows '
+            'are committed while timing and deleted afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=1000000,
+                            help='Recipes in total, spread over the users')
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=30)
+        parser.add_argument('--links', type=int, default=2,
+                            help='Tags and ingredients linked per recipe')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--max-ms', type=float, default=10.0,
+                            help='Fail when the p95 query time is higher')
+        parser.add_argument('--output', help='Write the JSON results here')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            users = self.seed(options)
+        try:
+            # Seeded rows are committed and vacuumed, timings of a table
+            # full of dead row versions would not be representative
+            self.vacuum()
+            self.stderr.write(
+                f'Seeded {options["recipes"]} recipes in '
+                f'{time.perf_counter() - start:.1f}s'
+            )
+            results = self.run(users, options)
+        finally:
+            self.delete_seeded(users)
+            # Leave no dead rows behind to slow down the next run
+            self.vacuum()
+
+        content = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content)
+
+        if results['p95_ms'] > options['max_ms']:
+            raise CommandError(
+                f'Search p95 {results["p95_ms"]} ms is over '
+                f'{options["max_ms"]} ms'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Search p95 {results["p95_ms"]} ms'
+        ))
+
+    def seed(self, options):
+        """Create users with named tags and ingredients, then recipes
+
+        Recipes and links are inserted with INSERT ... SELECT, the search
+        triggers fill in the vectors as they would for API writes.
+        """
+        users = seed_dataset(
+            users=options['users'],
+            recipes=0,
+            tags=options['tags'],
+            ingredients=options['ingredients'],
+        )
+        user_ids = [user.pk for user in users]
+        words = list(WORDS)
+        with connection.cursor() as cursor:
+            for table in ('core_tag', 'core_ingredient'):
+                cursor.execute(
+                    f'UPDATE {table} SET name = (%s::text[])'
+                    f'[1 + id %% %s] WHERE user_id {SEEDED}',
+                    [words, len(words), user_ids]
+                )
+            # Recipe g belongs to user g % users and is the user's
+            # (g / users)th, words cycle over that so titles vary per user
+            cursor.execute(
+                'INSERT INTO core_recipe '
+                '(user_id, title, time_minutes, price, link, image_variants) '
+                'SELECT (%(users)s::int[])[1 + g %% %(user_count)s], '
+                "w[1 + (g / %(user_count)s) %% %(word_count)s] || ' ' || "
+                'w[1 + (g / %(user_count)s / %(word_count)s) '
+                '%% %(word_count)s], '
+                "10, 5, '', '{}' "
+                'FROM generate_series(0, %(recipes)s - 1) g, '
+                'CAST(%(words)s AS text[]) w',
+                {'users': user_ids, 'user_count': len(user_ids),
+                 'word_count': len(words), 'recipes': options['recipes'],
+                 'words': words}
+            )
+            # Without statistics on the new rows the planner expects
+            # single rows and nests loops over a million of them
+            cursor.execute('ANALYZE core_recipe, core_tag, core_ingredient')
+            for table, column, count in (
+                    ('core_tag', 'tag_id', options['tags']),
+                    ('core_ingredient', 'ingredient_id',
+                     options['ingredients'])):
+                links = min(options['links'], count)
+                if not links:
+                    continue
+                # Number each user's rows to pick `links` of them per
+                # recipe, recipe ids of a user are `users` apart
+                cursor.execute(
+                    f'INSERT INTO core_recipe_{table[5:]}s '
+                    f'(recipe_id, {column}) '
+                    f'SELECT r.id, t.id FROM core_recipe r '
+                    f'CROSS JOIN generate_series(0, %s - 1) k '
+                    f'JOIN (SELECT id, user_id, row_number() OVER '
+                    f'(PARTITION BY user_id ORDER BY id) - 1 AS n '
+                    f'FROM {table} WHERE user_id {SEEDED}) t '
+                    f'ON t.user_id = r.user_id '
+                    f'AND t.n = (r.id / %s + k) %% %s '
+                    f'WHERE r.user_id {SEEDED}',
+                    [links, user_ids, len(user_ids), count, user_ids]
+                )
+                cursor.execute(f'ANALYZE core_recipe_{table[5:]}s')
+
+        return users
+
+    def vacuum(self):
+        with connection.cursor() as cursor:
+            # VACUUM cannot run in a transaction, e.g. in tests
+            if connection.in_atomic_block:
+                cursor.execute('ANALYZE')
+            else:
+                cursor.execute('VACUUM ANALYZE')
+
+    def delete_seeded(self, users):
+        """Remove the seeded users and everything they own"""
+        user_ids = [user.pk for user in users]
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Recipes go first, the link foreign keys are only checked at
+            # commit and the search triggers then find nothing to rebuild
+            cursor.execute(f'DELETE FROM core_recipe WHERE user_id {SEEDED}',
+                           [user_ids])
+            for table, column in (('core_tag', 'tag_id'),
+                                  ('core_ingredient', 'ingredient_id')):
+                cursor.execute(
+                    f'DELETE FROM core_recipe_{table[5:]}s l USING {table} o '
+                    f'WHERE o.id = l.{column} AND o.user_id {SEEDED}',
+                    [user_ids]
+                )
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE user_id {SEEDED}', [user_ids]
+                )
+            get_user_model().objects.filter(pk__in=user_ids).delete()
+
+    def get_page(self, user, text):
+        """Return the first page queryset of a search as the API runs it"""
+        request = Request(APIRequestFactory().get('/', {'q': text}))
+        request.user = user
+        view = RecipeViewSet(action='list', request=request,
+                             format_kwarg=None, kwargs={})
+        queryset = view.get_queryset().prefetch_related(None)
+        paginator = view.paginator
+        ordering = paginator.get_ordering(request, queryset, view)
+
+        return queryset.order_by(*ordering)[:paginator.page_size + 1]
+
+    def run(self, users, options):
+        """Time the search page query and return the metrics"""
+        rng = random.Random(0)
+        timings = []
+        for _ in range(options['queries']):
+            user = rng.choice(users)
+            text = ' '.join(rng.sample(WORDS, rng.choice((1, 2))))
+            queryset = self.get_page(user, text)
+            start = time.perf_counter()
+            list(queryset)
+            timings.append(time.perf_counter() - start)
+
+        if options['verbosity'] > 1:
+            self.stdout.write(self.get_page(users[0], WORDS[0]).explain(
+                analyze=True
+            ))
+
+        return {
+            'recipes': options['recipes'],
+            'users': options['users'],
+            'queries': options['queries'],
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        }
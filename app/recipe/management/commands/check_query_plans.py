@@ -0,0 +1,140 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Tag, Ingredient
+from core.seed import seed_dataset
+from recipe import views
+
+
+def filtered_seq_scans(plan):
+    """Return relations read by a sequential scan with a filter
+
+    An unfiltered seq scan is the planner hashing a whole (small) table
+    for a join, a filtered one means a predicate had no usable index.
+    """
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan' and 'Filter' in plan:
+        scans.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        scans += filtered_seq_scans(child)
+
+    return scans
+
+
+class Command(BaseCommand):
+    '''Django command to EXPLAIN the API queries and fail on seq scans'''
+    help = ('Run EXPLAIN on the queries issued by the recipe viewsets and '
+            'fail if any of them falls back to a sequential scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-seed', action='store_true',
+            help='Explain against existing data instead of seeding'
+        )
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=30)
+
+    def handle(self, *args, **options):
+        # Seeded rows are rolled back once the plans have been checked
+        with transaction.atomic():
+            if options['no_seed']:
+                user = get_user_model().objects.annotate(
+                    recipe_count=Count('recipe')
+                ).order_by('-recipe_count').first()
+                if user is None:
+                    raise CommandError('No users to explain queries for')
+            else:
+                self.stdout.write('Seeding dataset')
+                users = seed_dataset(
+                    users=options['users'],
+                    recipes=options['recipes'],
+                    tags=options['tags'],
+                    ingredients=options['ingredients'],
+                )
+                user = users[len(users) // 2]
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            failures = []
+            for label, queryset in self.get_checks(user):
+                scans = filtered_seq_scans(self.explain(queryset))
+                if scans:
+                    failures.append(f'{label}: {", ".join(scans)}')
+                    self.stdout.write(self.style.ERROR(f'{label}: seq scan'))
+                else:
+                    self.stdout.write(f'{label}: ok')
+                if options['verbosity'] > 1:
+                    self.stdout.write(queryset.explain())
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                'Sequential scans found:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('All query plans use indexes'))
+
+    def explain(self, queryset):
+        """Return the root node of the queryset's JSON query plan"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            # psycopg2 decodes the json column
+            return cursor.fetchone()[0][0]['Plan']
+
+    def get_view(self, viewset, action, user, params=None):
+        """Return a viewset instance set up as if handling a GET request"""
+        request = Request(APIRequestFactory().get('/', params or {}))
+        request.user = user
+        view = viewset(action=action, request=request, format_kwarg=None,
+                       kwargs={})
+        return view
+
+    def get_page(self, view):
+        """Return the first page of a list viewset's queryset"""
+        paginator = view.paginator
+        queryset = view.get_queryset()
+        ordering = paginator.get_ordering(view.request, queryset, view)
+
+        return queryset.order_by(*ordering)[:paginator.page_size]
+
+    def get_checks(self, user):
+        """Yield (label, queryset) pairs for every query the API issues"""
+        tag_ids = ','.join(str(pk) for pk in Tag.objects.filter(
+            user=user).values_list('id', flat=True)[:2])
+        ingredient_ids = ','.join(str(pk) for pk in Ingredient.objects.filter(
+            user=user).values_list('id', flat=True)[:2])
+
+        for name, viewset in (('tag', views.TagViewSet),
+                              ('ingredient', views.IngredientViewSet)):
+            for params in ({}, {'assigned_only': 1},
+                           {'ordering': '-recipe_count'},
+                           {'ordering': 'recipe_count'}):
+                view = self.get_view(viewset, 'list', user, params)
+                yield f'{name}-list {params}', self.get_page(view)
+
+        for params in ({}, {'tags': tag_ids},
+                       {'tags': tag_ids, 'match': 'all'},
+                       {'ingredients': ingredient_ids},
+                       {'q': 'recipe'}):
+            view = self.get_view(views.RecipeViewSet, 'list', user, params)
+            yield f'recipe-list {params}', self.get_page(view)
+
+        # Prefetch queries run once per page for the related objects
+        view = self.get_view(views.RecipeViewSet, 'list', user)
+        recipe_ids = list(self.get_page(view).values_list('id', flat=True))
+        if not recipe_ids:
+            return
+        yield 'recipe-list prefetch tags', \
+            Tag.objects.filter(recipe__in=recipe_ids)
+        yield 'recipe-list prefetch ingredients', \
+            Ingredient.objects.filter(recipe__in=recipe_ids)
+
+        view = self.get_view(views.RecipeViewSet, 'retrieve', user)
+        yield 'recipe-detail', view.get_queryset().filter(pk=recipe_ids[0])
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe.counts import RECIPE_COUNTS, reconcile_recipe_counts, \
+    stale_recipe_counts
+
+
+class Command(BaseCommand):
+    '''Django command to reconcile or verify tag and ingredient counts'''
+    help = ('Recount the recipes linked to every tag and ingredient in '
+            'batches, fixing counts that drifted, or with --verify only '
+            'report the wrong ones')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Report wrong counts without writing')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        wrong = []
+        fixed = 0
+        total = 0
+        for model in RECIPE_COUNTS:
+            label = model._meta.verbose_name
+            for batch in self.batches(model, options['batch_size']):
+                total += len(batch)
+                if options['verify']:
+                    wrong += [f'{label} {pk}'
+                              for pk in stale_recipe_counts(model, batch)]
+                else:
+                    # One transaction per batch keeps row locks short
+                    with transaction.atomic():
+                        fixed += reconcile_recipe_counts(model, batch)
+
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Reconciled {total} recipe counts, fixed {fixed}'
+            ))
+        elif wrong:
+            shown = ', '.join(wrong[:20])
+            raise CommandError(
+                f'{len(wrong)} of {total} recipe counts are wrong: '
+                f'{shown}{", ..." if len(wrong) > 20 else ""}'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'All {total} recipe counts are right'
+            ))
+
+    def batches(self, model, batch_size):
+        """Yield lists of model ids in id order"""
+        last_id = 0
+        while True:
+            batch = list(model.objects.filter(pk__gt=last_id)
+                         .order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipe
+from recipe.snapshots import refresh_snapshots, stale_snapshots
+
+
+class Command(BaseCommand):
+    '''Django command to rebuild or verify recipe snapshots'''
+    help = ('Rebuild the tag and ingredient snapshots of every recipe in '
+            'batches, or with --verify only report recipes whose snapshot '
+            'does not match their links')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Report stale snapshots without writing')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stale = []
+        total = 0
+        for batch in self.batches(options['batch_size']):
+            total += len(batch)
+            if options['verify']:
+                stale += stale_snapshots(batch)
+            else:
+                # One transaction per batch keeps row locks short
+                with transaction.atomic():
+                    refresh_snapshots(batch)
+
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {total} recipe snapshots'
+            ))
+        elif stale:
+            shown = ', '.join(str(pk) for pk in stale[:20])
+            raise CommandError(
+                f'{len(stale)} of {total} recipe snapshots are stale: '
+                f'{shown}{", ..." if len(stale) > 20 else ""}'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'All {total} recipe snapshots are up to date'
+            ))
+
+    def batches(self, batch_size):
+        """Yield lists of recipe ids in id order"""
+        last_id = 0
+        while True:
+            batch = list(Recipe.objects.filter(pk__gt=last_id)
+                         .order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection, transaction
+from rest_framework import serializers
+
+# Inserts the names missing from the user's objects and returns the ids
+# of all of them. Both SELECTs see the table as it was before the
+# INSERT, so existing and inserted rows are each returned once.
+RESOLVE_SQL = '''
+WITH input (name) AS (SELECT unnest(%(names)s::varchar[])),
+inserted AS (
+    INSERT INTO {table} (user_id, name, recipe_count)
+    SELECT %(user_id)s, name, 0 FROM input
+    ON CONFLICT (user_id, name) DO NOTHING
+    RETURNING id, name
+)
+SELECT id, name FROM inserted
+UNION ALL
+SELECT id, name FROM {table}
+WHERE user_id = %(user_id)s AND name IN (SELECT name FROM input)
+'''
+
+NAME_TAKEN = 'You already have one with this name.'
+
+
+def unique_name_constraint(model):
+    """Return the name of the (user, name) unique constraint of model"""
+    return f'{model._meta.db_table}_user_id_name_key'
+
+
+def resolve_names(model, user, names):
+    """Return {name: id} of user's model objects, creating missing ones
+
+    Takes a single INSERT ... ON CONFLICT statement. Rows are inserted
+    directly, so no post_save signals are sent.
+    """
+    names = list(dict.fromkeys(names))
+    ids = {}
+    while names:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RESOLVE_SQL.format(table=model._meta.db_table),
+                {'names': names, 'user_id': user.pk}
+            )
+            ids.update((name, pk) for pk, name in cursor.fetchall())
+        # A name inserted by a concurrent transaction that committed after
+        # the statement started is neither inserted nor seen, so try again
+        names = [name for name in names if name not in ids]
+
+    return ids
+
+
+@contextmanager
+def unique_names(model):
+    """Report a name taken by another of the user's objects as a 400"""
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as exc:
+        diag = getattr(exc.__cause__, 'diag', None)
+        if getattr(diag, 'constraint_name', None) != \
+                unique_name_constraint(model):
+            raise
+        raise serializers.ValidationError({'name': [NAME_TAKEN]})
@@ -0,0 +1,43 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class BaseCursorPagination(CursorPagination):
+    """Keyset pagination with a client adjustable, capped page size"""
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class RecipeCursorPagination(BaseCursorPagination):
+    """Paginate recipes newest first, search results best match first"""
+    ordering = '-id'
+    search_ordering = ('-rank', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if 'rank' in queryset.query.annotations:
+            return self.search_ordering
+
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(BaseCursorPagination):
+    """Paginate tags and ingredients by name or recipe count
+
+    The view's OrderingFilter picks the field. id breaks ties, in the
+    order the (user, -recipe_count, id) index is read for either
+    direction of the count.
+
+    A cursor holds the count of the last row it returned, not a snapshot
+    of the counts, so rows recounted between pages can move past it.
+    """
+    ordering = ('-name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Cursors only ever compare the first field
+        field = ordering[0]
+        if field in ('id', '-id'):
+            return (field,)
+
+        return (field, 'id' if field.startswith('-') else '-id')
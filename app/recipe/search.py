@@ -0,0 +1,39 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+# Must match the core_recipe_search_vector() function the database
+# triggers build the stored vectors with
+SEARCH_CONFIG = 'english'
+
+
+class OwnedSearchQuery(SearchQuery):
+    """Search query for the recipes of one owner
+
+    Stored lexemes are prefixed with the owner id, the query lexemes get
+    the same prefix so the GIN index only looks at the owner's recipes.
+    """
+
+    def __init__(self, value, owner_id, **kwargs):
+        super().__init__(value, **kwargs)
+        self.owner_id = owner_id
+
+    def as_sql(self, compiler, connection):
+        sql, params = super().as_sql(compiler, connection)
+        template = f'core_recipe_search_owned(({sql})::text, %s)::tsquery'
+
+        return template, params + [self.owner_id]
+
+
+def search_recipes(queryset, text, user):
+    """Filter user's recipes matching text and annotate their rank
+
+    Matches the stored search vector, which covers the title and the
+    names of linked tags and ingredients.
+    """
+    query = OwnedSearchQuery(text, user.pk, config=SEARCH_CONFIG)
+    # ts_rank returns a real, a double survives the round trip through
+    # pagination cursors exactly
+    rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+
+    return queryset.filter(user=user, search_vector=query).annotate(rank=rank)
@@ -1,12 +1,79 @@
+from django.db import transaction
 from rest_framework import serializers
 from core.models import Tag, Ingredient, Recipe
+from recipe.names import resolve_names
+from recipe.uploads import TOO_MANY_PIXELS, has_too_many_pixels
+
+
+def image_variant_urls(variants, request=None):
+    """Return stored image variant paths as URLs"""
+    storage = Recipe._meta.get_field('image').storage
+    urls = {}
+    for variant, path in variants.items():
+        url = storage.url(path)
+        urls[variant] = request.build_absolute_uri(url) if request else url
+        
+    return urls
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Render stored image variant paths as URLs"""
+    
+    def to_representation(self, value):
+        return image_variant_urls(value, self.context.get('request'))
+
+
+class SnapshotRelatedField(serializers.ReadOnlyField):
+    """Render a recipe relation from the recipe's snapshot
+    
+    Items are rendered as ids, or as id and name objects when nested.
+    Recipes without a snapshot yet fall back to querying the relation.
+    """
+    
+    def __init__(self, nested=False, **kwargs):
+        self.nested = nested
+        super().__init__(**kwargs)
+    
+    def get_attribute(self, instance):
+        if instance.snapshot is None:
+            related = getattr(instance, self.field_name).all()
+            return [{'id': obj.pk, 'name': obj.name}
+                    for obj in sorted(related, key=lambda obj: obj.pk)]
+        
+        return instance.snapshot[self.field_name]
+    
+    def to_representation(self, items):
+        if self.nested:
+            return [{'id': item['id'], 'name': item['name']}
+                    for item in items]
+        
+        return [item['id'] for item in items]
+    
+
+class NameOrPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Related object given by id, or by name to get or create it
+    
+    Integers and strings of digits are ids, any other string is a name.
+    Names are kept as they are, RecipeSerializer resolves them on save.
+    """
+    
+    def __init__(self, **kwargs):
+        self.name_field = serializers.CharField(max_length=255)
+        super().__init__(**kwargs)
+    
+    def to_internal_value(self, data):
+        if isinstance(data, str) and not data.strip().isdigit():
+            return self.name_field.run_validation(data)
+        
+        return super().to_internal_value(data)
+    
 
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for tag objects"""
     
     class Meta:
         model = Tag
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'recipe_count')
         read_only_Fields = ('id',)
         
 
@@ -15,36 +82,128 @@ class IngredientSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'recipe_count')
         read_only_Fields = ('id',)
         
 
+class RecipeTagSerializer(TagSerializer):
+    """Serializer for tags nested in a recipe"""
+    
+    class Meta(TagSerializer.Meta):
+        fields = ('id', 'name')
+        
+
+class RecipeIngredientSerializer(IngredientSerializer):
+    """Serializer for ingredients nested in a recipe"""
+    
+    class Meta(IngredientSerializer.Meta):
+        fields = ('id', 'name')
+        
+
 class RecipeSerializer(serializers.ModelSerializer):
-    """Serializer for recipe objects"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    """Serializer for recipe objects
+    
+    Tags and ingredients are given by id or by name, missing names are
+    created for the recipe's owner with one statement per model.
+    """
+    ingredients = NameOrPrimaryKeyRelatedField(
         many=True, queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = NameOrPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all()
     )
+    image_variants = ImageVariantsField()
     
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
-                  'price', 'link')
+                  'price', 'link', 'image_variants')
         read_only_Fields = ('id',)
         
+    def _resolve_names(self, validated_data, user):
+        """Replace related names with ids, creating missing objects"""
+        for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+            items = validated_data.get(field, [])
+            names = [item for item in items if isinstance(item, str)]
+            if names:
+                ids = resolve_names(model, user, names)
+                validated_data[field] = [
+                    ids[item] if isinstance(item, str) else item
+                    for item in items
+                ]
+                
+    def create(self, validated_data):
+        # Created names are rolled back if the recipe cannot be saved
+        with transaction.atomic():
+            self._resolve_names(validated_data, validated_data['user'])
+            return super().create(validated_data)
+        
+    def update(self, instance, validated_data):
+        # DRF sets relations before saving the recipe, which would write
+        # back the snapshot their m2m_changed signal just rebuilt
+        relations = {field: validated_data.pop(field)
+                     for field in ('tags', 'ingredients')
+                     if field in validated_data}
+        with transaction.atomic():
+            self._resolve_names(relations, instance.user)
+            instance = super().update(instance, validated_data)
+            for field, value in relations.items():
+                getattr(instance, field).set(value)
+                
+        return instance
+        
+        
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializer for recipes written in bulk
+    
+    Related ids are only type checked here, the bulk endpoint looks them
+    all up at once instead of once per id.
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
+                  'price', 'link')
+        read_only_fields = ('id',)
+        
         
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
-    ingredients = IngredientSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    ingredients = RecipeIngredientSerializer(many=True, read_only=True)
+    tags = RecipeTagSerializer(many=True, read_only=True)
+    
+
+class RecipeSnapshotSerializer(RecipeSerializer):
+    """Serialize a recipe for reading, relations come from its snapshot"""
+    ingredients = SnapshotRelatedField()
+    tags = SnapshotRelatedField()
+    
+
+class RecipeSnapshotDetailSerializer(RecipeSerializer):
+    """Serialize a recipe detail from its snapshot"""
+    ingredients = SnapshotRelatedField(nested=True)
+    tags = SnapshotRelatedField(nested=True)
     
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer foe uploading images to recipes"""
+    image_variants = ImageVariantsField()
     
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_Fields = ('id',)
\ No newline at end of file
+        fields = ('id', 'image', 'image_variants')
+        read_only_Fields = ('id',)
+
+    def validate_image(self, value):
+        """Check the pixel limit, Pillow only refuses twice of it"""
+        # The image field has opened the header, which holds the size
+        if value is not None and has_too_many_pixels(value.image.size):
+            raise serializers.ValidationError(TOO_MANY_PIXELS)
+
+        return value
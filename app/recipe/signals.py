@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import response_cache
+from recipe.snapshots import refresh_linked_snapshots, refresh_snapshots
+
+# Related model -> (through model, foreign key to the related model)
+RECIPE_LINKS = {
+    Tag: (Recipe.tags.through, 'tag'),
+    Ingredient: (Recipe.ingredients.through, 'ingredient'),
+}
+
+
+def invalidate_user_responses(user_id):
+    """Bump the user's response cache generation now and after commit
+
+    The second bump discards anything cached from a concurrent read that
+    ran before the write was committed.
+    """
+    response_cache.bump_generation(user_id)
+    transaction.on_commit(lambda: response_cache.bump_generation(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_on_write(sender, instance, **kwargs):
+    """Invalidate cached responses when a recipe object changes"""
+    invalidate_user_responses(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_link(sender, instance, action, **kwargs):
+    """Invalidate cached responses when recipe links change"""
+    if action.startswith('post_'):
+        invalidate_user_responses(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_snapshots_on_link(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """Rebuild the snapshots of recipes whose links changed"""
+    if not reverse:
+        if action.startswith('post_'):
+            refresh_snapshots([instance.pk])
+    elif action == 'pre_clear':
+        # The cleared recipes are only known before the links are gone
+        instance._cleared_recipe_ids = list(sender.objects.filter(
+            **{RECIPE_LINKS[type(instance)][1]: instance}
+        ).values_list('recipe_id', flat=True))
+    elif action == 'post_clear':
+        refresh_snapshots(instance.__dict__.pop('_cleared_recipe_ids', []))
+    elif action.startswith('post_'):
+        refresh_snapshots(pk_set)
+
+
+@receiver(post_save, sender=Recipe)
+def build_missing_snapshot(sender, instance, **kwargs):
+    """Build the snapshot of a saved recipe that predates snapshots"""
+    deferred = 'snapshot' in instance.get_deferred_fields()
+    if not deferred and instance.snapshot is None:
+        refresh_snapshots([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_snapshots_on_rename(sender, instance, created, update_fields,
+                                **kwargs):
+    """Rebuild the snapshots of recipes linked to a renamed object"""
+    if created or (update_fields is not None and
+                   'name' not in update_fields):
+        return
+    links, field = RECIPE_LINKS[sender]
+    refresh_linked_snapshots(links, field, [instance.pk])
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_linked_recipes(sender, instance, **kwargs):
+    """Remember the recipes linked to an object about to be deleted"""
+    links, field = RECIPE_LINKS[sender]
+    instance._linked_recipe_ids = list(links.objects.filter(
+        **{field: instance}
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_snapshots_on_delete(sender, instance, **kwargs):
+    """Rebuild the snapshots of recipes linked to a deleted object
+
+    Deleting cascades to the links without sending m2m_changed.
+    """
+    refresh_snapshots(instance.__dict__.pop('_linked_recipe_ids', []))
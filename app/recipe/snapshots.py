@@ -0,0 +1,56 @@
+from django.db import connection
+
+# (snapshot key, related table, link table column) per relation
+RELATIONS = (
+    ('tags', 'core_tag', 'tag_id'),
+    ('ingredients', 'core_ingredient', 'ingredient_id'),
+)
+
+# The snapshot of recipe r as it follows from its links, the same shape
+# as a detail response: {"tags": [{"id": ..., "name": ...}], ...}
+SNAPSHOT_SQL = 'jsonb_build_object({})'.format(', '.join(
+    f"""'{key}', coalesce((
+        SELECT jsonb_agg(jsonb_build_object('id', o.id, 'name', o.name)
+                         ORDER BY o.id)
+        FROM core_recipe_{key} l JOIN {table} o ON o.id = l.{column}
+        WHERE l.recipe_id = r.id
+    ), '[]')"""
+    for key, table, column in RELATIONS
+))
+
+
+def refresh_snapshots(recipe_ids):
+    """Rebuild the snapshots of the given recipes with one UPDATE"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE core_recipe r SET snapshot = {SNAPSHOT_SQL} '
+            f'WHERE r.id IN (SELECT unnest(%s::int[]))',
+            [recipe_ids]
+        )
+
+
+def refresh_linked_snapshots(links, field, pks):
+    """Rebuild the snapshots of recipes linked to the given objects
+
+    `links` is the through model of the recipe relation and `field` the
+    name of its foreign key to the related model, e.g. 'tag'.
+    """
+    refresh_snapshots(links.objects.filter(
+        **{f'{field}__in': pks}
+    ).values_list('recipe_id', flat=True).distinct())
+
+
+def stale_snapshots(recipe_ids):
+    """Return the ids of recipes whose snapshot differs from their links"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT r.id FROM core_recipe r '
+            f'WHERE r.id IN (SELECT unnest(%s::int[])) '
+            f'AND r.snapshot IS DISTINCT FROM {SNAPSHOT_SQL} ORDER BY r.id',
+            [list(recipe_ids)]
+        )
+        return [row[0] for row in cursor.fetchall()]
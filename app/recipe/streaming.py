@@ -0,0 +1,84 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+
+from core.metrics import serializer_timer
+from core.renderers import FastJSONRenderer
+
+STREAM_VALUES = ('1', 'true')
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class StreamingListMixin:
+    """Stream a whole list as one JSON array when ?stream=1 is given
+
+    Rows are read through a server-side cursor and rendered a chunk at a
+    time, so memory use does not grow with the number of rows. Streamed
+    lists are in page order but neither paginated nor cached.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') not in STREAM_VALUES:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = self.paginator.get_ordering(request, queryset, self)
+
+        return StreamingHttpResponse(
+            self.stream_json(queryset.order_by(*ordering)),
+            content_type='application/json'
+        )
+
+    async def list_async(self, request, *args, **kwargs):
+        if request.query_params.get('stream') not in STREAM_VALUES:
+            return await super().list_async(request, *args, **kwargs)
+
+        # Nothing is read until the response is consumed
+        return self.list(request, *args, **kwargs)
+
+    def stream_json(self, queryset):
+        """Yield the JSON array of all items in queryset"""
+        renderer = FastJSONRenderer()
+        separator = b''
+        yield b'['
+        for items in self.serialize_chunks(queryset):
+            content = renderer.render(items)
+            # Splice the chunk's items into the array, minus its brackets
+            if items:
+                yield separator + content[1:-1]
+                separator = b','
+        yield b']'
+
+    def serialize_chunks(self, queryset):
+        """Yield lists of serialized items, one chunk of rows at a time"""
+        chunk_size = settings.API_STREAM_CHUNK_SIZE
+        fast_serializer_class = getattr(self, 'fast_serializer_class', None)
+        if settings.API_FAST_SERIALIZERS and fast_serializer_class:
+            serializer = fast_serializer_class(
+                context=self.get_serializer_context()
+            )
+            rows = serializer.get_rows(queryset)
+            for chunk in chunked(rows.iterator(chunk_size=chunk_size),
+                                 chunk_size):
+                with serializer_timer():
+                    items = serializer.to_representation(chunk)
+                yield items
+            return
+
+        # iterator() ignores prefetch_related, prefetch every chunk instead
+        lookups = queryset._prefetch_related_lookups
+        objs = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+        for chunk in chunked(objs, chunk_size):
+            prefetch_related_objects(chunk, *lookups)
+            yield self.get_serializer(chunk, many=True).data
@@ -0,0 +1,235 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from core.testing import QueryCountMixin
+
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk')
+
+
+def recipe_payload(n, **params):
+    """Return a recipe payload for the bulk endpoint"""
+    payload = {'title': f'Recipe {n}', 'time_minutes': 10, 'price': '5.00'}
+    payload.update(params)
+    return payload
+
+
+class BulkAPITests(QueryCountMixin, TestCase):
+    """Test the bulk create, update and delete endpoints"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Salt'
+        )
+
+    def test_bulk_create_recipes(self):
+        """Test creating recipes with their tags and ingredients"""
+        payload = [
+            recipe_payload(n, tags=[self.tag.id],
+                           ingredients=[self.ingredient.id])
+            for n in range(3)
+        ]
+        response = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['title'] for item in response.data],
+                         ['Recipe 0', 'Recipe 1', 'Recipe 2'])
+        for recipe in Recipe.objects.filter(user=self.user):
+            self.assertEqual(list(recipe.tags.all()), [self.tag])
+            self.assertEqual(list(recipe.ingredients.all()),
+                             [self.ingredient])
+
+    def test_bulk_create_constant_queries(self):
+        """Test the query count does not depend on the number of items"""
+        def create(count):
+            payload = [
+                recipe_payload(n, tags=[self.tag.id],
+                               ingredients=[self.ingredient.id])
+                for n in range(count)
+            ]
+            return self.count_queries(lambda: self.client.post(
+                RECIPES_BULK_URL, payload, format='json'
+            ))[1]
+
+        self.assertEqual(create(2), create(20))
+
+    def test_bulk_create_reports_item_errors(self):
+        """Test invalid items are reported by index and nothing is saved"""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'testpass'
+        )
+        other_tag = Tag.objects.create(user=other_user, name='Meat')
+        payload = [
+            recipe_payload(0),
+            recipe_payload(1, title=''),
+            recipe_payload(2, tags=[other_tag.id]),
+        ]
+        response = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('title', response.data[1])
+        self.assertIn('tags', response.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_recipes(self):
+        """Test updating fields and replacing relations of many recipes"""
+        recipes = [Recipe.objects.create(user=self.user, **{
+            'title': f'Recipe {n}', 'time_minutes': 10, 'price': 5
+        }) for n in range(2)]
+        recipes[0].tags.add(self.tag)
+        payload = [
+            {'id': recipes[0].id, 'title': 'Curry', 'tags': []},
+            {'id': recipes[1].id, 'time_minutes': 30,
+             'ingredients': [self.ingredient.id]},
+        ]
+        response = self.client.patch(RECIPES_BULK_URL, payload,
+                                     format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+        self.assertEqual(recipes[0].title, 'Curry')
+        self.assertEqual(recipes[0].time_minutes, 10)
+        self.assertFalse(recipes[0].tags.exists())
+        self.assertEqual(recipes[1].title, 'Recipe 1')
+        self.assertEqual(recipes[1].time_minutes, 30)
+        self.assertEqual(list(recipes[1].ingredients.all()),
+                         [self.ingredient])
+
+    def test_bulk_writes_update_snapshots(self):
+        """Test bulk links, renames and deletes keep snapshots current"""
+        response = self.client.post(
+            RECIPES_BULK_URL, [recipe_payload(0, tags=[self.tag.id])],
+            format='json'
+        )
+        recipe = Recipe.objects.get(pk=response.data[0]['id'])
+        self.assertEqual(recipe.snapshot['tags'],
+                         [{'id': self.tag.id, 'name': 'Vegan'}])
+
+        self.client.patch(TAGS_BULK_URL,
+                          [{'id': self.tag.id, 'name': 'Vegetarian'}],
+                          format='json')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.snapshot['tags'],
+                         [{'id': self.tag.id, 'name': 'Vegetarian'}])
+
+        self.client.delete(TAGS_BULK_URL, [self.tag.id], format='json')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.snapshot, {'tags': [], 'ingredients': []})
+
+    def test_bulk_update_unknown_id(self):
+        """Test updating a recipe that does not exist is an item error"""
+        response = self.client.patch(
+            RECIPES_BULK_URL, [{'id': 0, 'title': 'Curry'}, {}],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data[0])
+        self.assertIn('id', response.data[1])
+
+    def test_bulk_delete_tags(self):
+        """Test deleting tags by id"""
+        tag2 = Tag.objects.create(user=self.user, name='Dessert')
+        response = self.client.delete(
+            TAGS_BULK_URL, [self.tag.id, tag2.id], format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_delete_other_users_tag(self):
+        """Test other users' tags cannot be deleted"""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'testpass'
+        )
+        other_tag = Tag.objects.create(user=other_user, name='Meat')
+        response = self.client.delete(
+            TAGS_BULK_URL, [self.tag.id, other_tag.id], format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{}, {'id': ['Not found.']}])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_bulk_booleans_are_not_ids(self):
+        """Test true is not taken for the object with id 1"""
+        Tag.objects.filter(pk=self.tag.pk).update(id=1)
+        response = self.client.delete(TAGS_BULK_URL, [True], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{'id': ['Not found.']}])
+
+        response = self.client.patch(
+            TAGS_BULK_URL, [{'id': True, 'name': 'Vegan'}], format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{'id': ['Not found.']}])
+        self.assertTrue(Tag.objects.filter(pk=1).exists())
+
+    def test_bulk_create_ingredients(self):
+        """Test creating ingredients for the authenticated user"""
+        response = self.client.post(
+            INGREDIENTS_BULK_URL, [{'name': 'Kale'}, {'name': 'Pepper'}],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 3
+        )
+
+    def test_bulk_names_taken(self):
+        """Test names used already or twice in a request are rejected"""
+        response = self.client.post(
+            TAGS_BULK_URL,
+            [{'name': 'Vegan'}, {'name': 'Meat'}, {'name': 'Meat'}],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(map(bool, response.data)), [True, False, True])
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_bulk_update_names(self):
+        """Test objects keep their name but cannot take another's"""
+        tag = Tag.objects.create(user=self.user, name='Meat')
+        response = self.client.patch(TAGS_BULK_URL, [
+            {'id': self.tag.id, 'name': 'Vegan'},
+            {'id': tag.id, 'name': 'Vegan'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('name', response.data[1])
+
+    @override_settings(API_BULK_MAX_ITEMS=2)
+    def test_bulk_item_limit(self):
+        """Test requests with too many items are rejected"""
+        response = self.client.post(
+            TAGS_BULK_URL, [{'name': str(n)} for n in range(3)],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_requires_list(self):
+        """Test the payload must be a list"""
+        response = self.client.post(TAGS_BULK_URL, {'name': 'Vegan'},
+                                    format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
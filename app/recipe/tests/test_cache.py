@@ -0,0 +1,137 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+from core.testing import QueryCountMixin
+from recipe.cache import response_cache, etag_matches
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ResponseCacheTests(QueryCountMixin, TestCase):
+    """Test the per-user recipe API response cache"""
+
+    def setUp(self):
+        response_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5.00
+        )
+
+    def tearDown(self):
+        response_cache.reset()
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list request does not hit the database"""
+        first = self.client.get(RECIPES_URL)
+        second, queries = self.count_queries(
+            lambda: self.client.get(RECIPES_URL)
+        )
+
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.data, first.data)
+
+    def test_query_params_normalized(self):
+        """Test parameter order does not create separate entries"""
+        self.client.get(RECIPES_URL + '?page_size=5&match=any')
+        _, queries = self.count_queries(
+            lambda: self.client.get(RECIPES_URL + '?match=any&page_size=5')
+        )
+
+        self.assertEqual(queries, 0)
+
+    def test_scheme_varies_cache(self):
+        """Test https requests never get the absolute URLs of http ones"""
+        Recipe.objects.create(user=self.user, title='Stew', time_minutes=5,
+                              price=5.00)
+        self.client.get(RECIPES_URL, {'page_size': 1})
+        response = self.client.get(RECIPES_URL, {'page_size': 1},
+                                   secure=True)
+
+        self.assertTrue(response.data['next'].startswith('https://'))
+
+    def test_write_invalidates_list(self):
+        """Test creating a recipe invalidates the cached list"""
+        self.client.get(RECIPES_URL)
+        self.client.post(RECIPES_URL, {
+            'title': 'Soup', 'time_minutes': 5, 'price': 2.00
+        })
+
+        response = self.client.get(RECIPES_URL)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_tag_rename_invalidates_detail(self):
+        """Test renaming a tag invalidates cached recipe details"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+        self.client.get(detail_url(self.recipe.id))
+
+        tag.name = 'Vegetarian'
+        tag.save()
+
+        response = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(response.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_link_change_invalidates_list(self):
+        """Test adding a tag to a recipe invalidates the cached list"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(RECIPES_URL)
+
+        self.recipe.tags.add(tag)
+
+        response = self.client.get(RECIPES_URL)
+        self.assertEqual(response.data['results'][0]['tags'], [tag.id])
+
+    def test_cache_limited_to_user(self):
+        """Test users never see each other's cached responses"""
+        self.client.get(TAGS_URL)
+        user2 = get_user_model().objects.create_user(
+            'other@example.com', 'testpass'
+        )
+        Tag.objects.create(user=user2, name='Fruity')
+        self.client.force_authenticate(user2)
+
+        response = self.client.get(TAGS_URL)
+        self.assertEqual(response.data['results'][0]['name'], 'Fruity')
+
+    def test_if_none_match_not_modified(self):
+        """Test a matching If-None-Match gets a 304 without a body"""
+        response = self.client.get(RECIPES_URL)
+        etag = response['ETag']
+
+        response = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+    def test_stale_etag_gets_full_response(self):
+        """Test an outdated ETag gets the new data"""
+        etag = self.client.get(RECIPES_URL)['ETag']
+        self.recipe.title = 'Tikka'
+        self.recipe.save()
+
+        response = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_matches(self):
+        """Test parsing of If-None-Match headers"""
+        self.assertTrue(etag_matches('"a"', '"b", "a"'))
+        self.assertTrue(etag_matches('"a"', 'W/"a"'))
+        self.assertTrue(etag_matches('"a"', '*'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches('"a"', None))
@@ -0,0 +1,144 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.test import TestCase
+
+from core.models import Tag, Recipe
+from core.seed import seed_dataset
+from recipe.management.commands.check_query_plans import filtered_seq_scans
+
+INDEX_PLAN = {
+    'Node Type': 'Index Scan',
+    'Relation Name': 'core_recipe',
+    'Index Cond': '(user_id = 1)',
+}
+SEQ_PLAN = {
+    'Node Type': 'Seq Scan',
+    'Relation Name': 'core_recipe',
+    'Filter': '(user_id = 1)',
+}
+HASH_PLAN = {
+    'Node Type': 'Hash Join',
+    'Plans': [
+        INDEX_PLAN,
+        {'Node Type': 'Hash', 'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'core_tag'},
+        ]},
+    ],
+}
+
+
+class CheckQueryPlansTests(TestCase):
+
+    def test_filtered_seq_scans(self):
+        """Test only seq scans with a filter are reported"""
+        self.assertEqual(filtered_seq_scans(INDEX_PLAN), [])
+        self.assertEqual(filtered_seq_scans(HASH_PLAN), [])
+        self.assertEqual(
+            filtered_seq_scans({'Node Type': 'Limit', 'Plans': [SEQ_PLAN]}),
+            ['core_recipe']
+        )
+
+    @patch('recipe.management.commands.check_query_plans.Command.explain')
+    def test_index_plans_pass(self, explain):
+        """Test the command succeeds when every query uses an index"""
+        explain.return_value = INDEX_PLAN
+        call_command('check_query_plans', users=2, recipes=2,
+                     stdout=StringIO())
+
+        self.assertTrue(explain.called)
+
+    @patch('recipe.management.commands.check_query_plans.Command.explain')
+    def test_seq_scan_fails(self, explain):
+        """Test the command fails when a query falls back to a seq scan"""
+        explain.return_value = SEQ_PLAN
+        with self.assertRaises(CommandError):
+            call_command('check_query_plans', users=2, recipes=2,
+                         stdout=StringIO())
+
+    @patch('recipe.management.commands.check_query_plans.Command.explain')
+    def test_seeded_rows_rolled_back(self, explain):
+        """Test that the seeded dataset is not left in the database"""
+        explain.return_value = INDEX_PLAN
+        call_command('check_query_plans', users=2, recipes=2,
+                     stdout=StringIO())
+
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkSearchTests(TestCase):
+
+    def test_benchmark_search(self):
+        """Test the search benchmark reports timings and rolls back"""
+        stdout = StringIO()
+        call_command('benchmark_search', users=2, recipes=20, queries=5,
+                     max_ms=10000, stdout=stdout, stderr=StringIO())
+
+        self.assertIn('"p95_ms"', stdout.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_search_too_slow(self):
+        """Test the command fails when the p95 is over the limit"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_search', users=2, recipes=20,
+                         queries=5, max_ms=0, stdout=StringIO(),
+                         stderr=StringIO())
+
+
+class RecipeSnapshotsCommandTests(TestCase):
+
+    def setUp(self):
+        seed_dataset(users=2, recipes=3, tags=2, ingredients=2)
+
+    def test_verify_up_to_date(self):
+        """Test verifying snapshots kept current by the signals"""
+        stdout = StringIO()
+        call_command('recipe_snapshots', verify=True, stdout=stdout)
+
+        self.assertIn('All 6 recipe snapshots', stdout.getvalue())
+
+    def test_rebuild_stale(self):
+        """Test stale snapshots are reported, then rebuilt in batches"""
+        # Queryset updates send no signals
+        Tag.objects.update(name=Concat(Value('Renamed '), F('name')))
+        with self.assertRaises(CommandError):
+            call_command('recipe_snapshots', verify=True,
+                         stdout=StringIO())
+
+        call_command('recipe_snapshots', batch_size=4, stdout=StringIO())
+
+        call_command('recipe_snapshots', verify=True, stdout=StringIO())
+        recipe = Recipe.objects.first()
+        self.assertTrue(all(tag['name'].startswith('Renamed ')
+                            for tag in recipe.snapshot['tags']))
+
+
+class RecipeCountsCommandTests(TestCase):
+
+    def setUp(self):
+        seed_dataset(users=2, recipes=3, tags=2, ingredients=2)
+
+    def test_verify_up_to_date(self):
+        """Test verifying counts kept current by the triggers"""
+        stdout = StringIO()
+        call_command('recipe_counts', verify=True, stdout=stdout)
+
+        self.assertIn('All 8 recipe counts', stdout.getvalue())
+
+    def test_reconcile_wrong(self):
+        """Test wrong counts are reported, then fixed in batches"""
+        Tag.objects.update(recipe_count=0)
+        with self.assertRaises(CommandError):
+            call_command('recipe_counts', verify=True, stdout=StringIO())
+
+        stdout = StringIO()
+        call_command('recipe_counts', batch_size=3, stdout=stdout)
+
+        self.assertIn('fixed 4', stdout.getvalue())
+        call_command('recipe_counts', verify=True, stdout=StringIO())
+        self.assertEqual(set(Tag.objects.values_list('recipe_count',
+                                                     flat=True)), {3})
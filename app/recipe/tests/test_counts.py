@@ -0,0 +1,195 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from core.seed import seed_dataset
+from recipe.cache import response_cache
+from recipe.counts import RECIPE_COUNTS, reconcile_recipe_counts, \
+    stale_recipe_counts
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class RecipeCountTests(TestCase):
+    """Test tag and ingredient recipe counts follow every link write"""
+
+    def setUp(self):
+        response_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [Tag.objects.create(user=self.user, name=name)
+                     for name in ('Vegan', 'Dessert', 'Spicy')]
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='Salt')
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title=f'Soup {n}',
+                                  time_minutes=n, price=n)
+            for n in range(3)
+        ]
+
+    def tearDown(self):
+        response_cache.reset()
+
+    def assertCounts(self, model, expected):
+        """Check the stored counts of model and that they are right"""
+        counts = dict(model.objects.values_list('name', 'recipe_count'))
+        self.assertEqual({name: counts[name] for name in expected},
+                         expected)
+        pks = model.objects.values_list('pk', flat=True)
+        self.assertEqual(stale_recipe_counts(model, pks), [])
+
+    def test_links_from_either_side(self):
+        """Test adding, removing, setting and clearing links"""
+        vegan, dessert, spicy = self.tags
+        self.recipes[0].tags.add(vegan, dessert)
+        self.recipes[1].tags.set([vegan])
+        spicy.recipe_set.add(*self.recipes)
+        self.assertCounts(Tag, {'Vegan': 2, 'Dessert': 1, 'Spicy': 3})
+
+        self.recipes[0].tags.remove(vegan, spicy)
+        self.recipes[1].tags.set([dessert])
+        spicy.recipe_set.clear()
+        self.recipes[0].ingredients.add(self.ingredient)
+        self.assertCounts(Tag, {'Vegan': 0, 'Dessert': 2, 'Spicy': 0})
+        self.assertCounts(Ingredient, {'Salt': 1})
+
+    def test_recipe_deletes(self):
+        """Test deleting recipes, one or many, uncounts their links"""
+        for recipe in self.recipes:
+            recipe.tags.add(*self.tags[:2])
+            recipe.ingredients.add(self.ingredient)
+
+        self.recipes[0].delete()
+        self.assertCounts(Tag, {'Vegan': 2, 'Dessert': 2})
+
+        response = self.client.delete(
+            RECIPES_BULK_URL, [self.recipes[1].id], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        Recipe.objects.filter(pk=self.recipes[2].pk).delete()
+        self.assertCounts(Tag, {'Vegan': 0, 'Dessert': 0})
+        self.assertCounts(Ingredient, {'Salt': 0})
+
+    def test_bulk_and_name_links(self):
+        """Test links written in bulk or by name are counted"""
+        response = self.client.post(RECIPES_BULK_URL, [
+            {'title': 'Stew', 'time_minutes': 5, 'price': '5.00',
+             'tags': [self.tags[0].id, self.tags[1].id]},
+            {'title': 'Cake', 'time_minutes': 5, 'price': '5.00',
+             'tags': [self.tags[1].id]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.patch(RECIPES_BULK_URL, [
+            {'id': response.data[0]['id'], 'tags': [self.tags[2].id]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(RECIPES_URL, {
+            'title': 'Curry', 'time_minutes': 5, 'price': '5.00',
+            'tags': ['Spicy', 'Hot'], 'ingredients': ['Salt'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertCounts(Tag, {'Vegan': 0, 'Dessert': 1, 'Spicy': 2,
+                                'Hot': 1})
+        self.assertCounts(Ingredient, {'Salt': 1})
+
+    def test_seeded_counts(self):
+        """Test links inserted by seed_dataset are counted"""
+        seed_dataset(users=2, recipes=5, tags=3, ingredients=2)
+
+        for model in RECIPE_COUNTS:
+            pks = model.objects.values_list('pk', flat=True)
+            self.assertEqual(stale_recipe_counts(model, pks), [])
+        self.assertEqual(
+            Tag.objects.filter(name='Tag 0').values('recipe_count')[0],
+            {'recipe_count': 5}
+        )
+
+    def test_reconcile(self):
+        """Test reconciling fixes drifted counts only"""
+        self.recipes[0].tags.add(*self.tags)
+        Tag.objects.filter(name='Vegan').update(recipe_count=5)
+        pks = list(Tag.objects.values_list('pk', flat=True))
+
+        self.assertEqual(stale_recipe_counts(Tag, pks), [self.tags[0].pk])
+        self.assertEqual(reconcile_recipe_counts(Tag, pks), 1)
+        self.assertCounts(Tag, {'Vegan': 1, 'Dessert': 1, 'Spicy': 1})
+
+
+class RecipeCountOrderingTests(TestCase):
+    """Test listing tags by how many recipes use them"""
+
+    def setUp(self):
+        response_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Counts 3, 2, 1 and 0, 0 tie
+        self.tags = [Tag.objects.create(user=self.user, name=f'Tag {n}')
+                     for n in range(5)]
+        for n in range(3):
+            recipe = Recipe.objects.create(user=self.user, title=f'Soup {n}',
+                                           time_minutes=n, price=n)
+            recipe.tags.add(*self.tags[:3 - n])
+
+    def tearDown(self):
+        response_cache.reset()
+
+    def get_pages(self, params):
+        """Return the results of every page, in order"""
+        results = []
+        response = self.client.get(TAGS_URL, dict(params, page_size=2))
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results += response.data['results']
+            if not response.data['next']:
+                return results
+            response = self.client.get(response.data['next'])
+
+    def test_most_used_first(self):
+        """Test ?ordering=-recipe_count pages by count, id breaks ties"""
+        results = self.get_pages({'ordering': '-recipe_count'})
+
+        self.assertEqual([item['recipe_count'] for item in results],
+                         [3, 2, 1, 0, 0])
+        self.assertEqual([item['id'] for item in results],
+                         [tag.id for tag in self.tags])
+
+    def test_least_used_first(self):
+        """Test ?ordering=recipe_count reverses the order"""
+        results = self.get_pages({'ordering': 'recipe_count'})
+
+        self.assertEqual([item['id'] for item in results],
+                         [tag.id for tag in reversed(self.tags)])
+
+    def test_stream_ordering(self):
+        """Test streamed lists follow the requested ordering"""
+        response = self.client.get(
+            TAGS_URL, {'ordering': '-recipe_count', 'stream': 1}
+        )
+
+        items = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual([item['id'] for item in items],
+                         [tag.id for tag in self.tags])
+
+    def test_invalid_ordering_ignored(self):
+        """Test unknown ordering fields fall back to the name ordering"""
+        results = self.get_pages({'ordering': 'user'})
+
+        self.assertEqual([item['name'] for item in results],
+                         [f'Tag {n}' for n in reversed(range(5))])
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from core.testing import QueryCountMixin
+from recipe.cache import response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class FastSerializerTests(QueryCountMixin, TestCase):
+    """Test fast list serializers render exactly what DRF renders"""
+
+    def setUp(self):
+        response_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('Vegan', 'Dessert', 'Spicy')]
+        ingredients = [Ingredient.objects.create(user=self.user, name=name)
+                       for name in ('Salt', 'Kale')]
+        for n in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {n}', time_minutes=n,
+                price='%d.%d5' % (n, n), link=f'https://example.com/{n}',
+                image_variants={'thumbnail': f'uploads/recipe/{n}.webp'},
+            )
+            recipe.tags.set(tags[:n % 4])
+            recipe.ingredients.set(ingredients[n % 2:])
+        tags[0].recipe_set.add(recipe)
+
+    def tearDown(self):
+        response_cache.reset()
+
+    def assertSameContent(self, url, params=None, page_size=2):
+        """Check fast and DRF serializers give byte-identical pages"""
+        params = dict(params or {}, page_size=page_size)
+        pages = {}
+        for fast in (True, False):
+            with override_settings(API_FAST_SERIALIZERS=fast):
+                pages[fast] = []
+                next_url, data = url, params
+                while next_url:
+                    response_cache.bump_generation(self.user.pk)
+                    response = self.client.get(next_url, data)
+                    self.assertEqual(response.status_code,
+                                     status.HTTP_200_OK)
+                    pages[fast].append(response.content)
+                    next_url, data = response.data['next'], None
+
+        self.assertGreater(len(pages[True]), 1)
+        self.assertEqual(pages[True], pages[False])
+
+    def test_recipes_identical(self):
+        """Test recipe lists match, walking every page"""
+        self.assertSameContent(RECIPES_URL)
+        self.assertSameContent(RECIPES_URL, {'q': 'curry'})
+        tag_ids = ','.join(str(tag.id) for tag in Tag.objects.all())
+        self.assertSameContent(RECIPES_URL, {'tags': tag_ids}, 1)
+
+    def test_recipes_without_snapshots_identical(self):
+        """Test recipes rendered from their relations match"""
+        Recipe.objects.filter(title__in=['Curry 1', 'Curry 3']) \
+            .update(snapshot=None)
+        self.assertSameContent(RECIPES_URL, page_size=3)
+
+        with override_settings(RECIPE_SNAPSHOTS=False):
+            self.assertSameContent(RECIPES_URL)
+
+    def test_tags_and_ingredients_identical(self):
+        """Test tag and ingredient lists match"""
+        self.assertSameContent(TAGS_URL)
+        self.assertSameContent(TAGS_URL, {'assigned_only': 1})
+        self.assertSameContent(INGREDIENTS_URL, page_size=1)
+
+    def test_fast_recipes_constant_queries(self):
+        """Test recipes without snapshots take one query per relation"""
+        def list_recipes():
+            response_cache.bump_generation(self.user.pk)
+            self.client.get(RECIPES_URL)
+
+        def grow():
+            recipe = Recipe.objects.create(user=self.user, title='Stew',
+                                           time_minutes=1, price=1)
+            recipe.tags.add(Tag.objects.first())
+            Recipe.objects.update(snapshot=None)
+
+        Recipe.objects.update(snapshot=None)
+        self.assertConstantQueries(list_recipes, grow)
@@ -0,0 +1,231 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import images
+from recipe.uploads import TOO_MANY_PIXELS, ImageStream, UploadTooLarge
+
+MEDIA_ROOT = tempfile.mkdtemp()
+VARIANT_SIZES = {'thumb': (20, 20), 'medium': (50, 50)}
+
+
+def image_upload_url(recipe_id):
+    """Return URL for recipe image upload"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def sample_image(size=(100, 80), image_format='JPEG'):
+    """Return the bytes of a generated image"""
+    buffer = BytesIO()
+    Image.new('RGB', size).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImmediateExecutor:
+    """Executor creating variants synchronously on the test connection"""
+
+    def submit(self, func, *args):
+        images.generate_variants(*args)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_VARIANT_SIZES=VARIANT_SIZES)
+class ImageVariantTests(TestCase):
+    """Test creating resized variants of recipe images"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5.00
+        )
+        self.recipe.image.save('photo.jpg', ContentFile(sample_image()))
+        self.original = self.recipe.image.name
+
+    def test_generate_variants(self):
+        """Test every variant is stored and fits its size"""
+        images.generate_variants(self.recipe.id)
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(set(self.recipe.image_variants), set(VARIANT_SIZES))
+        storage = self.recipe.image.storage
+        for variant, path in self.recipe.image_variants.items():
+            with storage.open(path) as image_file:
+                width, height = Image.open(image_file).size
+            max_width, max_height = VARIANT_SIZES[variant]
+            self.assertLessEqual(width, max_width)
+            self.assertLessEqual(height, max_height)
+
+    @override_settings(IMAGE_VARIANT_FORMAT='JPEG')
+    def test_generate_jpeg_variants(self):
+        """Test variants can be written as JPEG"""
+        images.generate_variants(self.recipe.id)
+        self.recipe.refresh_from_db()
+
+        for path in self.recipe.image_variants.values():
+            self.assertTrue(path.endswith('.jpg'))
+
+    def test_replaced_image_variants_discarded(self):
+        """Test variants of an image replaced meanwhile are not recorded"""
+        render_variant = images.render_variant
+
+        def replace_image(*args):
+            Recipe.objects.filter(pk=self.recipe.id).update(image='new.jpg')
+            return render_variant(*args)
+
+        with patch('recipe.images.render_variant', side_effect=replace_image):
+            images.generate_variants(self.recipe.id)
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(self.recipe.image_variants, {})
+        directory, name = os.path.split(self.original)
+        stem = os.path.splitext(name)[0]
+        leftovers = [
+            name for name in os.listdir(os.path.join(MEDIA_ROOT, directory))
+            if name.startswith(f'{stem}_')
+        ]
+        self.assertEqual(leftovers, [])
+
+    def test_stale_variants_deleted(self):
+        """Test variants of the previous image are removed"""
+        images.generate_variants(self.recipe.id)
+        self.recipe.refresh_from_db()
+        stale = list(self.recipe.image_variants.values())
+
+        images.generate_variants(self.recipe.id, stale)
+
+        storage = self.recipe.image.storage
+        for path in stale:
+            self.assertFalse(storage.exists(path))
+
+    @patch('recipe.images.get_executor', return_value=ImmediateExecutor())
+    @patch('recipe.images.transaction.on_commit', lambda func: func())
+    def test_upload_schedules_variants(self, get_executor):
+        """Test uploading an image creates its variants in the pool"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = ContentFile(sample_image(), name='upload.jpg')
+
+        response = client.post(
+            image_upload_url(self.recipe.id), {'image': upload},
+            format='multipart'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(get_executor.called)
+        self.recipe.refresh_from_db()
+        self.assertEqual(set(self.recipe.image_variants), set(VARIANT_SIZES))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class StreamingImageUploadTests(TestCase):
+    """Test uploading a recipe image as a raw request body"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5.00
+        )
+        self.url = image_upload_url(self.recipe.id)
+
+    def put_image(self, content, content_type='image/jpeg'):
+        return self.client.put(self.url, content, content_type=content_type)
+
+    def uploaded_files(self):
+        directory = os.path.join(MEDIA_ROOT, 'uploads/recipe')
+        if not os.path.exists(directory):
+            return set()
+        return set(os.listdir(directory))
+
+    @patch('recipe.views.schedule_variants')
+    def test_stream_upload(self, schedule_variants):
+        """Test a raw image body is stored under the recipe upload path"""
+        response = self.put_image(sample_image(image_format='PNG'),
+                                  'image/png')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.startswith('uploads/recipe/'))
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+        with self.recipe.image.open() as image_file:
+            self.assertEqual(Image.open(image_file).size, (100, 80))
+        self.assertTrue(schedule_variants.called)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024,
+                       IMAGE_UPLOAD_CHUNK_SIZE=256)
+    def test_stream_upload_too_large(self):
+        """Test uploads over the byte limit are rejected"""
+        before = self.uploaded_files()
+        response = self.put_image(sample_image((400, 400), 'PNG') * 20)
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.uploaded_files(), before)
+
+    def test_stream_limit_enforced_while_streaming(self):
+        """Test the byte limit is checked as chunks are pulled"""
+        upload = ImageStream(BytesIO(sample_image((400, 400), 'PNG') * 20),
+                             max_bytes=1024, chunk_size=256)
+        upload.read_header()
+
+        with self.assertRaises(UploadTooLarge):
+            for _ in upload.chunks():
+                pass
+        self.assertLessEqual(upload.received, 1024 + 256)
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_stream_upload_too_many_pixels(self):
+        """Test images over the pixel limit are rejected from the header"""
+        response = self.put_image(sample_image((20, 20)))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    @patch('PIL.Image.MAX_IMAGE_PIXELS', 100)
+    def test_stream_upload_decompression_bomb(self):
+        """Test images Pillow refuses to open get the pixel limit error"""
+        response = self.put_image(sample_image((20, 20)))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['image'], [TOO_MANY_PIXELS])
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_multipart_upload_too_many_pixels(self):
+        """Test multipart uploads are held to the pixel limit as well"""
+        # Under twice the limit, which is all Pillow refuses
+        upload = ContentFile(sample_image((15, 10)), name='upload.jpg')
+
+        response = self.client.post(self.url, {'image': upload},
+                                    format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        self.assertEqual(self.uploaded_files(), set())
+
+    def test_stream_upload_invalid_image(self):
+        """Test a body that is not an image is rejected"""
+        response = self.put_image(b'not an image' * 100)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,17 +1,24 @@
 import tempfile # Generate temporary files
 import os
+from unittest.mock import patch
 
 from PIL import Image # Image class
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Ingredient, Tag
+from core.testing import QueryCountMixin
+from recipe.cache import response_cache
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
@@ -83,7 +90,7 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         
     def test_recipes_limited_to_user(self):
         """Test retrieving a limited-to-user recipe list"""
@@ -99,8 +106,80 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'], serializer.data)
+        
+    def test_recipes_paginated_by_cursor(self):
+        """Test walking the recipe list page by page"""
+        recipes = [sample_recipe(user=self.user) for _ in range(5)]
+        
+        response = self.client.get(RECIPES_URL, {'page_size': 2})
+        ids = [item['id'] for item in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [item['id'] for item in response.data['results']]
+            
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+        
+    def test_recipes_page_size_capped(self):
+        """Test that clients cannot request more than the maximum page"""
+        for _ in range(3):
+            sample_recipe(user=self.user)
+            
+        with patch.object(RecipeCursorPagination, 'max_page_size', 2):
+            response = self.client.get(RECIPES_URL, {'page_size': 100})
+            
+        self.assertEqual(len(response.data['results']), 2)
+        
+    def test_recipes_deep_page_uses_keyset(self):
+        """Test that following a cursor does not use OFFSET"""
+        for _ in range(4):
+            sample_recipe(user=self.user)
+        response = self.client.get(RECIPES_URL, {'page_size': 2})
+        
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(response.data['next'])
+            
+        for query in context.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+        
+    def test_filter_recipes_no_duplicates(self):
+        """Test recipes matching several filter ids are returned once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag1, tag2)
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'}
+            )
+            
+        self.assertEqual(len(response.data['results']), 1)
+        for query in context.captured_queries:
+            self.assertNotIn('DISTINCT', query['sql'])
+            
+    def test_filter_recipes_match_all(self):
+        """Test match=all only returns recipes with every given tag"""
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        both = sample_recipe(user=self.user, title='Fruit salad')
+        both.tags.add(tag1, tag2)
+        one = sample_recipe(user=self.user, title='Lentil soup')
+        one.tags.add(tag1)
+        
+        response = self.client.get(
+            RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        )
+        ids = [item['id'] for item in response.data['results']]
+        
+        self.assertEqual(ids, [both.id])
+        
+    def test_filter_recipes_invalid_match(self):
+        """Test an unknown match mode is rejected"""
+        response = self.client.get(RECIPES_URL, {'match': 'some'})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         
     def test_view_recipe_detail(self):
         """Test viewing a recipe detail"""
@@ -167,6 +246,69 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
         
+    def test_create_recipe_with_names(self):
+        """Test creating a recipe with tag and ingredient names"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        )
+        sample_ingredient(user=other_user, name='Garlic')
+        payload = {
+            'title': 'Garlic soup',
+            'tags': ['Vegan', 'Soup', 'Soup'],
+            'ingredients': ['Garlic', 'Stock'],
+            'time_minutes': 30,
+            'price': 4.00
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(RECIPES_URL, payload, format='json')
+            
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertEqual(set(recipe.tags.values_list('name', flat=True)),
+                         {'Vegan', 'Soup'})
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(
+            set(recipe.ingredients.values_list('user', flat=True)),
+            {self.user.id}
+        )
+        self.assertEqual(Ingredient.objects.filter(name='Garlic').count(), 2)
+        # One statement resolves the names of each model
+        inserts = [query['sql'] for query in queries
+                   if query['sql'].startswith('\nWITH input')]
+        self.assertEqual(len(inserts), 2)
+        
+    def test_update_recipe_with_names(self):
+        """Test names and ids can be mixed when updating a recipe"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user, name='Vegan')
+        
+        payload = {'tags': [tag.id, 'Curry']}
+        response = self.client.patch(detail_url(recipe.id), payload,
+                                     format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        curry = Tag.objects.get(user=self.user, name='Curry')
+        self.assertEqual(sorted(response.data['tags']),
+                         sorted([tag.id, curry.id]))
+        recipe.refresh_from_db()
+        self.assertEqual([item['name'] for item in recipe.snapshot['tags']],
+                         ['Vegan', 'Curry'])
+        
+    def test_create_recipe_blank_name(self):
+        """Test blank names are rejected without creating anything"""
+        payload = {
+            'title': 'Toast',
+            'tags': ['Breakfast', ' '],
+            'ingredients': [],
+            'time_minutes': 5,
+            'price': 1.00
+        }
+        response = self.client.post(RECIPES_URL, payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+        
     def test_partial_update_recipe(self):
         """Test updating recipe with PATCH."""
         recipe = sample_recipe(user=self.user)
@@ -207,6 +349,68 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(len(tags), 0)
         
 
+class RecipeQueryCountTests(QueryCountMixin, TestCase):
+    """Test that recipe endpoints do not issue queries per row"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        
+    def add_recipes(self, count=5):
+        """Create recipes with a tag and an ingredient each"""
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+            
+    def test_list_recipes_constant_queries(self):
+        """Test listing recipes runs a fixed number of queries"""
+        self.add_recipes(1)
+        
+        self.assertConstantQueries(
+            lambda: self.client.get(RECIPES_URL),
+            self.add_recipes
+        )
+        
+    def test_recipe_detail_constant_queries(self):
+        """Test recipe detail query count does not depend on relations"""
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        
+        def add_relations():
+            start = recipe.tags.count()
+            for i in range(start, start + 5):
+                recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+                recipe.ingredients.add(
+                    sample_ingredient(user=self.user, name=f'Ingr {i}')
+                )
+        
+        self.assertConstantQueries(
+            lambda: self.client.get(url),
+            add_relations
+        )
+        
+    def test_no_repeated_queries(self):
+        """Test recipe endpoints read relations without N+1 queries"""
+        self.add_recipes(3)
+        recipe = Recipe.objects.first()
+        
+        for snapshots in (True, False):
+            with self.settings(RECIPE_SNAPSHOTS=snapshots,
+                               API_FAST_SERIALIZERS=False):
+                with self.assertNoNPlusOne(threshold=3):
+                    self.client.get(RECIPES_URL)
+                    self.client.get(detail_url(recipe.id))
+                    self.client.patch(detail_url(recipe.id),
+                                      {'title': 'Renamed'})
+        
+
 class RecipeImageUploadTest(TestCase):
     
     def setUp(self):
@@ -263,9 +467,9 @@ class RecipeImageUploadTest(TestCase):
         serializer3 = RecipeSerializer(recipe3)
         
         # Check that only two first serializers are returned
-        self.assertIn(serializer1.data, response.data)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer3.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertIn(serializer2.data, response.data['results'])
+        self.assertNotIn(serializer3.data, response.data['results'])
         
     def test_filter_recipes_by_ingredients(self):
         """Test returning recipes with specific ingredients"""
@@ -285,6 +489,219 @@ class RecipeImageUploadTest(TestCase):
         serializer3 = RecipeSerializer(recipe3)
         
         # Check that only two first serializers are returned
-        self.assertIn(serializer1.data, response.data)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer3.data, response.data)
\ No newline at end of file
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertIn(serializer2.data, response.data['results'])
+        self.assertNotIn(serializer3.data, response.data['results'])
+
+
+class RecipeSearchTests(TestCase):
+    """Test full-text search of recipes"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        
+    def search(self, text, **params):
+        """Return the ids of recipes found for text"""
+        response = self.client.get(RECIPES_URL, {'q': text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        return [recipe['id'] for recipe in response.data['results']]
+    
+    def test_search_title(self):
+        """Test searching recipe titles, words are stemmed"""
+        recipe = sample_recipe(user=self.user, title='Chocolate cookies')
+        sample_recipe(user=self.user, title='Beef stew')
+        
+        self.assertEqual(self.search('cookie'), [recipe.id])
+        self.assertEqual(self.search('chocolate cookies'), [recipe.id])
+        self.assertEqual(self.search('chocolate stew'), [])
+        
+    def test_search_tags_and_ingredients(self):
+        """Test searching the names of linked tags and ingredients"""
+        recipe1 = sample_recipe(user=self.user, title='Curry')
+        recipe2 = sample_recipe(user=self.user, title='Pasta')
+        recipe1.tags.add(sample_tag(user=self.user, name='Vegan'))
+        recipe2.ingredients.add(sample_ingredient(user=self.user,
+                                                  name='Basil'))
+        
+        self.assertEqual(self.search('vegan'), [recipe1.id])
+        self.assertEqual(self.search('basil'), [recipe2.id])
+        
+        recipe1.tags.clear()
+        self.assertEqual(self.search('vegan'), [])
+        
+    def test_search_follows_renames(self):
+        """Test renaming a tag or ingredient updates matching recipes"""
+        recipe = sample_recipe(user=self.user, title='Salad')
+        tag = sample_tag(user=self.user, name='Summer')
+        ingredient = sample_ingredient(user=self.user, name='Feta')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        
+        tag.name = 'Winter'
+        tag.save()
+        Ingredient.objects.filter(pk=ingredient.pk).update(name='Olive')
+        
+        self.assertEqual(self.search('summer'), [])
+        self.assertEqual(self.search('winter'), [recipe.id])
+        self.assertEqual(self.search('olive'), [recipe.id])
+        
+    def test_search_follows_title_update(self):
+        """Test updating a recipe title through the API updates search"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+        
+        self.client.patch(detail_url(recipe.id), {'title': 'Waffles'})
+        
+        self.assertEqual(self.search('pancake'), [])
+        self.assertEqual(self.search('waffle'), [recipe.id])
+        
+    def test_search_ranked(self):
+        """Test title matches rank above tag matches"""
+        tagged = sample_recipe(user=self.user, title='Dinner')
+        tagged.tags.add(sample_tag(user=self.user, name='Soup'))
+        titled = sample_recipe(user=self.user, title='Tomato soup')
+        
+        self.assertEqual(self.search('soup'), [titled.id, tagged.id])
+        
+    def test_search_limited_to_user(self):
+        """Test search only returns the user's own recipes"""
+        user2 = get_user_model().objects.create_user(
+            'other@example.com', 'testpass'
+        )
+        sample_recipe(user=user2, title='Lasagne')
+        
+        self.assertEqual(self.search('lasagne'), [])
+        
+    def test_search_stop_words(self):
+        """Test a search made of stop words only matches nothing"""
+        sample_recipe(user=self.user, title='The best pie')
+        
+        self.assertEqual(self.search('the'), [])
+        
+    def test_search_paginated(self):
+        """Test walking ranked results by cursor"""
+        recipes = [sample_recipe(user=self.user, title='Bread ' * (i + 1))
+                   for i in range(3)]
+        recipes += [sample_recipe(user=self.user, title='Bread')
+                    for _ in range(2)]
+        
+        ids = []
+        response = self.client.get(RECIPES_URL, {'q': 'bread',
+                                                 'page_size': 2})
+        while True:
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        
+        self.assertEqual(sorted(ids), sorted(r.id for r in recipes))
+        self.assertEqual(ids, self.search('bread'))
+
+
+class RecipeSnapshotTests(TestCase):
+    """Test recipe responses rendered from tag and ingredient snapshots"""
+    
+    def setUp(self):
+        response_cache.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+        self.tag = sample_tag(user=self.user, name='Vegan')
+        self.ingredient = sample_ingredient(user=self.user, name='Tofu')
+        self.recipe.tags.add(self.tag, sample_tag(user=self.user))
+        self.recipe.ingredients.add(self.ingredient)
+        
+    def tearDown(self):
+        response_cache.reset()
+        
+    def get_detail(self):
+        """Return the recipe detail content, bypassing the cache"""
+        response_cache.bump_generation(self.user.pk)
+        response = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        return response.content
+    
+    def test_snapshot_matches_relations(self):
+        """Test snapshot responses match responses built from relations"""
+        content = self.get_detail()
+        list_content = self.client.get(RECIPES_URL).content
+        
+        with override_settings(RECIPE_SNAPSHOTS=False):
+            self.assertEqual(self.get_detail(), content)
+            self.assertEqual(self.client.get(RECIPES_URL).content,
+                             list_content)
+        
+    def test_list_reads_recipe_table_only(self):
+        """Test listing does not query tags or ingredients"""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(RECIPES_URL)
+        
+        for query in context.captured_queries:
+            self.assertNotIn('core_tag', query['sql'])
+            self.assertNotIn('core_ingredient', query['sql'])
+    
+    def test_snapshot_follows_changes(self):
+        """Test links, renames and deletes from either side update it"""
+        other = sample_recipe(user=self.user, title='Other')
+        self.tag.recipe_set.add(other)
+        self.tag.name = 'Vegetarian'
+        self.tag.save()
+        self.recipe.ingredients.remove(self.ingredient)
+        
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.snapshot['tags'],
+                         [{'id': self.tag.id, 'name': 'Vegetarian'}])
+        self.assertIn({'id': self.tag.id, 'name': 'Vegetarian'},
+                      self.recipe.snapshot['tags'])
+        self.assertEqual(self.recipe.snapshot['ingredients'], [])
+        
+        self.tag.recipe_set.clear()
+        other.refresh_from_db()
+        self.assertEqual(other.snapshot['tags'], [])
+        
+        self.recipe.tags.first().delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.snapshot['tags'], [])
+        
+    def test_update_keeps_concurrent_snapshot(self):
+        """Test saving a recipe does not write back its loaded snapshot"""
+        get_object = RecipeViewSet.get_object
+        
+        def get_object_then_rename(view):
+            # The tag is renamed after the recipe was loaded
+            recipe = get_object(view)
+            self.tag.name = 'Vegetarian'
+            self.tag.save()
+            return recipe
+        
+        with patch.object(RecipeViewSet, 'get_object',
+                          get_object_then_rename):
+            response = self.client.patch(detail_url(self.recipe.id),
+                                         {'title': 'Renamed'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'Renamed')
+        self.assertIn({'id': self.tag.id, 'name': 'Vegetarian'},
+                      self.recipe.snapshot['tags'])
+        
+    def test_missing_snapshot_falls_back(self):
+        """Test recipes without a snapshot render from their relations"""
+        content = self.get_detail()
+        Recipe.objects.update(snapshot=None)
+        
+        self.assertEqual(self.get_detail(), content)
+        
+        self.recipe.refresh_from_db()
+        self.recipe.save()
+        self.recipe.refresh_from_db()
+        self.assertIsNotNone(self.recipe.snapshot)
@@ -0,0 +1,77 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+from recipe.cache import response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class StreamingListTests(TestCase):
+    """Test streaming whole lists with ?stream=1"""
+
+    def setUp(self):
+        response_cache.reset()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for n in range(5):
+            recipe = Recipe.objects.create(user=self.user, title=f'Soup {n}',
+                                           time_minutes=n, price=n)
+            if n % 2:
+                recipe.tags.add(tag)
+
+    def tearDown(self):
+        response_cache.reset()
+
+    def get_pages(self, url, params=None):
+        """Return the results of every page, in order"""
+        results = []
+        response = self.client.get(url, dict(params or {}, page_size=2))
+        while True:
+            results += response.data['results']
+            if not response.data['next']:
+                return results
+            response = self.client.get(response.data['next'])
+
+    def stream(self, url, params=None):
+        """Return the body of a streamed list"""
+        response = self.client.get(url, dict(params or {}, stream=1))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        return b''.join(response.streaming_content)
+
+    @override_settings(API_STREAM_CHUNK_SIZE=2)
+    def test_stream_matches_pages(self):
+        """Test the stream holds every page's results, rendered alike"""
+        for params in ({}, {'q': 'soup'}):
+            expected = JSONRenderer().render(
+                self.get_pages(RECIPES_URL, params)
+            )
+            self.assertEqual(self.stream(RECIPES_URL, params), expected)
+            with override_settings(API_FAST_SERIALIZERS=False):
+                self.assertEqual(self.stream(RECIPES_URL, params), expected)
+
+    def test_stream_tags(self):
+        """Test streaming tags"""
+        self.assertEqual(json.loads(self.stream(TAGS_URL).decode()),
+                         [{'id': Tag.objects.get().id, 'name': 'Vegan',
+                           'recipe_count': 2}])
+
+    def test_stream_empty(self):
+        """Test streaming a list without rows gives an empty array"""
+        self.assertEqual(self.stream(RECIPES_URL, {'q': 'missing'}), b'[]')
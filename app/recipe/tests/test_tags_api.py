@@ -49,7 +49,7 @@ class PrivateTagsAPITests(TestCase):
         serializer = TagSerializer(tags, many=True) # Serialize all tags, not just the first one
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         
     def test_tags_limited_to_user(self):
         """Test that tags returned are for the authenticated user"""
@@ -63,8 +63,10 @@ class PrivateTagsAPITests(TestCase):
         response = self.client.get(TAGS_URL)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1) # Check that a single tag is returned
-        self.assertEqual(response.data[0]['name'], tag.name) # Compare that names of tags are the same
+        # Check that a single tag is returned
+        self.assertEqual(len(response.data['results']), 1)
+        # Compare that names of tags are the same
+        self.assertEqual(response.data['results'][0]['name'], tag.name)
         
     def test_create_tag_successful(self):
         """Tests that a tag is created successfully"""
@@ -85,6 +87,15 @@ class PrivateTagsAPITests(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         
+    def test_create_tag_name_taken(self):
+        """Test creating a tag with a name already used fails"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        response = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', response.data)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        
     def test_retrieve_tags_assigned_to_recipes(self):
         """Test filtering tags by those assigned to recipes"""
         tag1 = Tag.objects.create(user=self.user, name='Breakfast')
@@ -96,14 +107,15 @@ class PrivateTagsAPITests(TestCase):
             user=self.user
         )
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()  # Links are counted by the database
         
         response = self.client.get(TAGS_URL, {'assigned_only': 1})
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
         
         # We expect first tag to be in the response, but not the second tag
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertNotIn(serializer2.data, response.data['results'])
         
     def test_retrieve_tags_assigned_unique(self):
         """Test filtering tags by assigned returns unique items."""
@@ -129,4 +141,4 @@ class PrivateTagsAPITests(TestCase):
         response = self.client.get(TAGS_URL, {'assigned_only': 1})
         
         # Check that a single recipe with a unique tag was returned
-        self.assertEqual(len(response.data), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 1)
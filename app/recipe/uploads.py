@@ -0,0 +1,92 @@
+from io import BytesIO
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.base import File
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+# Pillow format -> file extension of accepted uploads
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+TOO_MANY_PIXELS = _('Image has too many pixels.')
+
+
+def has_too_many_pixels(size):
+    """Return whether an image of size (width, height) is over the limit"""
+    width, height = size
+    return width * height > settings.IMAGE_MAX_PIXELS
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Uploaded file is too large.')
+    default_code = 'too_large'
+
+
+class ImageStream(File):
+    """Image upload read from the request body as storage pulls chunks
+
+    Only the image header is buffered, the rest of the body goes straight
+    to the storage backend and the byte limit is enforced as it streams.
+    """
+
+    def __init__(self, stream, max_bytes=None, chunk_size=None):
+        super().__init__(stream)
+        self.max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+        self.chunk_size = chunk_size or settings.IMAGE_UPLOAD_CHUNK_SIZE
+        self.received = 0
+        self.head = b''
+
+    def _read(self, size):
+        chunk = self.file.read(size)
+        self.received += len(chunk)
+        if self.received > self.max_bytes:
+            raise UploadTooLarge()
+
+        return chunk
+
+    def read_header(self):
+        """Return (format, (width, height)) without decoding pixels"""
+        while len(self.head) < settings.IMAGE_UPLOAD_HEADER_BYTES:
+            chunk = self._read(self.chunk_size)
+            if not chunk:
+                break
+            self.head += chunk
+            try:
+                # Image.open is lazy, it only parses the header
+                image = Image.open(BytesIO(self.head))
+            except Image.DecompressionBombError:
+                # Over twice Image.MAX_IMAGE_PIXELS, see RecipeConfig
+                raise ValidationError({'image': [TOO_MANY_PIXELS]})
+            except Exception:
+                # Pillow raises assorted errors on a truncated header
+                continue
+            return self.validate(image.format, image.size)
+
+        raise ValidationError({'image': [_('Upload a valid image.')]})
+
+    def validate(self, image_format, size):
+        if image_format not in IMAGE_EXTENSIONS:
+            raise ValidationError(
+                {'image': [_('Unsupported image format.')]}
+            )
+        if has_too_many_pixels(size):
+            raise ValidationError({'image': [TOO_MANY_PIXELS]})
+
+        return image_format, size
+
+    def chunks(self, chunk_size=None):
+        yield self.head
+        while True:
+            chunk = self._read(chunk_size or self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -1,18 +1,48 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Prefetch
+
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Tag, Ingredient, Recipe
+from core.asgi import AsyncViewMixin
+from core.authentication import CachedTokenAuthentication
+from core.models import Tag, Ingredient, Recipe, recipe_image_file_path
 from recipe import serializers
+from recipe.bulk import BulkMixin
+from recipe.cache import CachedResponseMixin
+from recipe.fast import FastListMixin, FastNamedSerializer, \
+    FastRecipeSerializer
+from recipe.images import schedule_variants
+from recipe.names import NAME_TAKEN, unique_names
+from recipe.search import search_recipes
+from recipe.snapshots import refresh_linked_snapshots
+from recipe.streaming import StreamingListMixin
+from recipe.uploads import IMAGE_EXTENSIONS, ImageStream, UploadTooLarge
+from recipe.pagination import RecipeAttrCursorPagination, \
+    RecipeCursorPagination
+
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(StreamingListMixin,
+                            CachedResponseMixin,
+                            FastListMixin,
+                            BulkMixin,
+                            AsyncViewMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """Base viewset for recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeAttrCursorPagination
+    fast_serializer_class = FastNamedSerializer
+    # ?ordering=-recipe_count lists the most used first
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ('name', 'recipe_count')
+    ordering = ('-name',)
     
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
@@ -21,59 +51,215 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # EXISTS stops at the first link, a join would return one row
+            # per recipe and need DISTINCT to collapse them again
+            link_field = queryset.model._meta.model_name
+            links = self.recipe_links.objects.filter(
+                **{link_field: OuterRef('pk')}
+            )
+            # Django 2.1 can only filter on Exists through an annotation
+            queryset = queryset.annotate(
+                assigned=Exists(links)).filter(assigned=True)
             
-        return queryset.filter(
-            user=self.request.user).order_by('-name').distinct()
+        return queryset.filter(user=self.request.user).order_by('-name')
     
     def perform_create(self, serializer):
         """Create a new recipe attribute object"""
-        serializer.save(user=self.request.user)
+        with unique_names(self.queryset.model):
+            serializer.save(user=self.request.user)
+    
+    def validate_items(self, items, partial=False):
+        """Also check bulk written names are free with a single query"""
+        validated, errors = super().validate_items(items, partial)
+        # Updates name the object they change, created ones have no id
+        ids = [item.get('id') if partial and isinstance(item, dict)
+               else None for item in items]
+        names = [(data or {}).get('name') for data in validated]
+        taken = dict(self.queryset.model.objects.filter(
+            user=self.request.user, name__in=[name for name in names if name]
+        ).values_list('name', 'pk'))
+        seen = set()
+        for pk, name, item_errors in zip(ids, names, errors):
+            if name is None:
+                continue
+            if name in seen or taken.get(name, pk) != pk:
+                item_errors['name'] = [NAME_TAKEN]
+            seen.add(name)
+            
+        return validated, errors
+    
+    def bulk_create(self, items):
+        # Names taken by a concurrent request since they were validated
+        with unique_names(self.queryset.model):
+            return super().bulk_create(items)
+        
+    def bulk_update(self, items):
+        with unique_names(self.queryset.model):
+            return super().bulk_update(items)
+    
+    def bulk_updated(self, objs, fields):
+        """Rebuild snapshots of recipes linked to objects renamed in bulk"""
+        if 'name' in fields:
+            field = self.queryset.model._meta.model_name
+            refresh_linked_snapshots(self.recipe_links, field,
+                                     [obj.pk for obj in objs])
         
 
 class TagViewSet(BaseRecipeAttrViewSet):
-    """Manage tags in the database"""
+    """Manage tags in the database
+
+    Lists are ordered by ?ordering=name or recipe_count, prefix - to
+    reverse. Recipe counts change whenever recipes are linked, so pages
+    ordered by them are not a stable walk: a tag whose count changes
+    between two pages can be skipped or listed twice. Order by name to
+    list every tag exactly once.
+    """
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    bulk_serializer_class = serializers.TagSerializer
+    recipe_links = Recipe.tags.through
 
         
 class IngredientViewSet(BaseRecipeAttrViewSet):
-    """Manage ingredients in the database"""
+    """Manage ingredients in the database
+
+    Lists are ordered by ?ordering=name or recipe_count, prefix - to
+    reverse. Recipe counts change whenever recipes are linked, so pages
+    ordered by them are not a stable walk: an ingredient whose count changes
+    between two pages can be skipped or listed twice. Order by name to
+    list every ingredient exactly once.
+    """
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    bulk_serializer_class = serializers.IngredientSerializer
+    recipe_links = Recipe.ingredients.through
     
     
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(StreamingListMixin, CachedResponseMixin, FastListMixin,
+                    BulkMixin, AsyncViewMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     serializer_class = serializers.RecipeSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    fast_serializer_class = FastRecipeSerializer
+    bulk_serializer_class = serializers.RecipeBulkSerializer
+    bulk_relations = {'tags': Tag, 'ingredients': Ingredient}
+    # The search vector is only ever read by the database
+    queryset = Recipe.objects.defer('search_vector')
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
     
     def _params_to_ints(self, qs):
         """Convert a list of string IDs into integer list"""
         return [int(str_id) for str_id in qs.split(',')]
     
+    def _filter_linked(self, queryset, links, field, ids, match):
+        """Filter recipes linked to any or all of the given ids
+        
+        Every condition is an EXISTS subquery on the through table, so
+        each recipe appears at most once without needing DISTINCT.
+        """
+        if match == 'all':
+            groups = [[pk] for pk in sorted(set(ids))]
+        else:
+            groups = [ids]
+            
+        for i, group in enumerate(groups):
+            name = f'has_{field}_{i}'
+            subquery = Exists(links.objects.filter(
+                recipe=OuterRef('pk'), **{f'{field}__in': group}
+            ))
+            queryset = queryset.annotate(**{name: subquery}).filter(
+                **{name: True})
+            
+        return queryset
+    
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         
         # Get tags and ingredients from the database if available
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('q', '').strip()
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be "any" or "all".'})
+        
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids) # Double underscore for Django DB filtering -- NEED RESEARCH
+            queryset = self._filter_linked(
+                queryset, Recipe.tags.through, 'tag', tag_ids, match
+            )
         
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = self._filter_linked(
+                queryset, Recipe.ingredients.through, 'ingredient',
+                ingredient_ids, match
+            )
+        
+        if search:
+            queryset = search_recipes(queryset, search, self.request.user)
         
-        return queryset.filter(user=self.request.user)
+        queryset = queryset.filter(user=self.request.user)
+        if self.action not in ('list', 'retrieve'):
+            # Saving a recipe with its snapshot deferred leaves the column
+            # out of the UPDATE, so a snapshot refreshed by a concurrent
+            # rename or link change since it was loaded is not written back
+            queryset = queryset.defer('snapshot')
+        return queryset.prefetch_related(*self.get_prefetch_plan())
+    
+    def reads_snapshots(self):
+        """Return whether the current action renders from snapshots"""
+        return (settings.RECIPE_SNAPSHOTS and
+                self.action in ('list', 'retrieve'))
+    
+    def get_prefetch_plan(self):
+        """Return the related lookups to prefetch for the current action"""
+        if self.reads_snapshots():
+            # Tags and ingredients are read from the recipe row itself
+            return []
+        
+        elif self.action == 'retrieve':
+            # Detail serializer nests full tag and ingredient objects, in
+            # id order like snapshots
+            return [
+                Prefetch('ingredients', queryset=Ingredient.objects
+                         .only('id', 'name').order_by('id')),
+                Prefetch('tags', queryset=Tag.objects.only('id', 'name')
+                         .order_by('id')),
+            ]
+        
+        elif self.action == 'upload_image':
+            # Image serializer does not touch the relations at all
+            return []
+        
+        # List and write actions render primary keys only
+        return [
+            Prefetch('ingredients',
+                     queryset=Ingredient.objects.only('id').order_by('id')),
+            Prefetch('tags', queryset=Tag.objects.only('id').order_by('id')),
+        ]
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Return a recipe detail, served from the response cache"""
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+    
+    async def retrieve_async(self, request, *args, **kwargs):
+        return await self.get_cached_response_async(
+            request, super().retrieve_async, *args, **kwargs
+        )
     
     def get_serializer_class(self):
         """Return appropriate serializer class"""
-        if self.action == 'retrieve':
+        if self.reads_snapshots():
+            if self.action == 'retrieve':
+                return serializers.RecipeSnapshotDetailSerializer
+            return serializers.RecipeSnapshotSerializer
+        
+        elif self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
         
         elif self.action == 'upload_image':
@@ -86,17 +272,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
         
     # Add custom function using the "action" decorator
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST', 'PUT'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
         recipe = self.get_object()
+        stale_variants = recipe.image_variants.values()
+        if request.method == 'PUT':
+            return self._stream_image(request, recipe, stale_variants)
+        
         serializer = self.get_serializer(
             recipe,
             data=request.data
         )
         
         if serializer.is_valid():
-            serializer.save()
+            # Variants are resized off the request thread once committed
+            serializer.save(image_variants={})
+            schedule_variants(recipe, stale_variants)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -106,4 +298,33 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
-        )
\ No newline at end of file
+        )
+    
+    def _stream_image(self, request, recipe, stale_variants):
+        """Save a raw image request body without buffering it in memory"""
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise UploadTooLarge()
+        
+        # Read the WSGI input directly so DRF never parses the body
+        upload = ImageStream(request._request)
+        image_format = upload.read_header()[0]
+        
+        name = recipe_image_file_path(
+            recipe, f'upload.{IMAGE_EXTENSIONS[image_format]}'
+        )
+        storage = recipe.image.storage
+        try:
+            name = storage.save(name, upload)
+        except Exception:
+            # Do not leave a partially written file behind
+            storage.delete(name)
+            raise
+        
+        recipe.image = name
+        recipe.image_variants = {}
+        recipe.save(update_fields=['image', 'image_variants'])
+        schedule_variants(recipe, stale_variants)
+        
+        serializer = self.get_serializer(recipe)
+        return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1,14 +1,50 @@
+from contextlib import nullcontext
+
 from django.contrib.auth import get_user_model, authenticate
+from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext_lazy as _ # For other languages?
 from rest_framework import serializers
 
+User = get_user_model()
+EMAIL_FIELD = User._meta.get_field('email')
+EMAIL_CONSTRAINT = f'{User._meta.db_table}_email_key'
+EMAIL_TAKEN = EMAIL_FIELD.error_messages['unique'] % {
+    'model_name': User._meta.verbose_name,
+    'field_label': EMAIL_FIELD.verbose_name,
+}
+
+
 class UserSerializer(serializers.ModelSerializer):
     '''Serializer for users object'''
     
     class Meta:
         model = get_user_model()
         fields = ('email', 'password', 'name')
-        extra_kwargs = {'password': {'write_only': True, 'min_length': 5}}
+        extra_kwargs = {
+            'password': {'write_only': True, 'min_length': 5},
+            # The unique index rejects taken emails, see save()
+            'email': {'validators': []},
+        }
+        
+    def save(self, **kwargs):
+        """Save the user, reporting a taken email as a validation error
+        
+        Saving into the unique index replaces a query checking for the
+        email first, and cannot race with another signup.
+        """
+        connection = transaction.get_connection()
+        # Only a transaction around us needs a savepoint to survive the
+        # error, in autocommit mode the failed statement is just gone
+        guard = transaction.atomic() if connection.in_atomic_block \
+            else nullcontext()
+        try:
+            with guard:
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            diag = getattr(exc.__cause__, 'diag', None)
+            if getattr(diag, 'constraint_name', None) != EMAIL_CONSTRAINT:
+                raise
+            raise serializers.ValidationError({'email': [EMAIL_TAKEN]})
         
     def create(self, validated_data):
         """Create a new user with encrypted password"""
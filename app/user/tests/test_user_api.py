@@ -1,4 +1,8 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -6,6 +10,8 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.throttling import token_buckets
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token') # URL to be used in POST request to generate token
 ME_URL = reverse('user:me')
@@ -18,6 +24,7 @@ class PublicUserApiTests(TestCase):
     '''Test the users API (public)'''
     
     def setUp(self):
+        token_buckets.reset()
         self.client = APIClient()
         
     def test_create_valid_user(self):
@@ -53,6 +60,26 @@ class PublicUserApiTests(TestCase):
         
         # Check that the response is "Bad Request" as the user already exists
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['email'],
+                         ['user with this email already exists.'])
+        
+    def test_create_user_single_query(self):
+        '''Test the email is not looked up before inserting the user'''
+        payload = {
+            'email': 'test@example.com',
+            'password': 'password',
+            'name': 'xxx',
+        }
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(CREATE_USER_URL, payload)
+            
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [query['sql'] for query in queries
+                      if not query['sql'].startswith(('SAVEPOINT',
+                                                      'RELEASE'))]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT'))
         
     def test_password_too_short(self):
         '''Test that the password is more than 5 characters'''
@@ -119,6 +146,74 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         
 
+@override_settings(LOGIN_THROTTLE_IP_RATE=1, LOGIN_THROTTLE_IP_BURST=3,
+                   LOGIN_THROTTLE_EMAIL_RATE=1, LOGIN_THROTTLE_EMAIL_BURST=2)
+class TokenThrottleTests(TestCase):
+    """Test login attempts are throttled before passwords are hashed"""
+    
+    def setUp(self):
+        token_buckets.reset()
+        self.client = APIClient()
+        
+    def tearDown(self):
+        token_buckets.reset()
+        
+    def login(self, email, ip='10.0.0.1'):
+        return self.client.post(
+            TOKEN_URL, {'email': email, 'password': 'wrong'},
+            REMOTE_ADDR=ip
+        )
+        
+    def test_throttle_per_email(self):
+        """Test an email is throttled whichever IPs the attempts use"""
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            response = self.login('test@example.com', ip)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            
+        with patch('user.serializers.authenticate') as authenticate:
+            response = self.login(' Test@Example.com', '10.0.0.3')
+            
+        self.assertEqual(response.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        authenticate.assert_not_called()
+        
+    def test_throttle_per_ip(self):
+        """Test an IP is throttled whichever emails it tries"""
+        for n in range(3):
+            response = self.login(f'test{n}@example.com')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            
+        with patch('user.serializers.authenticate') as authenticate:
+            response = self.login('other@example.com')
+            
+        self.assertEqual(response.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        authenticate.assert_not_called()
+        self.assertEqual(self.login('other@example.com', '10.0.0.2')
+                         .status_code, status.HTTP_400_BAD_REQUEST)
+        
+    @override_settings(LOGIN_THROTTLE_EMAIL_RATE=0)
+    def test_throttle_without_refill(self):
+        """Test a rate of 0 throttles for good once the burst is used"""
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.login('test@example.com', ip)
+            
+        response = self.login('test@example.com', '10.0.0.3')
+        
+        self.assertEqual(response.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotIn('Retry-After', response)
+        
+    @override_settings(LOGIN_THROTTLE_IP_BURST=0,
+                       LOGIN_THROTTLE_EMAIL_BURST=0)
+    def test_throttle_off(self):
+        """Test a burst of 0 turns the throttle off"""
+        for _ in range(5):
+            response = self.login('test@example.com')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            
+
 class PrivateUserAPITest(TestCase):
     """Test API requests that require authentication"""
     
@@ -157,4 +252,15 @@ class PrivateUserAPITest(TestCase):
         self.user.refresh_from_db() # Update user profile with latest data from DB
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+    def test_update_email_taken(self):
+        """Test changing the email to one already in use fails"""
+        create_user(email='other@example.com', password='password')
+        
+        response = self.client.patch(ME_URL, {'email': 'other@example.com'})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'user@example.com')
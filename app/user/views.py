@@ -1,7 +1,9 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+from core.throttling import LoginEmailThrottle, LoginIPThrottle
 from user.serializers import UserSerializer, AuthTokenSerializer # Import the serializers that create user API
 
 class CreateUserView(generics.CreateAPIView):
@@ -12,11 +14,13 @@ class CreateTokenView(ObtainAuthToken):
     """Create a new token from user credentials"""
     serializer_class = AuthTokenSerializer 
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES # Allows to render in the browser
+    # Checked before the serializer hashes the password
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
     
     
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
     
     def get_object(self):